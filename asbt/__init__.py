@@ -0,0 +1,4 @@
+"""ASBT 备份引擎
+
+这里的模块只负责磁盘上的备份数据，不依赖 tkinter，界面代码在 autoSaveBackupTool.py 中。
+"""
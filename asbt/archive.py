@@ -0,0 +1,355 @@
+import os
+import stat
+import time
+import tarfile
+import zipfile
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时不提供 tar.zst 格式
+    zstandard = None
+
+
+# 压缩归档类型：扩展名 -> 说明
+ARCHIVE_TYPES = {
+    "tar.gz": "tar.gz (gzip)",
+    "tar.bz2": "tar.bz2 (bzip2)",
+    "tar.xz": "tar.xz (xz/lzma)",
+    "zip": "zip (deflate)",
+}
+if zstandard is not None:
+    ARCHIVE_TYPES["tar.zst"] = "tar.zst (zstd)"
+
+_TAR_COMPRESSION = {
+    "tar.gz": "gz",
+    "tar.bz2": "bz2",
+    "tar.xz": "xz",
+}
+
+
+def available_archive_types():
+    return list(ARCHIVE_TYPES)
+
+
+def _check_type(archive_type):
+    if archive_type not in ARCHIVE_TYPES:
+        if archive_type == "tar.zst":
+            raise ValueError("tar.zst 格式需要安装 zstandard 模块")
+        raise ValueError(f"不支持的归档格式: {archive_type}")
+
+
+class _TarCounter:
+    """统计写入归档的文件数量和大小，并报告进度"""
+
+    def __init__(self, total=0, progress=None):
+        self.file_count = 0
+        self.total_bytes = 0
+        self.total = total
+        self.progress = progress
+
+    def filter(self, tarinfo):
+        if tarinfo.isfile():
+            self.file_count += 1
+            self.total_bytes += tarinfo.size
+            if self.progress is not None:
+                # filter 在写入文件内容之前调用，这里报告的是已开始写入的文件数
+                self.progress(self.file_count, self.total)
+        return tarinfo
+
+
+def _add_to_tar(tar, source_path, is_directory, total=0, progress=None):
+    counter = _TarCounter(total, progress)
+    if is_directory:
+        # 成员使用相对源文件夹的路径，不包含源文件夹本身
+        for name in sorted(os.listdir(source_path)):
+            tar.add(os.path.join(source_path, name), arcname=name, filter=counter.filter)
+    else:
+        tar.add(source_path, arcname=os.path.basename(source_path), filter=counter.filter)
+    return counter
+
+
+def create_archive(source_path, backup_path, is_directory, archive_type, total=0, progress=None):
+    """把源文件或文件夹直接流式写入压缩归档，不会先生成未压缩的副本
+
+    参数:
+        total: 预计的文件数量，仅用于报告进度，未知时为 0
+        progress: 进度回调 progress(已写入文件数, total)
+
+    返回需要合并到备份记录中的信息
+    """
+    _check_type(archive_type)
+    tmp_path = backup_path + ".tmp"
+    try:
+        if archive_type == "zip":
+            file_count, total_bytes = _create_zip(source_path, tmp_path, is_directory, total, progress)
+        elif archive_type == "tar.zst":
+            with open(tmp_path, "wb") as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw, closefd=False) as compressor:
+                    with tarfile.open(fileobj=compressor, mode="w|") as tar:
+                        counter = _add_to_tar(tar, source_path, is_directory, total, progress)
+            file_count, total_bytes = counter.file_count, counter.total_bytes
+        else:
+            with tarfile.open(tmp_path, mode=f"w:{_TAR_COMPRESSION[archive_type]}") as tar:
+                counter = _add_to_tar(tar, source_path, is_directory, total, progress)
+            file_count, total_bytes = counter.file_count, counter.total_bytes
+        os.replace(tmp_path, backup_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "archive_type": archive_type,
+        "file_count": file_count,
+        "total_bytes": total_bytes,
+        "stored_bytes": os.path.getsize(backup_path),
+    }
+
+
+def _create_zip(source_path, zip_path, is_directory, total=0, progress=None):
+    file_count = 0
+    total_bytes = 0
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        if not is_directory:
+            zf.write(source_path, os.path.basename(source_path))
+            return 1, os.path.getsize(source_path)
+        for root, dir_names, file_names in os.walk(source_path):
+            rel_root = os.path.relpath(root, source_path)
+            rel_root = "" if rel_root == "." else rel_root.replace(os.sep, "/")
+            dir_names.sort()
+            for name in dir_names:
+                # 写入目录条目，保留空文件夹
+                zf.write(os.path.join(root, name), f"{rel_root}/{name}" if rel_root else name)
+            for name in sorted(file_names):
+                file_path = os.path.join(root, name)
+                zf.write(file_path, f"{rel_root}/{name}" if rel_root else name)
+                file_count += 1
+                total_bytes += os.path.getsize(file_path)
+                if progress is not None:
+                    progress(file_count, total)
+    return file_count, total_bytes
+
+
+class _open_tar:
+    """以流方式打开 tar 归档（只顺序读取，不需要随机访问）"""
+
+    def __init__(self, backup_path, archive_type):
+        self.backup_path = backup_path
+        self.archive_type = archive_type
+        self.raw = None
+        self.reader = None
+        self.tar = None
+
+    def __enter__(self):
+        if self.archive_type == "tar.zst":
+            self.raw = open(self.backup_path, "rb")
+            self.reader = zstandard.ZstdDecompressor().stream_reader(self.raw)
+            self.tar = tarfile.open(fileobj=self.reader, mode="r|")
+        else:
+            self.tar = tarfile.open(self.backup_path, mode=f"r|{_TAR_COMPRESSION[self.archive_type]}")
+        return self.tar
+
+    def __exit__(self, *exc):
+        self.tar.close()
+        if self.reader is not None:
+            self.reader.close()
+        if self.raw is not None:
+            self.raw.close()
+
+
+def iter_members(backup_path, archive_type):
+    """逐个读取归档成员信息，返回 (名称, 是否为目录, 大小, 修改时间)
+
+    只读取成员头部（tar 需要顺序解压数据流，但不会写出任何文件）
+    """
+    _check_type(archive_type)
+    if archive_type == "zip":
+        with zipfile.ZipFile(backup_path) as zf:
+            for info in zf.infolist():
+                yield info.filename.rstrip("/"), info.is_dir(), info.file_size, _zip_mtime(info)
+        return
+    with _open_tar(backup_path, archive_type) as tar:
+        for member in tar:
+            yield member.name, member.isdir(), member.size, member.mtime
+
+
+def iter_archive_files(backup_path, archive_type, chunk_size=1024 * 1024):
+    """按顺序流式读取归档中的文件，返回 (名称, 数据块迭代器)
+
+    数据块迭代器只在下一次迭代之前有效（tar 只能顺序解压）
+    """
+    _check_type(archive_type)
+    if archive_type == "zip":
+        with zipfile.ZipFile(backup_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    with zf.open(info) as f:
+                        yield info.filename, iter(lambda: f.read(chunk_size), b"")
+        return
+    with _open_tar(backup_path, archive_type) as tar:
+        for member in tar:
+            if member.isfile():
+                f = tar.extractfile(member)
+                yield member.name, iter(lambda: f.read(chunk_size), b"")
+
+
+# 成员类型：只有目录和普通文件会被还原，其他（符号链接、硬链接、设备文件等）完整还原时也会跳过
+MEMBER_DIR = "dir"
+MEMBER_FILE = "file"
+MEMBER_OTHER = "other"
+
+
+def iter_archive_entries(backup_path, archive_type, chunk_size=1024 * 1024):
+    """按顺序读取一遍归档，返回 (名称, 类型, 大小, 修改时间, 权限, 数据块迭代器)
+
+    类型见 MEMBER_DIR / MEMBER_FILE / MEMBER_OTHER，只有普通文件有数据块迭代器（其他为 None）。
+    权限为 0o7777 以内的模式位，zip 中没有记录时为 None。
+    不读取数据块时 tar 也只解压一遍，差异还原用它同时获取成员信息和数据。
+    数据块迭代器只在下一次迭代之前有效（tar 只能顺序解压）
+    """
+    _check_type(archive_type)
+    if archive_type == "zip":
+        with zipfile.ZipFile(backup_path) as zf:
+            for info in zf.infolist():
+                name = info.filename.rstrip("/")
+                mode = (info.external_attr >> 16) & 0o7777 or None
+                if info.is_dir():
+                    yield name, MEMBER_DIR, 0, _zip_mtime(info), mode, None
+                elif stat.S_ISLNK(info.external_attr >> 16):
+                    yield name, MEMBER_OTHER, info.file_size, _zip_mtime(info), mode, None
+                else:
+                    with zf.open(info) as f:
+                        yield (name, MEMBER_FILE, info.file_size, _zip_mtime(info), mode,
+                               iter(lambda: f.read(chunk_size), b""))
+        return
+    with _open_tar(backup_path, archive_type) as tar:
+        for member in tar:
+            mode = member.mode & 0o7777
+            if member.isdir():
+                yield member.name, MEMBER_DIR, 0, member.mtime, mode, None
+            elif member.isfile():
+                f = tar.extractfile(member)
+                yield member.name, MEMBER_FILE, member.size, member.mtime, mode, iter(lambda: f.read(chunk_size), b"")
+            else:
+                yield member.name, MEMBER_OTHER, member.size, member.mtime, mode, None
+
+
+def _zip_mtime(info):
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def list_archive_dir(backup_path, archive_type):
+    """列出归档第一层的内容，返回 [(名称, 是否为目录)]"""
+    items = {}
+    for name, is_dir, _, _ in iter_members(backup_path, archive_type):
+        parts = name.split("/")
+        if len(parts) > 1:
+            items[parts[0]] = True
+        else:
+            items.setdefault(parts[0], is_dir)
+    return sorted(items.items())
+
+
+def read_archive_text(backup_path, archive_type, limit=2000):
+    """读取单文件归档中文件的开头部分用于预览"""
+    _check_type(archive_type)
+    if archive_type == "zip":
+        with zipfile.ZipFile(backup_path) as zf:
+            with zf.open(zf.infolist()[0]) as f:
+                return f.read(limit * 4).decode("utf-8", errors="ignore")[:limit]
+    with _open_tar(backup_path, archive_type) as tar:
+        for member in tar:
+            if member.isfile():
+                return tar.extractfile(member).read(limit * 4).decode("utf-8", errors="ignore")[:limit]
+    return ""
+
+
+def safe_target(target_root, name):
+    """计算成员的还原路径，拒绝绝对路径和 .. 等越出目标目录的成员"""
+    target = os.path.normpath(os.path.join(target_root, *name.split("/")))
+    root = os.path.normpath(target_root)
+    if os.path.isabs(name) or (target != root and not target.startswith(root + os.sep)):
+        raise ValueError(f"归档成员路径不安全: {name}")
+    return target
+
+
+def restore_archive(backup_path, archive_type, target_path, is_directory, total=0, progress=None):
+    """从归档流式还原到目标路径（目标路径应不存在）
+
+    参数:
+        total: 归档中的文件数量，仅用于报告进度
+        progress: 进度回调 progress(已还原文件数, total)
+    """
+    _check_type(archive_type)
+    if archive_type == "zip":
+        _restore_zip(backup_path, target_path, is_directory, total, progress)
+        return
+
+    with _open_tar(backup_path, archive_type) as tar:
+        if is_directory:
+            os.makedirs(target_path, exist_ok=True)
+        directories = []
+        restored = 0
+        for member in tar:
+            if is_directory:
+                target = safe_target(target_path, member.name)
+            elif member.isfile():
+                target = target_path
+            else:
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                directories.append((target, member))
+            elif member.isfile():
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                with tar.extractfile(member) as src, open(target, "wb") as dst:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                os.chmod(target, member.mode & 0o7777)
+                os.utime(target, (member.mtime, member.mtime))
+                restored += 1
+                if progress is not None:
+                    progress(restored, total)
+            # 其他类型（链接、设备文件等）不还原
+        # 最后设置目录属性，避免写入文件时修改时间被刷新
+        for target, member in reversed(directories):
+            os.chmod(target, member.mode & 0o7777)
+            os.utime(target, (member.mtime, member.mtime))
+
+
+def _restore_zip(backup_path, target_path, is_directory, total=0, progress=None):
+    restored = 0
+    with zipfile.ZipFile(backup_path) as zf:
+        if is_directory:
+            os.makedirs(target_path, exist_ok=True)
+        for info in zf.infolist():
+            name = info.filename.rstrip("/")
+            if stat.S_ISLNK(info.external_attr >> 16):
+                # 与 tar 相同，不还原符号链接（差异还原也会跳过它们）
+                continue
+            if is_directory:
+                target = safe_target(target_path, name)
+            elif not info.is_dir():
+                target = target_path
+            else:
+                continue
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with zf.open(info) as src, open(target, "wb") as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            mode = (info.external_attr >> 16) & 0o7777
+            if mode:
+                os.chmod(target, mode)
+            mtime = _zip_mtime(info)
+            os.utime(target, (mtime, mtime))
+            restored += 1
+            if progress is not None:
+                progress(restored, total)
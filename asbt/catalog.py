@@ -0,0 +1,241 @@
+import os
+import json
+import threading
+
+try:
+    import sqlite3
+except ImportError:  # 部分精简的 Python 没有 sqlite3，此时不使用目录
+    sqlite3 = None
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    backup_path TEXT,
+    original TEXT,
+    date TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backups_timestamp ON backups (timestamp);
+CREATE INDEX IF NOT EXISTS backups_original ON backups (original);
+CREATE INDEX IF NOT EXISTS backups_date ON backups (date);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    action TEXT,
+    original TEXT,
+    date TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_timestamp ON logs (timestamp);
+CREATE INDEX IF NOT EXISTS logs_action ON logs (action);
+CREATE INDEX IF NOT EXISTS logs_original ON logs (original);
+CREATE INDEX IF NOT EXISTS logs_date ON logs (date);
+"""
+
+
+class BackupCatalog:
+    """备份记录和日志的 SQLite 目录（catalog.db）
+
+    config.json + journal.jsonl 仍然是备份历史的唯一来源，目录只是按 timestamp、
+    操作类型、源路径和日期建立索引的副本，用于按时间戳查找记录和分页读取列表，
+    不必在内存中线性查找。
+
+    目录记录了已同步到的 journal 序号（journal_seq），与 journal 不一致时
+    （旧版本创建的备份目录、目录文件被删除或损坏、同步中途崩溃）从 journal 重新导入。
+    """
+
+    FILE_NAME = "catalog.db"
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.db_file = os.path.join(backup_dir, self.FILE_NAME)
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._conn is None:
+            # 后台任务和界面线程都会访问目录，由 _lock 保证同一时间只有一个线程使用连接
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(_SCHEMA)
+            except sqlite3.DatabaseError:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def remove_file(self):
+        """删除目录文件"""
+        with self._lock:
+            self.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.db_file + suffix):
+                    os.remove(self.db_file + suffix)
+
+    def get_seq(self):
+        """已同步到的 journal 序号，目录为空或未完成导入时返回 None"""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = 'journal_seq'").fetchone()
+            return int(row[0]) if row is not None else None
+
+    def import_data(self, data, seq):
+        """用完整的备份配置重建目录
+
+        参数:
+            data: {"backups": [...], "logs": [...]}
+            seq: data 对应的 journal 序号
+        """
+        with self._lock:
+            try:
+                conn = self._connect()
+            except sqlite3.DatabaseError:
+                # 目录文件损坏，删除后重建
+                self.remove_file()
+                conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM backups")
+                conn.execute("DELETE FROM logs")
+                conn.executemany("INSERT INTO backups (timestamp, backup_path, original, date, record) "
+                                 "VALUES (?, ?, ?, ?, ?)", [_backup_row(b) for b in data["backups"]])
+                conn.executemany("INSERT INTO logs (timestamp, action, original, date, record) "
+                                 "VALUES (?, ?, ?, ?, ?)", [_log_row(log) for log in data["logs"]])
+                self._set_seq(conn, seq)
+
+    def sync(self, data, seq):
+        """目录与 journal 序号不一致时重新导入，返回是否重新导入"""
+        with self._lock:
+            try:
+                if self.get_seq() == seq:
+                    return False
+            except sqlite3.DatabaseError:
+                pass
+            self.import_data(data, seq)
+            return True
+
+    def apply(self, op, fields, seq):
+        """把一条 journal 记录同步到目录（操作类型见 asbt.journal.apply_entry）
+
+        目录不是紧接在上一条记录之后（seq - 1）时返回 False，调用方应重新导入
+        """
+        with self._lock:
+            conn = self._connect()
+            if self.get_seq() != seq - 1:
+                return False
+            with conn:
+                if op == "add_backup":
+                    conn.execute("INSERT INTO backups (timestamp, backup_path, original, date, record) "
+                                 "VALUES (?, ?, ?, ?, ?)", _backup_row(fields["record"]))
+                elif op == "remove_backups":
+                    conn.executemany("DELETE FROM backups WHERE timestamp IS ? AND backup_path IS ?",
+                                     [(key[0], key[1]) for key in fields["keys"]])
+                elif op == "add_log":
+                    conn.execute("INSERT INTO logs (timestamp, action, original, date, record) "
+                                 "VALUES (?, ?, ?, ?, ?)", _log_row(fields["record"]))
+                elif op == "update_last_log":
+                    row = _log_row(fields["record"])
+                    updated = conn.execute("UPDATE logs SET timestamp = ?, action = ?, original = ?, date = ?, "
+                                           "record = ? WHERE id = (SELECT MAX(id) FROM logs)", row).rowcount
+                    if not updated:
+                        conn.execute("INSERT INTO logs (timestamp, action, original, date, record) "
+                                     "VALUES (?, ?, ?, ?, ?)", row)
+                self._set_seq(conn, seq)
+            return True
+
+    def _set_seq(self, conn, seq):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('journal_seq', ?)", (str(seq),))
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [json.loads(row[0]) for row in self._connect().execute(sql, params)]
+
+    def _count(self, sql, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()[0]
+
+    def find_backup(self, timestamp):
+        """按时间戳查找备份记录，找不到时返回 None"""
+        records = self._query("SELECT record FROM backups WHERE timestamp = ? ORDER BY id LIMIT 1", (timestamp,))
+        return records[0] if records else None
+
+    def find_log(self, timestamp):
+        """按时间戳查找日志，找不到时返回 None"""
+        records = self._query("SELECT record FROM logs WHERE timestamp = ? ORDER BY id LIMIT 1", (timestamp,))
+        return records[0] if records else None
+
+    def count_backups(self, original=None):
+        if original is None:
+            return self._count("SELECT COUNT(*) FROM backups")
+        return self._count("SELECT COUNT(*) FROM backups WHERE original = ?", (original,))
+
+    def count_logs(self, action=None):
+        if action is None:
+            return self._count("SELECT COUNT(*) FROM logs")
+        return self._count("SELECT COUNT(*) FROM logs WHERE action = ?", (action,))
+
+    def page_backups(self, offset=0, limit=100, original=None):
+        """分页读取备份记录，最新的在前
+
+        参数:
+            offset: 跳过的记录数
+            limit: 最多返回的记录数
+            original: 只返回该源路径的备份，None 时返回全部
+        """
+        if original is None:
+            return self._query("SELECT record FROM backups ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+        return self._query("SELECT record FROM backups WHERE original = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                           (original, limit, offset))
+
+    def page_logs(self, offset=0, limit=100, action=None):
+        """分页读取日志，最新的在前
+
+        参数:
+            offset: 跳过的记录数
+            limit: 最多返回的记录数
+            action: 只返回该操作类型的日志，None 时返回全部
+        """
+        if action is None:
+            return self._query("SELECT record FROM logs ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+        return self._query("SELECT record FROM logs WHERE action = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                           (action, limit, offset))
+
+
+def _backup_row(record):
+    return (record.get("timestamp"), record.get("backup_path"), record.get("original"), record.get("date"),
+            json.dumps(record, ensure_ascii=False))
+
+
+def _log_row(record):
+    backup_info = record.get("backup_info") or {}
+    return (record.get("timestamp"), record.get("action"), backup_info.get("original"), record.get("date"),
+            json.dumps(record, ensure_ascii=False))
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(backup_dir):
+    """获取备份目录对应的目录，没有 sqlite3 时返回 None"""
+    if sqlite3 is None:
+        return None
+    key = os.path.normcase(os.path.abspath(backup_dir))
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = BackupCatalog(backup_dir)
+            _catalogs[key] = catalog
+        return catalog
@@ -0,0 +1,317 @@
+import os
+import sys
+import signal
+import argparse
+import threading
+
+from asbt.engine import GLOBAL_CONFIG_FILE, ACTION_NAMES, BackupEngine, EngineListener, load_settings, \
+    format_throughput, job_settings
+from asbt.snapshot import FORMAT_COPY, FORMAT_MANIFEST, FORMAT_DELTA, FORMAT_ARCHIVE, get_format, snapshot_exists
+from asbt.profiling import PROFILE_MODES, format_timing
+from asbt.exporter import create_exporter, normalize_exporter
+
+
+class ConsoleListener(EngineListener):
+    """把引擎的状态信息输出到终端"""
+
+    def __init__(self, quiet=False, prefix=""):
+        self.quiet = quiet
+        self.prefix = prefix
+
+    def status(self, text):
+        if not self.quiet:
+            print(f"{self.prefix}{text}", flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m asbt", description="文件存档备份工具（命令行，不需要图形界面）")
+    parser.add_argument("--config", default=GLOBAL_CONFIG_FILE,
+                        help="全局配置文件，默认与图形界面共用（%(default)s）")
+    parser.add_argument("--source", help="源文件或文件夹，覆盖配置文件中的设置")
+    parser.add_argument("--backup-dir", help="备份目录，覆盖配置文件中的设置")
+    parser.add_argument("--store-mode", choices=(FORMAT_COPY, FORMAT_MANIFEST, FORMAT_DELTA, FORMAT_ARCHIVE),
+                        help="存储模式，覆盖配置文件中的设置")
+    parser.add_argument("--job", help="使用全局配置中该名称的备份任务的源路径、备份目录和间隔")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误信息")
+    parser.add_argument("--metrics-file", help="把每次操作的分阶段计时追加到该文件（每行一个 JSON），覆盖配置文件中的设置")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="为本次命令的第一个操作采集性能分析数据（cpu: cProfile，memory: tracemalloc），"
+                             "保存到备份目录的 .profiles 文件夹")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    backup = commands.add_parser("backup", help="立即备份一次")
+    backup.add_argument("--skip-unchanged", action="store_true", help="源文件没有变化时跳过")
+    backup.add_argument("--no-prune", action="store_true", help="备份后不按保留策略清理旧备份")
+
+    restore = commands.add_parser("restore", help="还原指定时间戳的备份")
+    restore.add_argument("timestamp", help="备份的时间戳（见 list 命令）")
+    restore.add_argument("--target", help="还原到的路径，默认为备份的源路径")
+    restore.add_argument("--no-pre-backup", action="store_true", help="还原前不备份当前文件")
+    restore.add_argument("--full", action="store_true", help="删除目标后完整还原，不使用差异还原")
+
+    listing = commands.add_parser("list", help="列出备份或日志，最新的在前")
+    listing.add_argument("--logs", action="store_true", help="列出日志而不是备份")
+    listing.add_argument("--limit", type=int, default=20, help="最多列出的条数（默认 %(default)s）")
+    listing.add_argument("--offset", type=int, default=0, help="跳过最新的若干条")
+
+    commands.add_parser("prune", help="按保留策略清理旧备份")
+
+    verify = commands.add_parser("verify", help="按完整性清单校验备份是否损坏，发现问题时返回 1")
+    verify.add_argument("timestamp", nargs="?", help="只校验该时间戳的备份，默认校验全部备份")
+    verify.add_argument("--max-age", type=float, metavar="DAYS",
+                        help="只校验从未校验过或上次校验早于 DAYS 天的备份（增量校验）")
+
+    daemon = commands.add_parser("daemon", help="持续自动备份，直到收到 SIGINT 或 SIGTERM")
+    daemon.add_argument("--interval", type=float, help="备份间隔（分钟），覆盖配置文件中的设置")
+    daemon.add_argument("--trigger", choices=("interval", "event"), help="触发方式，覆盖配置文件中的设置")
+    add_exporter_arguments(daemon)
+
+    jobs = commands.add_parser("jobs", help="按各自的间隔持续运行全局配置中所有启用的备份任务")
+    jobs.add_argument("--list", action="store_true", help="只列出备份任务")
+    jobs.add_argument("--max-concurrent", type=int, help="同时运行的任务数，覆盖配置文件中的设置")
+    add_exporter_arguments(jobs)
+    return parser
+
+
+def add_exporter_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="在本机该端口提供 Prometheus 指标（http://127.0.0.1:PORT/metrics）")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="每次备份后把 Prometheus 指标写入该文件（供 node_exporter 的 textfile collector 读取）")
+
+
+def start_exporter(settings, args):
+    """按配置文件和命令行参数启动指标导出，返回 (BackupMetrics, MetricsServer)，未启用时都为 None"""
+    options = normalize_exporter(settings.get("exporter"))
+    if args.metrics_port is not None:
+        options["port"] = args.metrics_port
+    if args.metrics_textfile:
+        options["textfile"] = os.path.abspath(args.metrics_textfile)
+    metrics, server = create_exporter(options)
+    if server is not None and not args.quiet:
+        host, port = server.address[:2]
+        print(f"Prometheus 指标: http://{host}:{port}/metrics", flush=True)
+    return metrics, server
+
+
+def load_cli_settings(args):
+    """读取全局配置，并应用 --job 选择的备份任务"""
+    settings = load_settings(args.config)
+    if args.job:
+        for job in settings["jobs"]:
+            if job.get("name") == args.job:
+                return job_settings(settings, job)
+        raise ValueError(f"找不到名称为 {args.job} 的备份任务")
+    return settings
+
+
+def create_engine(args):
+    """按配置文件和命令行参数创建引擎，并加载备份目录的配置"""
+    settings = load_cli_settings(args)
+    if args.source:
+        settings["source_path"] = os.path.abspath(args.source)
+        settings["is_directory"] = os.path.isdir(settings["source_path"])
+    if args.backup_dir:
+        settings["backup_dir"] = os.path.abspath(args.backup_dir)
+    if args.store_mode:
+        settings["store_mode"] = args.store_mode
+    if args.metrics_file:
+        settings["metrics_file"] = os.path.abspath(args.metrics_file)
+    if not settings["backup_dir"]:
+        raise ValueError("未设置备份目录，请使用 --backup-dir 或先在图形界面中设置")
+    engine = BackupEngine(settings, ConsoleListener(args.quiet))
+    engine.load_backup_config()
+    engine.profile_next = args.profile
+    return engine
+
+
+def check_source(engine):
+    source_path = engine.settings["source_path"]
+    if not source_path:
+        raise ValueError("未设置源文件，请使用 --source 或先在图形界面中设置")
+    if not os.path.exists(source_path):
+        raise ValueError(f"源文件不存在: {source_path}")
+
+
+def cmd_backup(engine, args):
+    check_source(engine)
+    with engine.lock:
+        backup_info = engine.perform_backup(skip_unchanged=args.skip_unchanged, prune=not args.no_prune)
+    if backup_info is not None:
+        engine.listener.status(f"各阶段用时: {format_timing(backup_info['timing'])}")
+
+
+def cmd_restore(engine, args):
+    backup_info = engine.find_backup(args.timestamp)
+    if backup_info is None:
+        raise ValueError(f"找不到时间戳为 {args.timestamp} 的备份")
+    if not snapshot_exists(backup_info):
+        raise ValueError(f"备份文件不存在: {backup_info['backup_path']}")
+    if not args.no_pre_backup:
+        check_source(engine)
+    with engine.lock:
+        restore_throughput = engine.restore_backup(backup_info, target_path=args.target,
+                                                   pre_backup=not args.no_pre_backup, full=args.full)
+    engine.listener.status(f"还原完成: {args.target or backup_info['original']}"
+                           f"（{format_throughput(restore_throughput)}）")
+
+
+def cmd_list(engine, args):
+    if args.logs:
+        for log in engine.fetch_logs(args.offset, args.limit):
+            info = log["backup_info"]
+            action = ACTION_NAMES.get(log["action"], log["action"])
+            print(f"{log['timestamp']}  {log['date']}  {action}  {os.path.basename(info.get('original', ''))}")
+        return
+    for backup in engine.fetch_backups(args.offset, args.limit):
+        kind = "[文件夹]" if backup.get("is_directory") else "[文件]"
+        print(f"{backup['timestamp']}  {backup['date']}  {kind} {os.path.basename(backup['original'])}  "
+              f"{get_format(backup)}")
+
+
+def cmd_prune(engine, args):
+    with engine.lock:
+        pruned = engine.apply_retention()
+    if not pruned:
+        engine.listener.status("没有需要清理的备份（或未启用保留策略）")
+
+
+def format_verify_result(result):
+    """校验结果的简短描述"""
+    if result["ok"]:
+        return f"正常（{result['checked']} 个文件）"
+    problems = []
+    if result["corrupt"]:
+        problems.append(f"{len(result['corrupt'])} 个文件已损坏")
+    if result["missing"]:
+        problems.append(f"{len(result['missing'])} 个文件丢失")
+    if result["extra"]:
+        problems.append(f"{len(result['extra'])} 个多余文件")
+    if result["error"]:
+        problems.append(f"读取失败: {result['error']}")
+    return "，".join(problems)
+
+
+def cmd_verify(engine, args):
+    if args.timestamp:
+        backup_info = engine.find_backup(args.timestamp)
+        if backup_info is None:
+            raise ValueError(f"找不到时间戳为 {args.timestamp} 的备份")
+        result = engine.verify_backup(backup_info)
+        if result is None:
+            raise ValueError("该备份没有完整性清单（在启用完整性清单之前创建）")
+        results = [(backup_info, result)]
+    else:
+        results = engine.verify_backups(args.max_age)
+    failed = 0
+    for backup_info, result in results:
+        if not result["ok"]:
+            failed += 1
+            print(f"{backup_info['timestamp']}  {format_verify_result(result)}", file=sys.stderr, flush=True)
+            for rel_path in (result["corrupt"] + result["missing"])[:20]:
+                print(f"    {rel_path}", file=sys.stderr, flush=True)
+        else:
+            engine.listener.status(f"{backup_info['timestamp']}  {format_verify_result(result)}")
+    engine.listener.status(f"已校验 {len(results)} 个备份，{failed} 个有问题")
+    return 1 if failed else 0
+
+
+def cmd_daemon(engine, args):
+    check_source(engine)
+    if args.interval is not None:
+        engine.settings["interval"] = args.interval
+    if args.trigger:
+        engine.settings["trigger_mode"] = args.trigger
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    engine.metrics, server = start_exporter(engine.settings, args)
+    engine.metrics_job = args.job or ""
+    engine.listener.status(f"开始自动备份: {engine.settings['source_path']}")
+    while not stop_event.is_set():
+        try:
+            engine.run_auto_backup(stop_event.is_set)
+        except Exception as e:
+            # 守护进程不退出，下一个备份间隔后重试（如源文件暂时被占用、备份目录所在磁盘暂时离线）
+            print(f"自动备份失败: {str(e)}", file=sys.stderr, flush=True)
+            stop_event.wait(engine.settings["interval"] * 60)
+    if server is not None:
+        server.stop()
+    engine.listener.status("已停止自动备份")
+
+
+def cmd_jobs(args):
+    # 延迟导入，其他命令不需要调度器
+    from asbt.scheduler import create_job_scheduler
+
+    settings = load_settings(args.config)
+    if args.list:
+        for job in settings["jobs"]:
+            state = "" if job.get("enabled", True) else "  (已停用)"
+            print(f"{job.get('name')}  每 {job.get('interval')} 分钟  {job.get('source_path')} -> "
+                  f"{job.get('backup_dir')}{state}")
+        return
+    if args.max_concurrent is not None:
+        settings["max_concurrent_jobs"] = args.max_concurrent
+    if args.metrics_file:
+        settings["metrics_file"] = os.path.abspath(args.metrics_file)
+
+    def on_error(name, error):
+        print(f"[{name}] 备份失败: {str(error)}", file=sys.stderr, flush=True)
+
+    metrics, server = start_exporter(settings, args)
+    scheduler, engines = create_job_scheduler(settings, lambda name: ConsoleListener(args.quiet, f"[{name}] "),
+                                              on_error, metrics)
+    if not engines:
+        if server is not None:
+            server.stop()
+        raise ValueError("没有启用的备份任务")
+    stop_event = threading.Event()
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    scheduler.start()
+    if not args.quiet:
+        print(f"已启动 {len(engines)} 个备份任务，最多同时运行 {scheduler.max_concurrent} 个", flush=True)
+    while not stop_event.wait(1):
+        pass
+    scheduler.stop()
+    # 等待正在运行的备份完成，避免留下不完整的快照
+    scheduler.wait_idle()
+    if server is not None:
+        server.stop()
+    if not args.quiet:
+        print("已停止全部备份任务", flush=True)
+
+
+COMMANDS = {
+    "backup": cmd_backup,
+    "restore": cmd_restore,
+    "list": cmd_list,
+    "prune": cmd_prune,
+    "verify": cmd_verify,
+    "daemon": cmd_daemon,
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "jobs":
+            # 每个任务有自己的引擎
+            cmd_jobs(args)
+            return 0
+        engine = create_engine(args)
+        # 命令可以返回非 0 的退出码（如校验发现损坏）
+        return COMMANDS[args.command](engine, args) or 0
+    except Exception as e:
+        print(f"错误: {str(e)}", file=sys.stderr)
+        return 1
@@ -0,0 +1,284 @@
+import os
+import sys
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，不支持 reflink
+    fcntl = None
+
+from asbt.scan import scan_source
+
+
+# 默认复制线程数。小文件多时瓶颈在每个文件的打开/关闭等系统调用上，
+# 并行复制能明显提高 SSD 上的速度；机械硬盘上可以在高级设置中改为 1
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+# 复制方式，按开销从小到大排列
+STRATEGY_REFLINK = "reflink"  # 写时复制克隆（btrfs、XFS 等），不复制数据
+STRATEGY_COPY_FILE_RANGE = "copy_file_range"  # 在内核中复制，不经过用户空间
+STRATEGY_COPY = "copy"  # 普通复制（shutil.copyfile）
+STRATEGY_HARDLINK = "hardlink"  # 未变化的文件硬链接到上一次快照，只用于统计
+STRATEGY_RENAME = "rename"  # 还原前直接把源重命名为快照，只用于统计
+STRATEGIES = [STRATEGY_REFLINK, STRATEGY_COPY_FILE_RANGE, STRATEGY_COPY]
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+# 需要报告进度时（如单个文件的备份需要限速）按块复制，每复制一块调用一次进度回调
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 这些错误表示文件系统或内核不支持该复制方式，换下一种方式重试
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                       errno.EBADF, errno.EPERM, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+
+class ProgressCounter:
+    """线程安全的进度计数，每完成一项调用一次 progress(done, total)
+
+    progress 为 None 时不做任何事；progress 抛出的异常（如任务被取消）会传给调用方
+    """
+
+    def __init__(self, total, progress=None):
+        self.total = total
+        self.progress = progress
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def step(self, count=1):
+        if self.progress is None:
+            return
+        with self._lock:
+            self.done += count
+            done = self.done
+        self.progress(done, self.total)
+
+
+def run_parallel(func, items, workers):
+    """用线程池并行执行 func(item)，按 items 的顺序返回结果列表
+
+    任意一项失败时抛出该异常（已提交的任务会执行完再返回）
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+# 以下复制函数的 progress 为 progress(已复制字节数, 文件大小)，为 None 时一次复制完
+
+def _copy_reflink(source, target, progress=None):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        if progress is not None:
+            # 克隆不读写数据，只在完成时报告一次
+            size = os.fstat(src.fileno()).st_size
+            progress(size, size)
+
+
+def _copy_file_range(source, target, progress=None):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        remaining = size
+        while remaining > 0:
+            count = remaining if progress is None else min(remaining, COPY_CHUNK_SIZE)
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), count)
+            if copied == 0:
+                # 部分虚拟文件系统会直接返回 0，改用普通复制
+                raise OSError(errno.EINVAL, "copy_file_range 未复制任何数据")
+            remaining -= copied
+            if progress is not None:
+                progress(size - remaining, size)
+
+
+def _copy_plain(source, target, progress=None):
+    if progress is None:
+        shutil.copyfile(source, target)
+        return
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        done = 0
+        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+            dst.write(chunk)
+            done += len(chunk)
+            progress(done, size)
+
+
+_COPY_FUNCTIONS = {
+    STRATEGY_REFLINK: _copy_reflink,
+    STRATEGY_COPY_FILE_RANGE: _copy_file_range,
+    STRATEGY_COPY: _copy_plain,
+}
+
+
+def _supported_strategies():
+    strategies = []
+    if fcntl is not None and sys.platform.startswith("linux"):
+        strategies.append(STRATEGY_REFLINK)
+    if hasattr(os, "copy_file_range"):
+        strategies.append(STRATEGY_COPY_FILE_RANGE)
+    strategies.append(STRATEGY_COPY)
+    return strategies
+
+
+_probed = {}
+_probed_lock = threading.Lock()
+
+
+def probe_strategy(directory):
+    """探测目录所在文件系统支持的开销最小的复制方式
+
+    在目录中创建一个临时文件，依次尝试 reflink、copy_file_range，结果按目录缓存
+    """
+    key = os.path.normcase(os.path.abspath(directory))
+    with _probed_lock:
+        if key in _probed:
+            return _probed[key]
+
+    strategy = STRATEGY_COPY
+    probe_source = os.path.join(directory, f".asbt_probe_{os.getpid()}_{threading.get_ident()}")
+    probe_target = probe_source + ".copy"
+    try:
+        with open(probe_source, "wb") as f:
+            f.write(b"\0" * 4096)
+        for name in _supported_strategies():
+            try:
+                _COPY_FUNCTIONS[name](probe_source, probe_target)
+                if os.path.getsize(probe_target) == 4096:
+                    strategy = name
+                    break
+            except OSError:
+                continue
+    except OSError:
+        # 目录不可写时按普通复制处理，真正复制时会报出错误
+        pass
+    finally:
+        for path in (probe_source, probe_target):
+            if os.path.exists(path):
+                os.remove(path)
+
+    with _probed_lock:
+        _probed[key] = strategy
+    return strategy
+
+
+class FileCopier:
+    """按探测到的复制方式复制文件
+
+    某种方式在实际复制时不可用（如源文件和备份不在同一文件系统上，reflink 会失败），
+    就换下一种方式重试，并且之后不再尝试它。counts 记录每种方式复制的文件数。
+    """
+
+    def __init__(self, strategy=STRATEGY_COPY):
+        self.strategy = strategy
+        self.counts = {}
+        self._disabled = set()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def copy(self, source, target, progress=None):
+        """复制文件内容和属性（相当于 shutil.copy2）
+
+        参数:
+            progress: 按块复制并调用 progress(已复制字节数, 文件大小)，为 None 时一次复制完
+        """
+        for name in STRATEGIES[STRATEGIES.index(self.strategy):]:
+            if name in self._disabled:
+                continue
+            try:
+                _COPY_FUNCTIONS[name](source, target, progress)
+            except OSError as e:
+                if name == STRATEGY_COPY or e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                with self._lock:
+                    self._disabled.add(name)
+                continue
+            shutil.copystat(source, target)
+            self._count(name)
+            return name
+
+    def link(self, existing, target):
+        """把 target 硬链接到已有文件，失败时返回 False"""
+        try:
+            os.link(existing, target)
+        except OSError:
+            return False
+        self._count(STRATEGY_HARDLINK)
+        return True
+
+
+def create_copier(directory):
+    """为写入 directory 的复制创建 FileCopier"""
+    return FileCopier(probe_strategy(directory))
+
+
+def copy_tree(source_path, target_path, workers=DEFAULT_WORKERS, scan=None, reuse=None, copier=None,
+              progress=None):
+    """并行复制文件夹
+
+    先创建全部目录，再用线程池并行复制文件，最后从深到浅复制目录属性
+    （放在最后是为了避免写入文件时目录的修改时间被刷新）。
+
+    参数:
+        source_path: 源文件夹
+        target_path: 目标路径（不能已存在）
+        workers: 复制线程数
+        scan: 源文件夹的扫描结果（见 asbt.scan.scan_source），None 时重新扫描
+        reuse: {相对路径: 已有文件的路径}，这些文件优先硬链接，失败时退回复制
+        copier: FileCopier，None 时按目标所在文件系统探测复制方式
+        progress: 进度回调 progress(已完成文件数, 总文件数)
+
+    返回 {"copied": 复制的文件数, "reused": 硬链接的文件数, "bytes": 文件总大小}
+    """
+    if scan is None:
+        scan = scan_source(source_path, True)
+    reuse = reuse or {}
+    if copier is None:
+        copier = create_copier(os.path.dirname(os.path.abspath(target_path)))
+    counter = ProgressCounter(len(scan["files"]), progress)
+
+    os.makedirs(target_path)
+    for rel_dir in scan["dirs"]:
+        os.makedirs(os.path.join(target_path, *rel_dir.split("/")), exist_ok=True)
+
+    def copy_one(rel_path):
+        parts = rel_path.split("/")
+        target = os.path.join(target_path, *parts)
+        existing = reuse.get(rel_path)
+        # 文件系统不支持硬链接或已有文件已丢失时，退回复制
+        linked = existing is not None and copier.link(existing, target)
+        if not linked:
+            copier.copy(os.path.join(source_path, *parts), target)
+        counter.step()
+        return linked
+
+    linked = run_parallel(copy_one, scan["files"], workers)
+
+    # scan["dirs"] 已排序，父目录总在子目录之前，倒序即从深到浅
+    for rel_dir in reversed(scan["dirs"]):
+        parts = rel_dir.split("/")
+        shutil.copystat(os.path.join(source_path, *parts), os.path.join(target_path, *parts))
+    shutil.copystat(source_path, target_path)
+
+    reused = sum(linked)
+    return {
+        "copied": len(linked) - reused,
+        "reused": reused,
+        "bytes": sum(record[0] for record in scan["files"].values()),
+    }
+
+
+def throughput(file_count, total_bytes, seconds):
+    """计算吞吐量，返回 {"seconds", "files_per_sec", "mb_per_sec"}"""
+    seconds = max(seconds, 1e-6)
+    return {
+        "seconds": round(seconds, 3),
+        "files_per_sec": round(file_count / seconds, 1),
+        "mb_per_sec": round(total_bytes / seconds / (1024 * 1024), 2),
+    }
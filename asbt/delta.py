@@ -0,0 +1,275 @@
+import os
+import json
+import struct
+import hashlib
+
+
+# 块级增量快照
+#
+# 单个大文件（如数据库式存档）每次只有少量数据块变化。增量快照只保存与上一次快照
+# 相比发生变化的块，其余块从上一次快照（base）中读取；每隔若干次保存一次完整的
+# 关键帧，保证还原时需要读取的快照链长度有上限。
+#
+# 文件格式：按块序号顺序存放的数据块 + JSON 头部 + 8 字节头部长度 + MAGIC
+# 头部放在末尾，这样写入时可以边读源文件边写数据，不需要把变化的块留在内存里。
+# 头部中 hashes 记录文件所有块的哈希值（用于下一次比较），blocks 记录本快照
+# 保存了哪些块以及它们在数据区中的位置 [[块序号, 偏移, 长度], ...]。
+
+MAGIC = b"ASBTDLT1"
+_LENGTH = struct.Struct(">Q")
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def _block_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_header(path):
+    """读取增量快照的头部"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        trailer_size = _LENGTH.size + len(MAGIC)
+        if file_size < trailer_size:
+            raise ValueError(f"不是有效的增量快照: {path}")
+        f.seek(file_size - trailer_size)
+        trailer = f.read(trailer_size)
+        if trailer[_LENGTH.size:] != MAGIC:
+            raise ValueError(f"不是有效的增量快照: {path}")
+        (length,) = _LENGTH.unpack(trailer[:_LENGTH.size])
+        f.seek(file_size - trailer_size - length)
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+class _DeltaWriter:
+    """按块序号顺序写入数据块，最后写入头部"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "wb")
+        self.blocks = []
+        self.offset = 0
+
+    def add_block(self, index, data):
+        self.file.write(data)
+        self.blocks.append([index, self.offset, len(data)])
+        self.offset += len(data)
+
+    def commit(self, header):
+        header = dict(header, blocks=self.blocks)
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self.file.write(encoded)
+        self.file.write(_LENGTH.pack(len(encoded)))
+        self.file.write(MAGIC)
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        return self.offset
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def create_delta(source_path, backup_path, previous_path=None, keyframe_interval=10,
+                 block_size=DEFAULT_BLOCK_SIZE, progress=None):
+    """创建块级增量快照
+
+    参数:
+        source_path: 源文件
+        backup_path: 快照保存路径
+        previous_path: 上一次增量快照的路径，为 None 时保存关键帧
+        keyframe_interval: 每隔多少次快照保存一次完整关键帧
+        block_size: 分块大小（字节）
+        progress: 进度回调 progress(已处理块数, 总块数)
+
+    返回需要合并到备份记录中的信息
+    """
+    previous = None
+    if previous_path and os.path.exists(previous_path):
+        previous = read_header(previous_path)
+        # 链过长或分块大小变化时重新保存关键帧
+        if previous["depth"] + 1 >= keyframe_interval or previous["block_size"] != block_size:
+            previous = None
+
+    previous_hashes = previous["hashes"] if previous else []
+    hashes = []
+    size = 0
+    st = os.stat(source_path)
+    block_total = (st.st_size + block_size - 1) // block_size
+    writer = _DeltaWriter(backup_path)
+    try:
+        with open(source_path, "rb") as f:
+            index = 0
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    break
+                size += len(data)
+                digest = _block_hash(data)
+                hashes.append(digest)
+                if index >= len(previous_hashes) or previous_hashes[index] != digest:
+                    writer.add_block(index, data)
+                index += 1
+                if progress is not None:
+                    progress(index, max(index, block_total))
+
+        header = {
+            "version": 1,
+            "name": os.path.basename(source_path),
+            "size": size,
+            "mtime": st.st_mtime,
+            "mode": st.st_mode & 0o7777,
+            "block_size": block_size,
+            "base": os.path.basename(previous_path) if previous else None,
+            "depth": previous["depth"] + 1 if previous else 0,
+            "hashes": hashes,
+        }
+        changed_blocks = len(writer.blocks)
+        stored_bytes = writer.commit(header)
+    except BaseException:
+        writer.abort()
+        raise
+
+    return {
+        "delta_base": header["base"],
+        "delta_depth": header["depth"],
+        "keyframe": previous is None,
+        "total_bytes": size,
+        "stored_bytes": stored_bytes,
+        "changed_blocks": changed_blocks,
+        "block_count": len(hashes),
+    }
+
+
+def _load_chain(backup_path):
+    """从指定快照沿 base 向前读取，直到关键帧，返回 [(路径, 头部)]，最新的在前"""
+    directory = os.path.dirname(backup_path)
+    chain = []
+    path = backup_path
+    while path:
+        header = read_header(path)
+        chain.append((path, header))
+        path = os.path.join(directory, header["base"]) if header["base"] else None
+    return chain
+
+
+def iter_blocks(backup_path, limit=None):
+    """按顺序还原文件内容，逐块返回数据
+
+    参数:
+        limit: 只还原前 limit 字节（用于预览），None 表示完整还原
+    """
+    chain = _load_chain(backup_path)
+    header = chain[0][1]
+    size = header["size"] if limit is None else min(limit, header["size"])
+    block_size = header["block_size"]
+    block_count = (size + block_size - 1) // block_size
+
+    # 每个块取链中最新保存它的快照
+    locations = {}
+    for path, chain_header in reversed(chain):
+        for index, offset, length in chain_header["blocks"]:
+            locations[index] = (path, offset, length)
+
+    files = {}
+    try:
+        remaining = size
+        for index in range(block_count):
+            path, offset, length = locations[index]
+            f = files.get(path)
+            if f is None:
+                f = files[path] = open(path, "rb")
+            f.seek(offset)
+            data = f.read(min(length, remaining))
+            remaining -= len(data)
+            yield data
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def restore_delta(backup_path, target_path, progress=None):
+    """把增量快照还原为完整文件
+
+    参数:
+        progress: 进度回调 progress(已还原块数, 总块数)
+    """
+    header = read_header(backup_path)
+    block_total = len(header["hashes"])
+    tmp_path = target_path + ".asbt_restore"
+    try:
+        with open(tmp_path, "wb") as f:
+            for index, data in enumerate(iter_blocks(backup_path), 1):
+                f.write(data)
+                if progress is not None:
+                    progress(index, block_total)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, target_path)
+    os.chmod(target_path, header["mode"])
+    os.utime(target_path, (header["mtime"], header["mtime"]))
+
+
+def delete_delta(backup_path):
+    """删除增量快照
+
+    以它为 base 的后续快照会先合并它保存的块，再改为指向它的 base，保证删除后
+    后续快照仍可还原。返回释放的字节数（合并后净减少的大小）。
+    """
+    header = read_header(backup_path)
+    directory = os.path.dirname(backup_path)
+    name = os.path.basename(backup_path)
+    freed = os.path.getsize(backup_path)
+
+    for child_path in _find_children(directory, name, header["name"]):
+        before = os.path.getsize(child_path)
+        _rebase_child(child_path, backup_path, header)
+        freed -= os.path.getsize(child_path) - before
+
+    os.remove(backup_path)
+    return freed
+
+
+def _find_children(directory, name, source_name):
+    """查找 base 指向 name 的快照（同一源的快照文件名都以 "源文件名_" 开头）"""
+    children = []
+    prefix = f"{source_name}_"
+    for entry in os.scandir(directory):
+        if entry.name == name or not entry.name.startswith(prefix) or not entry.is_file():
+            continue
+        try:
+            if read_header(entry.path)["base"] == name:
+                children.append(entry.path)
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def _rebase_child(child_path, parent_path, parent_header):
+    """把父快照中子快照缺少的块合并到子快照中，子快照改为指向父快照的 base"""
+    child_header = read_header(child_path)
+    child_count = len(child_header["hashes"])
+    child_blocks = {index: (offset, length) for index, offset, length in child_header["blocks"]}
+    parent_blocks = {index: (offset, length) for index, offset, length in parent_header["blocks"]
+                     if index < child_count and index not in child_blocks}
+
+    writer = _DeltaWriter(child_path)
+    try:
+        with open(child_path, "rb") as child, open(parent_path, "rb") as parent:
+            for index in sorted(set(child_blocks) | set(parent_blocks)):
+                if index in child_blocks:
+                    f, (offset, length) = child, child_blocks[index]
+                else:
+                    f, (offset, length) = parent, parent_blocks[index]
+                f.seek(offset)
+                writer.add_block(index, f.read(length))
+        child_header = dict(child_header, base=parent_header["base"], depth=parent_header["depth"])
+        child_header.pop("blocks")
+        writer.commit(child_header)
+    except BaseException:
+        writer.abort()
+        raise
@@ -0,0 +1,1008 @@
+import os
+import json
+import time
+import copy
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from asbt.snapshot import (FORMAT_COPY, FORMAT_DELTA, FORMAT_ARCHIVE, DEFAULT_CONSISTENCY, create_snapshot,
+                           move_into_snapshot, restore_snapshot, delete_snapshot, get_format, resolve_format, snapshot_suffix,
+                           snapshot_content_size)
+from asbt.archive import ARCHIVE_TYPES
+from asbt.copier import DEFAULT_WORKERS, throughput
+from asbt.journal import get_journal, backup_key
+from asbt.catalog import get_catalog
+from asbt.statcache import StatCache
+from asbt.index import get_index
+from asbt.scan import scan_source, diff_scan
+from asbt.watcher import create_watcher, wait_for_quiet_change
+from asbt.retention import DEFAULT_POLICY, normalize_policy, select_backups_to_prune
+from asbt.throttle import DEFAULT_THROTTLE, Throttle, normalize_throttle, lower_priority
+from asbt.integrity import write_integrity, verify_snapshot, needs_verify
+from asbt.restore import DEFAULT_RESTORE, normalize_restore, restore_differential
+from asbt.profiling import OperationTimer, ProfileCapture, append_metrics
+from asbt.exporter import DEFAULT_EXPORTER, RESULT_SUCCESS, RESULT_SKIPPED, RESULT_FAILED
+from asbt.ledger import get_ledger, scan_directory
+
+
+# 全局配置文件（界面和命令行共用）
+GLOBAL_CONFIG_FILE = os.path.join(os.path.expanduser("~"), "autoSaveBackupTool_config.json")
+
+# 日志操作类型的显示名称
+ACTION_NAMES = {
+    "backup": "备份",
+    "restore": "还原",
+    "delete": "删除",
+    "restore_deleted": "恢复删除的备份",
+    "rollback": "回溯操作",
+    "skip": "跳过(未变化)",
+    "prune": "清理旧备份",
+}
+
+
+def default_settings():
+    """默认全局配置"""
+    return {
+        "source_path": "",
+        "is_directory": False,
+        "backup_dir": "",
+        "backup_dirs": [],  # 历史备份目录列表
+        "interval": 5,  # 默认备份间隔（分钟）
+        "store_mode": FORMAT_COPY,  # 存储模式（快照格式），见 asbt.snapshot
+        "trigger_mode": "interval",  # 自动备份触发方式：interval（定时）或 event（文件变化）
+        "quiet_seconds": 10,  # 文件变化触发时，写入后需要静默的时间（秒）
+        "delta_keyframe_interval": 10,  # 块级增量每隔多少次备份保存一次完整关键帧
+        "delta_block_size_kb": 64,  # 块级增量的分块大小（KB）
+        "archive_type": "tar.gz",  # 压缩归档的格式，见 asbt.archive.ARCHIVE_TYPES
+        "copy_workers": DEFAULT_WORKERS,  # 文件夹备份和还原时并行复制的线程数
+        "retention": dict(DEFAULT_POLICY),  # 旧备份保留策略，见 asbt.retention
+        "use_catalog": True,  # 在备份目录中维护 SQLite 目录（catalog.db），按时间戳查找记录时使用索引
+        "stat_cache_ttl": StatCache.DEFAULT_TTL,  # 备份列表中路径是否存在的缓存时间（秒），0 表示不缓存
+        "stat_validator": True,  # 后台定期校验缓存的路径，发现外部删除后刷新列表
+        "consistency": dict(DEFAULT_CONSISTENCY),  # 一致性模式：复制后检查源是否在复制期间被修改，见 asbt.snapshot
+        "integrity": True,  # 每次备份后生成完整性清单（每个文件的大小和校验值），用于校验备份是否损坏
+        "restore": dict(DEFAULT_RESTORE),  # 差异还原：只写入变化的文件，见 asbt.restore
+        "metrics_file": "",  # 每次操作的分阶段计时追加到该文件（每行一个 JSON），为空时只记录在日志中
+        "exporter": dict(DEFAULT_EXPORTER),  # 自动备份的 Prometheus 指标导出（文本文件或本机端口），见 asbt.exporter
+        "throttle": dict(DEFAULT_THROTTLE),  # 自动备份的限速和低优先级设置，见 asbt.throttle
+        "jobs": [],  # 备份任务列表，每个任务有自己的源路径、备份目录、间隔和保留策略，见 job_settings
+        "max_concurrent_jobs": 1,  # 同时运行的备份任务数
+        "job_stagger_seconds": 30,  # 两个备份任务开始的最小间隔（秒）
+    }
+
+
+# 备份任务可以覆盖的全局配置字段，任务中没有的字段使用全局配置
+JOB_FIELDS = ("source_path", "is_directory", "backup_dir", "interval", "store_mode", "retention")
+
+
+def load_settings(path=GLOBAL_CONFIG_FILE):
+    """读取全局配置文件，只保留默认配置中存在的字段"""
+    settings = default_settings()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        for key, value in loaded.items():
+            if key in settings:
+                settings[key] = value
+        # 兼容旧版本配置：有备份目录但没有历史备份目录列表
+        if "backup_dirs" not in loaded and loaded.get("backup_dir"):
+            settings["backup_dirs"] = [loaded["backup_dir"]]
+    return settings
+
+
+def job_settings(settings, job):
+    """备份任务的配置：全局配置加上任务自己的字段（见 JOB_FIELDS）
+
+    参数:
+        job: {"name", "source_path", "is_directory", "backup_dir", "interval", "enabled"}，
+             可选 "store_mode" 和 "retention"
+    """
+    merged = copy.deepcopy({key: value for key, value in settings.items() if key not in ("jobs", "backup_dirs")})
+    for key in JOB_FIELDS:
+        if job.get(key) is not None:
+            merged[key] = copy.deepcopy(job[key])
+    return merged
+
+
+def validate_jobs(jobs, reserved_dirs=()):
+    """检查备份任务的配置，有误时抛出 ValueError
+
+    每个任务的引擎在内存中维护自己备份目录的记录，多个任务（或界面）同时写入同一个备份目录会互相覆盖，
+    所以每个任务必须使用单独的备份目录
+
+    参数:
+        reserved_dirs: 任务不能使用的备份目录（如界面当前的备份目录）
+    """
+    names = set()
+    used_dirs = {os.path.normcase(os.path.abspath(d)) for d in reserved_dirs if d}
+    for job in jobs:
+        name = job.get("name", "").strip()
+        if not name:
+            raise ValueError("备份任务的名称不能为空")
+        if name in names:
+            raise ValueError(f"备份任务名称重复: {name}")
+        names.add(name)
+        if not job.get("source_path") or not job.get("backup_dir"):
+            raise ValueError(f"备份任务 {name} 未设置源文件或备份目录")
+        try:
+            if float(job.get("interval", 0)) <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"备份任务 {name} 的备份间隔无效")
+        backup_dir = os.path.normcase(os.path.abspath(job["backup_dir"]))
+        if backup_dir in used_dirs:
+            raise ValueError(f"备份任务 {name} 的备份目录已被其他任务或当前备份目录使用")
+        used_dirs.add(backup_dir)
+
+
+def format_throughput(stats):
+    """将吞吐量转换为可读格式"""
+    return f"{stats['files_per_sec']} 文件/秒，{stats['mb_per_sec']} MB/秒"
+
+
+def new_timestamp():
+    """备份和日志的时间戳，精确到毫秒"""
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:19]  # 取前19位，包含到毫秒级别
+
+
+class EngineListener:
+    """引擎事件的接收者，默认什么都不做
+
+    引擎的方法可能在后台线程中调用，界面实现这些方法时需要自己切回主线程
+    """
+
+    def status(self, text):
+        """状态信息"""
+
+    def backup_added(self, backup_info):
+        """新增了一个备份"""
+
+    def backups_changed(self):
+        """备份列表发生了较大的变化（如按保留策略清理），需要整体刷新"""
+
+    def log_added(self, log):
+        """新增了一条日志"""
+
+    def log_updated(self, log):
+        """最后一条日志被更新（连续跳过的备份合并为一条日志）"""
+
+
+class BackupEngine:
+    """备份引擎：备份、还原、删除、保留策略和日志，不依赖 tkinter
+
+    settings 为全局配置（界面中的 global_config，两者是同一个字典，界面修改后立即生效），
+    backup_config 为当前备份目录的 {"backups": [...], "logs": [...]}。
+    修改备份目录的操作都应在持有 lock 时执行，界面的后台任务、自动备份和命令行共用这把锁。
+    出错时直接抛出异常，由调用方决定如何提示。
+    """
+
+    def __init__(self, settings=None, listener=None):
+        self.settings = settings if settings is not None else default_settings()
+        self.listener = listener or EngineListener()
+        self.backup_config = {
+            "backups": [],
+            "logs": []  # 日志记录列表
+        }
+        self.lock = threading.RLock()
+        self._loaded = False
+        # 为下一次操作采集性能分析数据（asbt.profiling.PROFILE_CPU 或 PROFILE_MEMORY），采集一次后清空
+        self.profile_next = None
+        # 自动备份的 Prometheus 指标（asbt.exporter.BackupMetrics），由守护进程、备份任务或界面设置
+        self.metrics = None
+        self.metrics_job = ""  # 指标中的 job 标签，为空时使用源文件名
+        self._ledger_thread = None  # 在后台建立大小台账的线程，见 observe_backup
+
+    @property
+    def backup_dir(self):
+        return self.settings["backup_dir"]
+
+    # ---- 备份目录配置 ----
+
+    def load_backup_config(self):
+        """读取当前备份目录的 config.json 并重放 journal"""
+        if not self.backup_dir:
+            return
+        self._loaded = True
+        journal = get_journal(self.backup_dir)
+        if journal.exists():
+            loaded_config = journal.load()
+            for key, value in loaded_config.items():
+                if key in self.backup_config:
+                    self.backup_config[key] = value
+        # 目录与 journal 不一致时（如旧版本创建的备份目录）重新导入
+        self.sync_catalog()
+
+    def save_backup_config(self, replaced=False):
+        """完整写入 config.json 并清空 journal（压缩），单条记录的变化请使用 append_journal
+
+        参数:
+            replaced: 备份配置被整体替换过（如迁移旧版本配置、为新目录创建空白配置），需要重建 SQLite 目录；
+                      journal 较长时的压缩不需要，append_journal 已经逐条同步了目录
+
+        没有设置备份目录或目录不存在时返回 False
+        """
+        if not self.backup_dir or not os.path.exists(self.backup_dir):
+            self.listener.status("未设置备份目录或目录不存在，无法保存配置")
+            return False
+        with self.measure("save_config") as timer:
+            with timer.span("journal", len(self.backup_config["logs"])):
+                get_journal(self.backup_dir).compact(self.backup_config)
+            # 压缩不改变 journal 序号，目录已同步时 sync 不做任何事
+            with timer.span("catalog"):
+                self.sync_catalog(rebuild=replaced)
+        return True
+
+    def switch_backup_dir(self, directory):
+        """切换到指定的备份目录，返回是否加载了已有的配置"""
+        # 保存当前备份配置（如果有）
+        if self.backup_dir and os.path.exists(self.backup_dir):
+            self.save_backup_config()
+        self.settings["backup_dir"] = directory
+        if get_journal(directory).exists():
+            self.load_backup_config()
+            return True
+        # 新目录中没有配置文件，创建一个空白配置
+        self.backup_config = {
+            "backups": [],
+            "logs": []
+        }
+        self._loaded = True
+        self.save_backup_config(replaced=True)
+        return False
+
+    def append_journal(self, op, **fields):
+        """把一条备份记录或日志的变化追加到备份目录的 journal 中
+
+        每次只追加一行，journal 较长时再完整保存一次配置（压缩）。
+        参数见 asbt.journal.apply_entry
+        """
+        backup_dir = self.backup_dir
+        if not backup_dir or not os.path.exists(backup_dir):
+            self.listener.status("未设置备份目录或目录不存在，无法保存配置")
+            return
+        try:
+            journal = get_journal(backup_dir)
+            need_compact = journal.append(op, **fields)
+        except Exception as e:
+            self.listener.status(f"保存备份目录配置失败: {str(e)}")
+            return
+        catalog = self.get_backup_catalog()
+        if catalog is not None:
+            try:
+                if not catalog.apply(op, fields, journal.seq):
+                    # 目录落后于 journal，用内存中的完整配置重建
+                    catalog.import_data(self.backup_config, journal.seq)
+            except Exception as e:
+                self.listener.status(f"更新备份目录数据库失败: {str(e)}")
+        if need_compact:
+            try:
+                self.save_backup_config()
+            except Exception as e:
+                self.listener.status(f"保存备份目录配置失败: {str(e)}")
+
+    # ---- SQLite 目录 ----
+
+    def get_backup_catalog(self):
+        """当前备份目录的 SQLite 目录，未启用或不可用时返回 None"""
+        backup_dir = self.backup_dir
+        if not self.settings.get("use_catalog") or not backup_dir or not os.path.exists(backup_dir):
+            return None
+        return get_catalog(backup_dir)
+
+    def sync_catalog(self, rebuild=False):
+        """让 SQLite 目录与当前备份配置保持一致
+
+        参数:
+            rebuild: 为 True 时总是重新导入，否则只在目录的 journal 序号不一致时导入
+        """
+        catalog = self.get_backup_catalog()
+        if catalog is None:
+            return
+        journal = get_journal(self.backup_dir)
+        try:
+            if journal.seq is None:
+                journal.load()
+            if rebuild:
+                catalog.import_data(self.backup_config, journal.seq)
+            else:
+                catalog.sync(self.backup_config, journal.seq)
+        except Exception as e:
+            # 目录只是查询加速，失败时退回在内存中查找
+            self.listener.status(f"同步备份目录数据库失败: {str(e)}")
+
+    def find_backup(self, timestamp):
+        """按时间戳查找备份记录，启用 SQLite 目录时使用索引查询"""
+        catalog = self.get_backup_catalog()
+        if catalog is not None:
+            try:
+                return catalog.find_backup(timestamp)
+            except Exception as e:
+                self.listener.status(f"查询备份目录数据库失败: {str(e)}")
+        for backup in self.backup_config["backups"]:
+            if backup["timestamp"] == timestamp:
+                return backup
+        return None
+
+    def find_log(self, timestamp):
+        """按时间戳查找日志，启用 SQLite 目录时使用索引查询"""
+        catalog = self.get_backup_catalog()
+        if catalog is not None:
+            try:
+                return catalog.find_log(timestamp)
+            except Exception as e:
+                self.listener.status(f"查询备份目录数据库失败: {str(e)}")
+        for log in self.backup_config["logs"]:
+            if log["timestamp"] == timestamp:
+                return log
+        return None
+
+    def fetch_backups(self, offset, limit):
+        """从新到旧分页读取备份记录，启用 SQLite 目录时直接查询目录"""
+        catalog = self.get_backup_catalog()
+        if catalog is not None:
+            try:
+                return catalog.page_backups(offset, limit)
+            except Exception as e:
+                self.listener.status(f"查询备份目录数据库失败: {str(e)}")
+        return _page_records(self.backup_config["backups"], offset, limit)
+
+    def fetch_logs(self, offset, limit):
+        """从新到旧分页读取日志，启用 SQLite 目录时直接查询目录"""
+        catalog = self.get_backup_catalog()
+        if catalog is not None:
+            try:
+                return catalog.page_logs(offset, limit)
+            except Exception as e:
+                self.listener.status(f"查询备份目录数据库失败: {str(e)}")
+        return _page_records(self.backup_config["logs"], offset, limit)
+
+    # ---- 计时和性能分析 ----
+
+    @contextmanager
+    def measure(self, operation):
+        """对一次操作分阶段计时（见 asbt.profiling.OperationTimer），结束后追加到指标文件
+
+        设置了 profile_next 时同时为这次操作采集性能分析数据，保存到备份目录的 .profiles 文件夹
+        """
+        timer = OperationTimer(operation)
+        mode, self.profile_next = self.profile_next, None
+        capture = None
+        if mode and self.backup_dir:
+            capture = ProfileCapture(mode, self.backup_dir, f"{operation}_{new_timestamp()}")
+            timer.profile = capture.path
+        try:
+            with capture or nullcontext():
+                yield timer
+        except Exception as e:
+            timer.error = str(e)
+            raise
+        finally:
+            if capture is not None:
+                timer.profile = capture.path
+                if capture.path:
+                    self.listener.status(f"性能分析数据已保存到 {capture.path}")
+            self.record_metrics(timer)
+
+    def record_metrics(self, timer):
+        """按设置把计时结果追加到指标文件，写入失败只提示，不影响操作本身"""
+        path = self.settings.get("metrics_file")
+        if not path:
+            return
+        record = dict(timer.summary(), backup_dir=self.backup_dir, source_path=self.settings["source_path"])
+        try:
+            append_metrics(path, record)
+        except OSError as e:
+            self.listener.status(f"无法写入性能指标文件: {str(e)}")
+
+    def get_metrics_job(self):
+        return self.metrics_job or os.path.basename(self.settings["source_path"])
+
+    def observe_backup(self, backup_info, timer=None, failed=False):
+        """把一次备份的结果记录到 Prometheus 指标（未设置 metrics 时什么都不做）
+
+        备份目录大小取自台账（见 asbt.ledger）。台账尚未建立时在后台线程中完整扫描一次，
+        不占用本次备份的时间，扫描完成后再更新指标中的备份目录大小
+        """
+        if self.metrics is None:
+            return
+        seconds = timer.elapsed if timer is not None else None
+        if failed:
+            result = RESULT_FAILED
+        elif backup_info is None:
+            result = RESULT_SKIPPED
+        else:
+            result = RESULT_SUCCESS
+        changes = backup_info["changes"] if backup_info else {}
+        ledger = None
+        if self.backup_dir and os.path.isdir(self.backup_dir):
+            ledger = get_ledger(self.backup_dir).get()
+            if ledger is None:
+                self.build_ledger_async()
+        self.metrics.observe_backup(self.get_metrics_job(), result,
+                                    seconds=seconds,
+                                    copied_files=changes.get("copied", 0),
+                                    copied_bytes=changes.get("copied_bytes", 0),
+                                    dir_bytes=ledger["bytes"] if ledger else None,
+                                    snapshots=len(self.backup_config["backups"]))
+
+    def build_ledger_async(self):
+        """在后台线程中建立大小台账（同时只有一个），完成后更新指标中的备份目录大小"""
+        if self._ledger_thread is not None and self._ledger_thread.is_alive():
+            return
+
+        def build():
+            try:
+                self.ensure_ledger()
+            except OSError as e:
+                self.listener.status(f"统计备份目录大小失败: {str(e)}")
+                return
+            ledger = get_ledger(self.backup_dir).get() if self.backup_dir else None
+            if ledger is not None and self.metrics is not None:
+                self.metrics.set_dir_bytes(self.get_metrics_job(), ledger["bytes"])
+
+        self._ledger_thread = threading.Thread(target=build, daemon=True)
+        self._ledger_thread.start()
+
+    def ensure_ledger(self):
+        """备份目录还没有大小台账时完整扫描一次并建立台账，之后创建和删除快照时增量更新
+
+        导出指标时使用，备份目录大小不需要每次遍历目录
+        """
+        if not self.backup_dir or not os.path.isdir(self.backup_dir):
+            return
+        ledger = get_ledger(self.backup_dir)
+        if ledger.get() is not None:
+            return
+        with self.lock:
+            stats = scan_directory(self.backup_dir)
+            # 备份内容的原始大小：优先使用备份记录，压缩归档可直接读取归档头部
+            stats["content_bytes"] = sum(snapshot_content_size(b) or 0 for b in self.backup_config["backups"])
+            ledger.reset(stats)
+
+    # ---- 备份、还原和删除 ----
+
+    def get_snapshot_options(self, fmt, backup_info=None):
+        """获取快照格式相关的选项
+
+        参数:
+            fmt: 快照格式
+            backup_info: 重新创建已有备份时传入，压缩归档沿用该备份原来的格式
+        """
+        options = {"workers": self.get_copy_workers()}
+        if fmt == FORMAT_DELTA:
+            options["keyframe_interval"] = max(1, int(self.settings["delta_keyframe_interval"]))
+            options["block_size"] = max(4, int(self.settings["delta_block_size_kb"])) * 1024
+        elif fmt == FORMAT_ARCHIVE:
+            if backup_info and "archive_type" in backup_info:
+                options["archive_type"] = backup_info["archive_type"]
+            else:
+                archive_type = self.settings["archive_type"]
+                # 配置的格式不可用（如未安装 zstandard）时使用 tar.gz
+                options["archive_type"] = archive_type if archive_type in ARCHIVE_TYPES else "tar.gz"
+        return options
+
+    def get_consistency(self):
+        """一致性模式的设置，未启用时返回 None"""
+        consistency = dict(DEFAULT_CONSISTENCY, **(self.settings.get("consistency") or {}))
+        return consistency if consistency["enabled"] else None
+
+    def get_copy_workers(self):
+        """并行复制的线程数"""
+        return max(1, int(self.settings.get("copy_workers", DEFAULT_WORKERS)))
+
+    def perform_backup(self, skip_unchanged=False, prune=True, progress=None, throttle=None, store_mode=None):
+        """执行一次备份
+
+        参数:
+            skip_unchanged: 源文件与上一次快照相比没有变化时跳过本次备份（自动备份使用）
+            prune: 备份后按保留策略清理旧备份（还原前的备份不清理，以免删掉要还原的备份）
+            progress: 进度回调（见 asbt.jobs.Job.progress），在后台任务中执行时传入
+            throttle: 限速器（见 asbt.throttle.Throttle），只有自动备份传入，手动备份全速执行
+            store_mode: 覆盖设置中的存储模式（还原前的备份使用）
+
+        返回新的备份记录，跳过时返回 None
+        """
+        with self.measure("backup") as timer:
+            if self.metrics is not None:
+                self.metrics.backup_started(self.get_metrics_job())
+            try:
+                backup_info = self._perform_backup(timer, skip_unchanged, prune, progress, throttle, store_mode)
+            except Exception:
+                self.observe_backup(None, timer, failed=True)
+                raise
+            self.observe_backup(backup_info, timer)
+            return backup_info
+
+    def _perform_backup(self, timer, skip_unchanged, prune, progress, throttle, store_mode):
+        source_path = self.settings["source_path"]
+        backup_dir = self.settings["backup_dir"]
+        is_directory = self.settings["is_directory"]
+        # 块级增量只用于单个文件，文件夹会改用去重存储
+        store_mode = resolve_format(store_mode or self.settings.get("store_mode", FORMAT_COPY), is_directory)
+
+        # 确保目录存在
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+
+        # 只用 stat 扫描源文件，与索引中上一次快照的记录比较
+        source_index = get_index(backup_dir)
+        with timer.span("scan") as phase:
+            scan = scan_source(source_path, is_directory)
+            previous = source_index.get_previous(source_path, store_mode)
+            changes = diff_scan(previous, scan)
+            phase["files"] = len(scan["files"])
+        if skip_unchanged and not changes["is_changed"]:
+            self.log_skipped_backup(previous["snapshot"], changes)
+            self.listener.status(f"源文件未变化，跳过备份（{changes['unchanged']} 个文件）")
+            return None
+
+        # 生成带时间戳的文件名（添加毫秒级精度，确保同一秒内的备份文件名也是唯一的）
+        timestamp = new_timestamp()
+        source_name = os.path.basename(source_path)
+        options = self.get_snapshot_options(store_mode)
+        backup_path = os.path.join(backup_dir, f"{source_name}_{timestamp}{snapshot_suffix(store_mode, options)}")
+
+        # 实际读写的数据量：压缩归档和块级增量每次都要读取全部数据，其他格式只复制新增和修改的文件
+        total_bytes = sum(record[0] for record in scan["files"].values())
+        copied_bytes = (total_bytes if store_mode in (FORMAT_ARCHIVE, FORMAT_DELTA) or not previous
+                        else changes["changed_bytes"])
+        if throttle is not None:
+            progress = throttle.wrap(progress, len(scan["files"]), copied_bytes)
+
+        # 执行备份（完整复制、写入去重仓库或压缩归档），未变化的文件沿用上一次快照的数据
+        with timer.span("copy", len(scan["files"]), total_bytes) as phase:
+            snapshot_info = create_snapshot(source_path, backup_path, is_directory, store_mode,
+                                            scan=scan, previous=previous, options=options, progress=progress,
+                                            consistency=self.get_consistency())
+        backup_throughput = throughput(len(scan["files"]), total_bytes, phase["seconds"])
+
+        # 记录备份信息
+        backup_info = {
+            "timestamp": timestamp,
+            "original": source_path,
+            "backup_path": backup_path,
+            "is_directory": is_directory,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        # 记录变化情况：新增/修改/删除/未变化的文件数，以及实际复制和复用的文件数
+        backup_info["changes"] = {
+            "mode": "incremental" if previous else "full",
+            "added": changes["added"],
+            "modified": changes["modified"],
+            "removed": changes["removed"],
+            "unchanged": changes["unchanged"],
+            "copied": snapshot_info.pop("copied", len(scan["files"])),
+            "reused": snapshot_info.pop("reused", 0),
+            "copied_bytes": copied_bytes,
+        }
+        backup_info.update(snapshot_info)
+        backup_info["throughput"] = backup_throughput
+
+        # 生成完整性清单，未变化的文件沿用上一次快照的校验值
+        with timer.span("integrity"):
+            integrity_ok = self.write_snapshot_integrity(backup_info, scan, previous)
+
+        # 添加到备份列表、日志和索引（日志中的计时只包含到此为止的阶段，完整的计时见指标文件）
+        backup_info["timing"] = timer.summary()
+        with timer.span("metadata"):
+            self.add_backup_record(backup_info, scan)
+
+        # 按保留策略清理旧备份
+        with timer.span("prune"):
+            pruned = self.apply_retention() if prune else 0
+
+        changes_text = (f"复制 {backup_info['changes']['copied']} 个文件，复用 {backup_info['changes']['reused']} 个，"
+                        f"{format_throughput(backup_throughput)}")
+        consistency = backup_info.get("consistency")
+        if consistency and consistency["retried"]:
+            changes_text += f"，复制期间变化的 {consistency['retried']} 个文件已重新复制"
+        if pruned:
+            self.listener.backups_changed()
+        else:
+            self.listener.backup_added(backup_info)
+        if not integrity_ok:
+            changes_text += "，完整性清单生成失败"
+        if consistency and not consistency["stable"]:
+            self.listener.status(f"备份完成，但源文件在多次重试后仍在变化，备份可能不完整: {source_name} "
+                                 f"于 {backup_info['date']}（{changes_text}）")
+        else:
+            self.listener.status(f"备份完成: {source_name} 于 {backup_info['date']}（{changes_text}）")
+        return backup_info
+
+    def add_backup_record(self, backup_info, scan):
+        """把新快照添加到备份列表并记录日志，同时更新索引，下次备份以该快照为基准"""
+        self.backup_config["backups"].append(backup_info)
+        self.append_journal("add_backup", record=backup_info)
+        self.add_log("backup", backup_info)
+        get_index(self.settings["backup_dir"]).update(self.settings["source_path"], scan, backup_info)
+
+    def pre_restore_backup(self, progress=None, move_source=False):
+        """还原前为当前文件创建快照，用于撤销本次还原，返回该快照的备份记录（源不存在时返回 None）
+
+        尽量不复制数据：
+        - 当前文件与最近一次快照相同时不创建新快照，最近的快照就是还原前的状态
+        - move_source 为 True（完整还原，源反正要被删除）时直接把源重命名为快照，
+          不在同一个文件系统等无法重命名时改为普通备份
+        - 其他情况为增量备份：未变化的文件硬链接到上一次快照或复用去重对象，
+          压缩归档模式下改用完整复制，不重新压缩整个存档
+
+        参数:
+            progress: 备份的进度回调
+        """
+        source_path = self.settings["source_path"]
+        backup_dir = self.settings["backup_dir"]
+        is_directory = self.settings["is_directory"]
+        if not os.path.exists(source_path):
+            return None
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+
+        scan = scan_source(source_path, is_directory)
+        latest = get_index(backup_dir).get_latest(source_path)
+        changes = diff_scan(latest, scan)
+        if latest and not changes["is_changed"]:
+            self.log_skipped_backup(latest["snapshot"], changes)
+            self.listener.status("当前文件与最近一次备份相同，还原前不再重复备份")
+            return self.find_backup(latest["snapshot"]["timestamp"])
+
+        if move_source:
+            backup_info = self.move_source_to_snapshot(scan, latest, changes)
+            if backup_info is not None:
+                return backup_info
+
+        store_mode = resolve_format(self.settings.get("store_mode", FORMAT_COPY), is_directory)
+        if store_mode == FORMAT_ARCHIVE:
+            store_mode = FORMAT_COPY
+        return self.perform_backup(prune=False, progress=progress, store_mode=store_mode)
+
+    def move_source_to_snapshot(self, scan, latest=None, changes=None):
+        """把源重命名为完整复制格式的快照（见 asbt.snapshot.move_into_snapshot），无法重命名时返回 None
+
+        参数:
+            scan: 源的扫描结果
+            latest: 索引中最近一次快照的记录，用于沿用完整性清单中未变化文件的校验值
+            changes: 与最近一次快照相比的变化（见 asbt.scan.diff_scan）
+        """
+        source_path = self.settings["source_path"]
+        timestamp = new_timestamp()
+        source_name = os.path.basename(source_path)
+        backup_path = os.path.join(self.settings["backup_dir"], f"{source_name}_{timestamp}")
+        start_time = time.monotonic()
+        try:
+            snapshot_info = move_into_snapshot(source_path, backup_path, scan)
+        except OSError:
+            return None
+        if changes is None:
+            changes = diff_scan(latest, scan)
+
+        backup_info = {
+            "timestamp": timestamp,
+            "original": source_path,
+            "backup_path": backup_path,
+            "is_directory": self.settings["is_directory"],
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "changes": {
+                "mode": "moved",
+                "added": changes["added"],
+                "modified": changes["modified"],
+                "removed": changes["removed"],
+                "unchanged": changes["unchanged"],
+                "copied": 0,
+                "reused": len(scan["files"]),
+            },
+        }
+        backup_info.update(snapshot_info)
+        backup_info["throughput"] = throughput(len(scan["files"]), snapshot_info["total_bytes"],
+                                               time.monotonic() - start_time)
+        self.write_snapshot_integrity(backup_info, scan, latest)
+        self.add_backup_record(backup_info, scan)
+        self.listener.backup_added(backup_info)
+        self.listener.status(f"已将当前文件移入备份目录作为还原前的备份: {source_name}")
+        return backup_info
+
+    def apply_retention(self):
+        """按保留策略批量清理旧备份
+
+        所有需要清理的备份一次删除完，配置只保存一次，日志只记录一条汇总
+
+        返回清理的备份数量
+        """
+        policy = normalize_policy(self.settings.get("retention"))
+        if not policy["enabled"]:
+            return 0
+
+        to_prune = select_backups_to_prune(self.backup_config["backups"], policy)
+        if not to_prune:
+            return 0
+
+        pruned = []
+        freed_bytes = 0
+        errors = 0
+        # 从新到旧删除，块级增量快照合并的数据量最少
+        for backup in reversed(to_prune):
+            try:
+                freed_bytes += delete_snapshot(backup)
+                pruned.append(backup)
+            except OSError:
+                # 删除失败的备份保留在列表中，下次再清理
+                errors += 1
+
+        pruned_ids = {id(backup) for backup in pruned}
+        # 原地修改，界面中引用同一个列表的地方不需要更新
+        self.backup_config["backups"][:] = [b for b in self.backup_config["backups"] if id(b) not in pruned_ids]
+        self.append_journal("remove_backups", keys=[backup_key(b) for b in pruned])
+
+        now = datetime.now()
+        summary = {
+            "timestamp": now.strftime("%Y%m%d_%H%M%S_%f")[:19],
+            "original": self.settings["source_path"],
+            "backup_path": self.settings["backup_dir"],
+            "is_directory": True,
+            "date": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "policy": policy,
+            "pruned": [{"timestamp": b["timestamp"], "date": b["date"], "backup_path": b["backup_path"]}
+                       for b in reversed(pruned)],
+            "freed_bytes": freed_bytes,
+            "errors": errors,
+        }
+        # add_log 会追加到 journal
+        self.add_log("prune", summary)
+        self.listener.status(f"已按保留策略清理 {len(pruned)} 个旧备份")
+        return len(pruned)
+
+    def timed_restore(self, backup_info, target_path, progress=None, full=False):
+        """还原快照，返回 (吞吐量, 还原结果)
+
+        参数:
+            full: 为 True 时总是删除目标后完整还原，否则按设置进行差异还原（见 asbt.restore）
+        """
+        options = normalize_restore(self.settings.get("restore"))
+        start_time = time.monotonic()
+        if options["differential"] and not full:
+            result = restore_differential(backup_info, target_path, options, self.get_copy_workers(), progress)
+        else:
+            result = dict(restore_snapshot(backup_info, target_path, self.get_copy_workers(), progress), mode="full")
+        # 差异还原只统计实际写入的文件
+        return throughput(result["files"], result["bytes"], time.monotonic() - start_time), result
+
+    def restore_backup(self, backup_info, action="restore", target_path=None, pre_backup=True,
+                       backup_progress=None, restore_progress=None, full=False):
+        """还原备份（或回溯到日志中某次操作时的文件状态），返回吞吐量
+
+        参数:
+            action: 日志中记录的操作类型，"restore" 或 "rollback"
+            target_path: 还原到的路径，默认为备份的源路径
+            pre_backup: 还原前先备份当前文件或文件夹（见 pre_restore_backup）
+            backup_progress: 还原前备份的进度回调
+            restore_progress: 还原的进度回调；还原开始后中途停止会留下不完整的存档，不应允许取消
+            full: 不使用差异还原
+        """
+        if target_path is None:
+            target_path = backup_info["original"]
+        with self.measure(action) as timer:
+            if pre_backup:
+                # 完整还原会先删除目标，还原的正是源时可以直接把源移入备份目录，不需要复制
+                full_restore = full or not normalize_restore(self.settings.get("restore"))["differential"]
+                same_path = (os.path.normcase(os.path.abspath(target_path))
+                             == os.path.normcase(os.path.abspath(self.settings["source_path"])))
+                with timer.span("pre_backup"):
+                    self.pre_restore_backup(backup_progress, move_source=full_restore and same_path)
+
+            # 还原备份（差异还原只写入变化的文件，完整还原时目标路径存在会先删除）
+            with timer.span("restore") as phase:
+                restore_throughput, result = self.timed_restore(backup_info, target_path, restore_progress, full)
+                phase["files"] = result["files"]
+                phase["bytes"] = result["bytes"]
+
+            # 添加日志记录（记录本次还原的吞吐量、各阶段用时和写入、删除的文件数）
+            restore_changes = {key: result[key] for key in ("mode", "files", "unchanged", "removed") if key in result}
+            with timer.span("metadata"):
+                self.add_log(action, dict(backup_info, throughput=restore_throughput, restore_changes=restore_changes,
+                                          timing=timer.summary()))
+        return restore_throughput
+
+    def delete_backup(self, backup_info):
+        """删除一个备份及其记录"""
+        # 删除备份文件或文件夹（去重存储时同时回收不再被引用的对象）
+        delete_snapshot(backup_info)
+
+        # 从配置中移除（后台执行期间列表可能已变化，按内容移除）
+        if backup_info in self.backup_config["backups"]:
+            self.backup_config["backups"].remove(backup_info)
+        self.append_journal("remove_backups", keys=[backup_key(backup_info)])
+
+        # 添加日志记录
+        self.add_log("delete", backup_info)
+
+    def restore_deleted_backup(self, backup_info, progress=None):
+        """从源文件按原来的存储模式重新创建被删除的备份"""
+        backup_path = backup_info["backup_path"]
+        # 重新创建备份目录结构
+        backup_dir = os.path.dirname(backup_path)
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+
+        fmt = get_format(backup_info)
+        backup_info.update(create_snapshot(backup_info["original"], backup_path,
+                                           backup_info.get("is_directory", False), fmt,
+                                           options=self.get_snapshot_options(fmt, backup_info),
+                                           progress=progress))
+
+        self.write_snapshot_integrity(backup_info)
+
+        # 将备份信息重新添加到配置中
+        self.backup_config["backups"].append(backup_info)
+        self.append_journal("add_backup", record=backup_info)
+
+        # 添加日志记录
+        self.add_log("restore_deleted", backup_info)
+
+    def write_snapshot_integrity(self, backup_info, scan=None, previous=None):
+        """按设置为新快照生成完整性清单，返回是否成功（未启用时也返回 True）
+
+        清单生成失败不影响备份本身，只是之后无法校验该备份
+        """
+        if not self.settings.get("integrity", True):
+            return True
+        try:
+            write_integrity(backup_info, scan, previous, self.get_copy_workers())
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def verify_backup(self, backup_info, progress=None, cache=None):
+        """按完整性清单校验一个备份，返回结果（见 asbt.integrity.verify_snapshot），没有清单时返回 None"""
+        with self.measure("verify") as timer:
+            with timer.span("verify") as phase:
+                result = verify_snapshot(backup_info, self.get_copy_workers(), progress, cache)
+                if result is not None:
+                    phase["files"] = result["checked"]
+                    phase["bytes"] = result["bytes"]
+        return result
+
+    def verify_backups(self, max_age_days=None, progress=None, should_stop=None):
+        """校验当前备份目录中的所有备份
+
+        参数:
+            max_age_days: 只校验从未校验过或上次校验早于这么多天的备份（增量校验），None 表示全部校验；
+                          每个备份校验完立即记录，中途停止后再次运行会从未校验的备份继续
+            progress: 每校验完一个备份调用 progress(done, total)
+            should_stop: should_stop() 返回 True 时在当前备份校验完后停止
+
+        返回 [(备份记录, 结果)]，只包含实际校验的备份
+        """
+        backups = list(self.backup_config["backups"])
+        if max_age_days is not None:
+            backups = [b for b in backups if needs_verify(b, max_age_days * 86400)]
+        # 同一次校验中共用，硬链接的文件和相同的去重对象只读取一次
+        cache = {}
+        results = []
+        for i, backup in enumerate(backups):
+            if should_stop is not None and should_stop():
+                break
+            result = self.verify_backup(backup, cache=cache)
+            if result is not None:
+                results.append((backup, result))
+            if progress is not None:
+                progress(i + 1, len(backups))
+        return results
+
+    def create_throttle(self, should_stop=None):
+        """按限速设置创建自动备份使用的限速器，未启用时返回 None
+
+        参数:
+            should_stop: 停止自动备份时返回 True，此后正在进行的备份不再限速
+        """
+        return Throttle.from_settings(
+            self.settings.get("throttle"), should_stop,
+            lambda load: self.listener.status(f"系统负载较高（{load:.2f}），自动备份已暂停"))
+
+    def lower_priority(self):
+        """按限速设置降低当前线程（自动备份线程）的 CPU 和 I/O 优先级"""
+        throttle = normalize_throttle(self.settings.get("throttle"))
+        if throttle["enabled"] and throttle["low_priority"]:
+            return lower_priority()
+        return []
+
+    def run_scheduled_backup(self):
+        """由调度器（见 asbt.scheduler）触发的一次自动备份，源文件没有变化时跳过"""
+        # 调度器每次在新线程中运行任务
+        self.lower_priority()
+        with self.lock:
+            if not self._loaded:
+                self.load_backup_config()
+            if not os.path.exists(self.settings["source_path"]):
+                self.observe_backup(None, failed=True)
+                raise FileNotFoundError(f"源文件不存在: {self.settings['source_path']}")
+            return self.perform_backup(skip_unchanged=True, throttle=self.create_throttle())
+
+    def run_auto_backup(self, should_stop):
+        """自动备份循环，直到 should_stop() 返回 True，出错时抛出异常
+
+        定时触发时每隔 interval 分钟备份一次；文件变化触发时监听源文件，写入后静默
+        quiet_seconds 秒才备份，连续写入只触发一次，源文件一直在写入时最多等待一个备份间隔。
+        源文件没有变化时跳过备份。启用限速时按限速设置降低当前线程的优先级，备份过程限速。
+        """
+        self.lower_priority()
+        throttle = self.create_throttle(should_stop)
+        if self.settings.get("trigger_mode") == "event":
+            # 先开始监听再做首次备份，避免漏掉两者之间的修改
+            watcher = create_watcher(self.settings["source_path"], self.settings["is_directory"],
+                                     self.listener.status)
+            try:
+                with self.lock:
+                    self.perform_backup(skip_unchanged=True, throttle=throttle)
+                while not should_stop():
+                    triggered = wait_for_quiet_change(watcher, self.settings["quiet_seconds"],
+                                                      self.settings["interval"] * 60, should_stop)
+                    if triggered:
+                        with self.lock:
+                            self.perform_backup(skip_unchanged=True, throttle=throttle)
+            finally:
+                watcher.close()
+            return
+
+        while not should_stop():
+            with self.lock:
+                self.perform_backup(skip_unchanged=True, throttle=throttle)
+            # 每秒检查一次是否需要停止
+            deadline = time.monotonic() + self.settings["interval"] * 60
+            while not should_stop() and time.monotonic() < deadline:
+                time.sleep(min(1, max(0, deadline - time.monotonic())))
+
+    # ---- 日志 ----
+
+    def add_log(self, action_type, backup_info):
+        """添加日志记录
+
+        参数:
+            action_type: 操作类型，见 ACTION_NAMES
+            backup_info: 备份信息字典
+        """
+        log_entry = {
+            "timestamp": new_timestamp(),
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "action": action_type,
+            "backup_info": copy.deepcopy(backup_info)
+        }
+
+        # 添加到备份配置中的日志列表
+        self.backup_config["logs"].append(log_entry)
+        # 追加到 journal，不重写整个配置文件
+        self.append_journal("add_log", record=log_entry)
+        self.listener.log_added(log_entry)
+
+        action_text = ACTION_NAMES.get(action_type, action_type)
+        self.listener.status(f"已记录{action_text}操作到日志")
+        return log_entry
+
+    def log_skipped_backup(self, latest_info, changes):
+        """记录一次因源文件未变化而跳过的备份
+
+        连续的跳过只保留一条日志，更新其次数和时间，避免长时间挂机时日志无限增长
+        """
+        logs = self.backup_config["logs"]
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if (logs and logs[-1]["action"] == "skip"
+                and logs[-1]["backup_info"]["backup_path"] == latest_info["backup_path"]):
+            last = logs[-1]
+            last["date"] = now
+            last["backup_info"]["changes"]["skipped"] = last["backup_info"]["changes"].get("skipped", 1) + 1
+            self.append_journal("update_last_log", record=last)
+            self.listener.log_updated(last)
+        else:
+            # 以最近一次快照的备份记录作为日志内容，便于查看状态和回溯
+            skip_info = dict(latest_info, original=self.settings["source_path"], date=now)
+            for backup in reversed(self.backup_config["backups"]):
+                if backup["backup_path"] == latest_info["backup_path"]:
+                    skip_info = dict(backup)
+                    break
+            skip_info["changes"] = dict(changes, mode="skip", skipped=1)
+            self.add_log("skip", skip_info)
+
+
+def _page_records(records, offset, limit):
+    """从按时间顺序排列的列表末尾分页读取（最新的在前）"""
+    end = max(0, len(records) - offset)
+    return list(reversed(records[max(0, end - limit):end]))
@@ -0,0 +1,239 @@
+import os
+import time
+import threading
+
+
+# Prometheus 指标导出：自动备份和备份任务的计数器、耗时直方图和备份目录大小。
+# 所有数字在每次备份完成时增量更新（备份目录大小取自 asbt.ledger 的台账），导出时不遍历任何目录。
+# 可以写入文本文件（供 node_exporter 的 textfile collector 读取），也可以在本机端口上提供 /metrics。
+# http.server 只在启动端口时导入，引擎和命令行的其他命令不会加载它
+DEFAULT_EXPORTER = {
+    "textfile": "",  # 每次备份后写入该文件（.prom），为空时不写入
+    "port": 0,  # 在该端口提供 http://host:port/metrics，0 表示不启动
+    "host": "127.0.0.1",  # 默认只允许本机访问
+}
+
+# 备份耗时直方图的分桶（秒）
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+RESULT_SUCCESS = "success"
+RESULT_SKIPPED = "skipped"
+RESULT_FAILED = "failed"
+
+# 名称: (类型, 说明)
+METRICS = {
+    "asbt_backups_total": ("counter", "Backups run, by result (success, skipped, failed)"),
+    "asbt_backup_failures_total": ("counter", "Backups that raised an error"),
+    "asbt_backup_bytes_copied_total": ("counter", "Bytes read from the source and written to new snapshots"),
+    "asbt_backup_files_copied_total": ("counter", "Files written to new snapshots (not hard-linked or reused)"),
+    "asbt_backup_duration_seconds": ("histogram", "Duration of backups that created a snapshot"),
+    "asbt_backup_in_progress": ("gauge", "Whether a backup is currently running"),
+    "asbt_last_success_timestamp_seconds": ("gauge", "Unix time of the last backup that created a snapshot"),
+    "asbt_last_run_timestamp_seconds": ("gauge", "Unix time of the last backup attempt, including skipped ones"),
+    "asbt_backup_dir_bytes": ("gauge", "Size of the backup directory from the incrementally maintained ledger"),
+    "asbt_backup_snapshots": ("gauge", "Number of snapshots in the backup directory"),
+    "asbt_jobs_queued": ("gauge", "Due scheduled jobs waiting for a free slot plus queued background tasks"),
+    "asbt_jobs_running": ("gauge", "Scheduled jobs and background tasks currently running"),
+}
+
+
+def normalize_exporter(options):
+    """补全指标导出设置中缺少的字段"""
+    merged = dict(DEFAULT_EXPORTER)
+    if options:
+        merged.update(options)
+    return merged
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class BackupMetrics:
+    """自动备份的指标，多个引擎（备份任务）可以共用，按 job 标签区分
+
+    引擎在每次备份结束时调用 observe_backup（见 asbt.engine.BackupEngine.observe_backup），
+    设置了 textfile 时随后整体重写该文件（先写临时文件再替换，读取方不会读到一半的内容）。
+    """
+
+    def __init__(self, textfile=None):
+        self.textfile = textfile or None
+        self.scheduler = None  # asbt.scheduler.BackupScheduler，导出时读取排队和运行中的任务数
+        self.executor = None  # asbt.jobs.JobExecutor（界面的后台任务），其中排队和运行中的任务同样计入
+        self._lock = threading.Lock()
+        self._values = {}  # (名称, 标签) -> 数值
+        self._histograms = {}  # (名称, 标签) -> [各分桶计数, 总和, 次数]
+
+    def _add(self, name, labels, amount=1):
+        key = (name, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _set(self, name, labels, value):
+        self._values[(name, labels)] = value
+
+    def _observe(self, name, labels, value):
+        histogram = self._histograms.setdefault((name, labels), [[0] * len(DURATION_BUCKETS), 0.0, 0])
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def backup_started(self, job):
+        with self._lock:
+            self._set("asbt_backup_in_progress", (("job", job),), 1)
+
+    def observe_backup(self, job, result, seconds=None, copied_files=0, copied_bytes=0,
+                       dir_bytes=None, snapshots=None):
+        """记录一次备份的结果
+
+        参数:
+            result: RESULT_SUCCESS、RESULT_SKIPPED 或 RESULT_FAILED
+            seconds: 备份用时，只有成功创建快照时计入直方图
+            dir_bytes: 备份目录的大小（台账中的数字），None 表示台账尚未建立，不更新
+            snapshots: 备份目录中的快照数，None 表示不更新
+        """
+        labels = (("job", job),)
+        now = time.time()
+        with self._lock:
+            self._add("asbt_backups_total", labels + (("result", result),))
+            self._set("asbt_backup_in_progress", labels, 0)
+            self._set("asbt_last_run_timestamp_seconds", labels, now)
+            if result == RESULT_FAILED:
+                self._add("asbt_backup_failures_total", labels)
+            elif result == RESULT_SUCCESS:
+                self._add("asbt_backup_files_copied_total", labels, copied_files)
+                self._add("asbt_backup_bytes_copied_total", labels, copied_bytes)
+                self._set("asbt_last_success_timestamp_seconds", labels, now)
+                if seconds is not None:
+                    self._observe("asbt_backup_duration_seconds", labels, seconds)
+            if dir_bytes is not None:
+                self._set("asbt_backup_dir_bytes", labels, dir_bytes)
+            if snapshots is not None:
+                self._set("asbt_backup_snapshots", labels, snapshots)
+        self.flush()
+
+    def set_dir_bytes(self, job, dir_bytes):
+        """更新备份目录的大小（台账在后台建立完成后调用）"""
+        with self._lock:
+            self._set("asbt_backup_dir_bytes", (("job", job),), dir_bytes)
+        self.flush()
+
+    def render(self):
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()}
+        if self.scheduler is not None or self.executor is not None:
+            running = queued = 0
+            if self.scheduler is not None:
+                status = self.scheduler.status()
+                running += sum(1 for job in status if job["running"])
+                queued += sum(1 for job in status if job["next_in"] == 0)
+            if self.executor is not None:
+                running += self.executor.current is not None
+                queued += self.executor.pending_count()
+            values[("asbt_jobs_running", ())] = running
+            values[("asbt_jobs_queued", ())] = queued
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            if kind == "histogram":
+                samples = sorted((labels, h) for (n, labels), h in histograms.items() if n == name)
+            else:
+                samples = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                buckets, total, count = value
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(round(total, 3))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """设置了 textfile 时重写该文件，写入失败时忽略（下次备份后会再次写入）"""
+        if not self.textfile:
+            return
+        tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.textfile)
+        except OSError:
+            pass
+
+
+def _handler_class(metrics):
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 不在终端输出每次抓取的访问日志
+            pass
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """在后台线程中提供 http://host:port/metrics"""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        from http.server import ThreadingHTTPServer
+        self._server = ThreadingHTTPServer((host, port), _handler_class(metrics))
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def create_exporter(options):
+    """按导出设置创建指标和 HTTP 服务（已启动），返回 (BackupMetrics, MetricsServer 或 None)
+
+    没有设置 textfile 和 port 时返回 (None, None)；端口被占用等错误直接抛出 OSError
+    """
+    options = normalize_exporter(options)
+    if not options["textfile"] and not options["port"]:
+        return None, None
+    metrics = BackupMetrics(options["textfile"])
+    server = MetricsServer(metrics, int(options["port"]), options["host"]).start() if options["port"] else None
+    metrics.flush()
+    return metrics, server
@@ -0,0 +1,94 @@
+import os
+import json
+import threading
+
+from asbt.snapshot import snapshot_exists
+
+
+class SourceIndex:
+    """源文件索引
+
+    保存在备份目录的 index.json 中（与 config.json 同级），按源路径记录每个文件的
+    大小、修改时间和 inode，以及最近一次快照的位置。下次备份时只需 stat 扫描即可判断
+    哪些文件发生了变化，不必读取文件内容。
+
+    文件记录格式为 [size, mtime_ns, inode]，路径统一使用 "/" 分隔。
+    """
+
+    FILE_NAME = "index.json"
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.index_file = os.path.join(backup_dir, self.FILE_NAME)
+        self._sources = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._sources is None:
+            self._sources = {}
+            if os.path.exists(self.index_file):
+                try:
+                    with open(self.index_file, "r", encoding="utf-8") as f:
+                        self._sources = json.load(f)
+                except (OSError, ValueError):
+                    # 索引损坏时当作没有索引，下次备份会做一次完整复制
+                    self._sources = {}
+        return self._sources
+
+    def _save(self):
+        tmp_path = self.index_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._sources, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_file)
+
+    def get_previous(self, source_path, fmt):
+        """获取可用于增量备份的上一次记录
+
+        上一次的快照已被删除或存储模式不同时返回 None
+        """
+        with self._lock:
+            entry = self._load().get(source_path)
+        if not entry:
+            return None
+        snapshot = entry["snapshot"]
+        if snapshot.get("format") != fmt or not snapshot_exists(snapshot):
+            return None
+        return entry
+
+    def get_latest(self, source_path):
+        """获取最近一次快照的记录（不限存储模式），快照已被删除时返回 None"""
+        with self._lock:
+            entry = self._load().get(source_path)
+        if not entry or not snapshot_exists(entry["snapshot"]):
+            return None
+        return entry
+
+    def update(self, source_path, scan, backup_info):
+        """记录本次扫描结果和对应的快照"""
+        with self._lock:
+            self._load()[source_path] = {
+                "snapshot": {
+                    "backup_path": backup_info["backup_path"],
+                    "format": backup_info.get("format"),
+                    "is_directory": backup_info.get("is_directory", False),
+                    "timestamp": backup_info["timestamp"],
+                },
+                "files": scan["files"],
+                "dirs": scan["dirs"],
+            }
+            self._save()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(backup_dir):
+    """获取备份目录对应的源文件索引"""
+    key = os.path.normcase(os.path.abspath(backup_dir))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SourceIndex(backup_dir)
+            _indexes[key] = index
+        return index
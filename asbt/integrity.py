@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import hashlib
+
+try:
+    import xxhash
+except ImportError:  # 未安装 xxhash 时使用标准库的 BLAKE2
+    xxhash = None
+
+from asbt.snapshot import integrity_path, snapshot_file_openers, iter_snapshot_streams
+from asbt.copier import ProgressCounter, run_parallel
+
+
+# 完整性清单：每个快照一个 JSON 文件（备份目录的 .integrity 文件夹中），
+# 记录快照中每个文件的大小、源文件修改时间和校验值，用于之后校验备份是否损坏
+INTEGRITY_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+ALGORITHM_XXH3 = "xxh3_128"
+ALGORITHM_BLAKE2 = "blake2b"
+# xxh3 比 BLAKE2 快得多，但需要额外安装；两种都不是加密用途，只用于发现损坏
+DEFAULT_ALGORITHM = ALGORITHM_XXH3 if xxhash is not None else ALGORITHM_BLAKE2
+
+
+def check_algorithm(algorithm):
+    """校验算法不可用（不支持，或需要的 xxhash 没有安装）时抛出 ValueError"""
+    if algorithm == ALGORITHM_XXH3:
+        if xxhash is None:
+            raise ValueError("该备份的校验清单使用 xxh3_128，需要安装 xxhash")
+    elif algorithm != ALGORITHM_BLAKE2:
+        raise ValueError(f"不支持的校验算法: {algorithm}")
+
+
+def new_hasher(algorithm):
+    check_algorithm(algorithm)
+    if algorithm == ALGORITHM_XXH3:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_chunks(chunks, algorithm):
+    """计算数据块的校验值，返回 (大小, 校验值)"""
+    hasher = new_hasher(algorithm)
+    size = 0
+    for chunk in chunks:
+        hasher.update(chunk)
+        size += len(chunk)
+    return size, hasher.hexdigest()
+
+
+def _hash_opener(opener, algorithm):
+    with opener() as f:
+        return hash_chunks(iter(lambda: f.read(CHUNK_SIZE), b""), algorithm)
+
+
+def load_integrity(backup_path):
+    """读取快照的完整性清单，不存在或无法解析时返回 None"""
+    try:
+        with open(integrity_path(backup_path), "r", encoding="utf-8") as f:
+            integrity = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return integrity if integrity.get("version") == INTEGRITY_VERSION else None
+
+
+def save_integrity(backup_path, integrity):
+    """保存完整性清单（先写临时文件再替换）"""
+    path = integrity_path(backup_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(integrity, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def hash_snapshot(backup_info, algorithm=DEFAULT_ALGORITHM, paths=None, workers=1, progress=None):
+    """计算快照中文件的校验值，返回 {相对路径: (大小, 校验值)}
+
+    完整复制和去重存储的文件并行读取，压缩归档和块级增量按顺序流式读取。
+
+    参数:
+        paths: 只计算这些相对路径，None 表示全部
+        progress: 每完成一个文件调用 progress(done, total)
+    """
+    openers = snapshot_file_openers(backup_info)
+    if openers is not None:
+        items = [(rel_path, opener) for rel_path, (key, opener) in openers.items()
+                 if paths is None or rel_path in paths]
+        counter = ProgressCounter(len(items), progress)
+
+        def hash_one(item):
+            result = _hash_opener(item[1], algorithm)
+            counter.step()
+            return item[0], result
+
+        return dict(run_parallel(hash_one, items, workers))
+
+    results = {}
+    counter = ProgressCounter(len(paths) if paths is not None else 0, progress)
+    for rel_path, chunks in iter_snapshot_streams(backup_info, CHUNK_SIZE):
+        if paths is not None and rel_path not in paths:
+            continue
+        results[rel_path] = hash_chunks(chunks, algorithm)
+        counter.total = max(counter.total, len(results))
+        counter.step()
+    return results
+
+
+def write_integrity(backup_info, scan=None, previous=None, workers=1, progress=None, algorithm=DEFAULT_ALGORITHM):
+    """为新创建的快照生成完整性清单
+
+    与上一次快照相比没有变化的文件（扫描记录相同）直接沿用上一次清单中的校验值，
+    只读取新增和修改的文件，所以完整复制和去重存储的增量备份几乎不增加耗时。
+
+    参数:
+        scan: 本次快照的扫描结果（见 asbt.scan.scan_source），None 时计算全部文件
+        previous: 索引中上一次快照的记录（见 asbt.index.SourceIndex.get_previous）
+    """
+    files = {}
+    paths = None
+    if scan is not None:
+        previous_files = previous["files"] if previous else {}
+        previous_integrity = load_integrity(previous["snapshot"]["backup_path"]) if previous else None
+        if previous_integrity is not None and previous_integrity["algorithm"] != algorithm:
+            previous_integrity = None
+        paths = set()
+        for rel_path, record in scan["files"].items():
+            old = previous_integrity["files"].get(rel_path) if previous_integrity else None
+            if old is not None and previous_files.get(rel_path) == record and old[:2] == record[:2]:
+                files[rel_path] = old
+            else:
+                paths.add(rel_path)
+
+    for rel_path, (size, digest) in hash_snapshot(backup_info, algorithm, paths, workers, progress).items():
+        record = scan["files"].get(rel_path) if scan is not None else None
+        files[rel_path] = [size, record[1] if record else None, digest]
+
+    integrity = {
+        "version": INTEGRITY_VERSION,
+        "algorithm": algorithm,
+        "created_at": time.time(),
+        "files": files,
+        "hashed": len(files) if paths is None else len(paths),
+        "verified_at": None,
+        "last_result": None,
+    }
+    save_integrity(backup_info["backup_path"], integrity)
+    return integrity
+
+
+def verify_snapshot(backup_info, workers=1, progress=None, cache=None):
+    """按完整性清单重新计算快照中每个文件的校验值
+
+    参数:
+        cache: 同一次校验多个快照时共用的字典。完整复制中硬链接到上一次快照的文件、
+               去重存储中相同的对象只读取一次
+        progress: 每校验一个文件调用 progress(done, total)
+
+    返回 {"checked", "bytes", "corrupt", "missing", "extra", "error", "ok"}，没有完整性清单时返回 None；
+    结果同时记录到清单的 verified_at 和 last_result 中
+    """
+    backup_path = backup_info["backup_path"]
+    integrity = load_integrity(backup_path)
+    if integrity is None:
+        return None
+    algorithm = integrity["algorithm"]
+    # 算法不可用时直接报错，而不是把每个文件都记为损坏
+    check_algorithm(algorithm)
+    expected = integrity["files"]
+    if cache is None:
+        cache = {}
+    corrupt = []
+    missing = []
+    extra = []
+    error = None
+    checked = 0
+    checked_bytes = 0
+    counter = ProgressCounter(len(expected), progress)
+
+    def compare(rel_path, result):
+        size, digest = result
+        if [size, digest] != [expected[rel_path][0], expected[rel_path][2]]:
+            corrupt.append(rel_path)
+        counter.step()
+
+    try:
+        openers = snapshot_file_openers(backup_info)
+    except (OSError, ValueError) as e:
+        # 快照本身或去重存储的清单已经丢失
+        openers = {}
+        error = str(e)
+
+    if openers is not None:
+        extra = sorted(rel_path for rel_path in openers if rel_path not in expected)
+        items = []
+        for rel_path in expected:
+            if rel_path not in openers:
+                missing.append(rel_path)
+                counter.step()
+            else:
+                items.append((rel_path,) + openers[rel_path])
+
+        def check_one(item):
+            rel_path, key, opener = item
+            cache_key = (algorithm, key)
+            result = cache.get(cache_key)
+            if result is None:
+                try:
+                    result = _hash_opener(opener, algorithm)
+                except OSError:
+                    missing.append(rel_path)
+                    counter.step()
+                    return None
+                cache[cache_key] = result
+            compare(rel_path, result)
+            return result[0]
+
+        sizes = [size for size in run_parallel(check_one, items, workers) if size is not None]
+        checked = len(sizes)
+        checked_bytes = sum(sizes)
+    else:
+        seen = set()
+        try:
+            for rel_path, chunks in iter_snapshot_streams(backup_info, CHUNK_SIZE):
+                if rel_path not in expected:
+                    extra.append(rel_path)
+                    continue
+                result = hash_chunks(chunks, algorithm)
+                seen.add(rel_path)
+                checked += 1
+                checked_bytes += result[0]
+                compare(rel_path, result)
+        except Exception as e:
+            # 压缩包损坏、块级增量的基准快照丢失等，之后的文件都无法读取
+            error = str(e)
+        missing.extend(rel_path for rel_path in expected if rel_path not in seen)
+
+    result = {
+        "checked": checked,
+        "bytes": checked_bytes,
+        "corrupt": sorted(corrupt),
+        "missing": sorted(missing),
+        "extra": sorted(extra),
+        "error": error,
+    }
+    result["ok"] = not (corrupt or missing or extra or error)
+    integrity["verified_at"] = time.time()
+    integrity["last_result"] = {"ok": result["ok"], "corrupt": len(corrupt), "missing": len(missing),
+                                "extra": len(extra), "error": error}
+    try:
+        save_integrity(backup_path, integrity)
+    except OSError:
+        # 备份目录只读时仍然返回校验结果
+        pass
+    return result
+
+
+def needs_verify(backup_info, max_age_seconds):
+    """快照是否需要校验：有完整性清单，且从未校验过或上次校验已超过 max_age_seconds"""
+    integrity = load_integrity(backup_info["backup_path"])
+    if integrity is None:
+        return False
+    verified_at = integrity.get("verified_at")
+    return verified_at is None or time.time() - verified_at >= max_age_seconds
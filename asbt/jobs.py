@@ -0,0 +1,172 @@
+import time
+import queue
+import itertools
+import threading
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class Job:
+    """后台任务
+
+    func(job) 在执行器的工作线程中运行，可以通过 job.report() 报告进度，
+    或把 job.progress() 返回的回调传给引擎函数。取消是协作式的：调用 cancel() 后，
+    下一次进度回调（或 check_cancelled()）会抛出 JobCancelled。
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id, name, func, on_done=None):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.on_done = on_done
+        self.state = self.PENDING
+        self.message = ""
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.executor = None
+        self._cancel_event = threading.Event()
+        self._last_notify = 0
+
+    @property
+    def finished(self):
+        return self.state in (self.DONE, self.FAILED, self.CANCELLED)
+
+    @property
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """请求取消任务"""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, message=None, done=None, total=None):
+        """报告进度
+
+        参数:
+            message: 当前步骤的说明
+            done: 已完成的数量
+            total: 总数量，为 0 时表示进度未知
+        """
+        if message is not None:
+            self.message = message
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        if self.executor is not None:
+            self.executor._notify(self)
+
+    def progress(self, message, cancellable=True):
+        """返回可传给引擎函数的进度回调 callback(done, total)
+
+        参数:
+            message: 进度说明
+            cancellable: 为 False 时回调不检查取消（用于中途停止会损坏数据的步骤，如还原）
+        """
+        def callback(done, total):
+            if cancellable:
+                self.check_cancelled()
+            self.report(message, done, total)
+        return callback
+
+
+class JobExecutor:
+    """后台任务执行器
+
+    单个工作线程按提交顺序执行任务，文件操作之间不会并发，避免同时修改同一个备份目录。
+    on_update(job) 和任务的 on_done(job) 都通过 dispatch 调用，界面可以传入
+    lambda callback: root.after(0, callback)，把它们切回 Tk 主线程执行。
+    """
+
+    # 进度通知的最小间隔（秒），避免大量小文件时刷新界面过于频繁
+    NOTIFY_INTERVAL = 0.1
+
+    def __init__(self, on_update=None, dispatch=None):
+        self.on_update = on_update
+        self.dispatch = dispatch or (lambda callback: callback())
+        self.current = None
+        self._queue = queue.Queue()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._thread = None
+
+    def submit(self, name, func, on_done=None):
+        """提交任务，返回 Job"""
+        job = Job(next(self._ids), name, func, on_done)
+        job.executor = self
+        with self._lock:
+            self._pending.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        self._notify(job, force=True)
+        return job
+
+    def pending_count(self):
+        """等待执行的任务数量（不含正在执行的任务）"""
+        with self._lock:
+            return len(self._pending)
+
+    def cancel_current(self):
+        job = self.current
+        if job is not None:
+            job.cancel()
+
+    def cancel_all(self):
+        """取消正在执行和等待执行的所有任务"""
+        with self._lock:
+            jobs = list(self._pending)
+        for job in jobs:
+            job.cancel()
+        self.cancel_current()
+
+    def _notify(self, job, force=False):
+        if self.on_update is None:
+            return
+        now = time.monotonic()
+        if not force and now - job._last_notify < self.NOTIFY_INTERVAL:
+            return
+        job._last_notify = now
+        self.dispatch(lambda: self.on_update(job))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._pending.remove(job)
+            if job.is_cancelled:
+                # 还没开始就被取消
+                job.state = Job.CANCELLED
+            else:
+                self.current = job
+                job.state = Job.RUNNING
+                self._notify(job, force=True)
+                try:
+                    job.result = job.func(job)
+                    job.state = Job.DONE
+                except JobCancelled:
+                    job.state = Job.CANCELLED
+                except Exception as e:
+                    job.error = e
+                    job.state = Job.FAILED
+                finally:
+                    self.current = None
+            self._notify(job, force=True)
+            if job.on_done is not None:
+                self.dispatch(lambda job=job: job.on_done(job))
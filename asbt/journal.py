@@ -0,0 +1,175 @@
+import os
+import json
+import threading
+
+
+class BackupJournal:
+    """备份记录和日志的追加式日志（journal）
+
+    config.json 是某一时刻的完整快照（检查点），之后每次添加/删除备份、添加日志
+    只在 journal.jsonl 末尾追加一行，不再重写整个 config.json。加载时先读取
+    config.json，再按顺序重放 journal 中序号更大的记录。
+
+    journal 超过 COMPACT_ENTRIES 行时由调用方执行 compact()：原子地写入新的
+    config.json（记录已合并的序号 journal_seq），再清空 journal。两步之间崩溃也没关系，
+    重放时会跳过序号不大于 journal_seq 的记录。
+
+    写入中途崩溃最多留下最后一行不完整的记录，加载时会忽略它，不影响之前的历史。
+    """
+
+    FILE_NAME = "journal.jsonl"
+    CONFIG_NAME = "config.json"
+    COMPACT_ENTRIES = 500
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.config_file = os.path.join(backup_dir, self.CONFIG_NAME)
+        self.journal_file = os.path.join(backup_dir, self.FILE_NAME)
+        self.seq = None
+        self.entries = 0
+        self._lock = threading.RLock()
+
+    def exists(self):
+        return os.path.exists(self.config_file) or os.path.exists(self.journal_file)
+
+    def _read_checkpoint(self):
+        if not os.path.exists(self.config_file):
+            return {}
+        with open(self.config_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_entries(self):
+        """读取 journal 中的全部记录，并截掉末尾不完整的一行"""
+        if not os.path.exists(self.journal_file):
+            return []
+        with open(self.journal_file, "rb") as f:
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            # 上次写入时崩溃，留下了不完整的一行，截掉后才能继续追加
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(len(complete))
+        entries = []
+        for line in complete.splitlines():
+            try:
+                entries.append(json.loads(line.decode("utf-8")))
+            except ValueError:
+                continue
+        return entries
+
+    def load(self):
+        """读取检查点并重放 journal，返回 {"backups": [...], "logs": [...]}"""
+        with self._lock:
+            checkpoint = self._read_checkpoint()
+            data = {
+                "backups": checkpoint.get("backups", []),
+                "logs": checkpoint.get("logs", []),
+            }
+            base_seq = checkpoint.get("journal_seq", 0)
+            entries = self._read_entries()
+            self.seq = base_seq
+            self.entries = len(entries)
+            for entry in entries:
+                seq = entry.get("seq", 0)
+                if seq <= base_seq:
+                    continue
+                apply_entry(data, entry)
+                self.seq = max(self.seq, seq)
+            return data
+
+    def append(self, op, **fields):
+        """追加一条记录
+
+        参数:
+            op: 操作类型，见 apply_entry
+            fields: 操作的参数
+
+        返回 True 表示 journal 已经较长，应该调用 compact()
+        """
+        with self._lock:
+            if self.seq is None:
+                self.load()
+            self.seq += 1
+            entry = dict(fields, seq=self.seq, op=op)
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries += 1
+            return self.entries >= self.COMPACT_ENTRIES
+
+    def compact(self, data):
+        """把完整的备份配置写入 config.json 并清空 journal
+
+        参数:
+            data: {"backups": [...], "logs": [...]}，应与重放 journal 后的结果一致
+        """
+        with self._lock:
+            if self.seq is None:
+                self.load()
+            checkpoint = dict(data, journal_seq=self.seq)
+            tmp_path = self.config_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_file)
+            # 检查点已包含全部记录，可以清空 journal
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+            self.entries = 0
+
+    def remove_files(self):
+        """删除 config.json 和 journal"""
+        with self._lock:
+            for path in (self.config_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.seq = None
+            self.entries = 0
+
+
+def apply_entry(data, entry):
+    """把一条 journal 记录应用到备份配置上
+
+    支持的操作:
+        add_backup: 添加备份记录 record
+        remove_backups: 删除 timestamp 和 backup_path 都匹配 keys 中某一项的备份
+        add_log: 添加日志 record
+        update_last_log: 用 record 替换最后一条日志（连续跳过的备份合并为一条日志）
+    """
+    op = entry.get("op")
+    if op == "add_backup":
+        data["backups"].append(entry["record"])
+    elif op == "remove_backups":
+        keys = {(key[0], key[1]) for key in entry["keys"]}
+        data["backups"] = [backup for backup in data["backups"]
+                           if (backup.get("timestamp"), backup.get("backup_path")) not in keys]
+    elif op == "add_log":
+        data["logs"].append(entry["record"])
+    elif op == "update_last_log":
+        if data["logs"]:
+            data["logs"][-1] = entry["record"]
+        else:
+            data["logs"].append(entry["record"])
+
+
+def backup_key(backup_info):
+    """备份记录在 journal 中的标识"""
+    return [backup_info.get("timestamp"), backup_info.get("backup_path")]
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(backup_dir):
+    """获取备份目录对应的 journal"""
+    key = os.path.normcase(os.path.abspath(backup_dir))
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = BackupJournal(backup_dir)
+            _journals[key] = journal
+        return journal
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import threading
+
+
+class SizeLedger:
+    """备份目录的大小台账
+
+    保存在备份目录的 ledger.json 中，记录目录的总大小、文件数、文件夹数和备份内容的原始大小。
+    完整扫描一次（见 scan_directory）后，创建和删除快照时直接增减（见 asbt.snapshot），
+    打开状态窗口时不必遍历整个目录。
+
+    增量更新不统计对象仓库中的文件数和文件夹数，也不统计配置文件大小的变化，
+    数字会逐渐偏离实际情况，可随时重新完整扫描校正。没有完整扫描过的目录不做增量更新。
+    """
+
+    FILE_NAME = "ledger.json"
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.ledger_file = os.path.join(backup_dir, self.FILE_NAME)
+        self._data = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            self._data = None
+            if os.path.exists(self.ledger_file):
+                try:
+                    with open(self.ledger_file, "r", encoding="utf-8") as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError):
+                    # 台账损坏时当作没有统计过，下次打开状态窗口时重新扫描
+                    self._data = None
+        return self._data
+
+    def _save(self):
+        tmp_path = self.ledger_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.ledger_file)
+
+    def get(self):
+        """返回台账的副本，没有完整扫描过时返回 None
+
+        字段: files, dirs, bytes, content_bytes, scanned_at（完整扫描时间），updated_at（最后更新时间）
+        """
+        with self._lock:
+            data = self._load()
+            return dict(data) if data is not None else None
+
+    def reset(self, stats):
+        """用完整扫描的结果重建台账
+
+        参数:
+            stats: {"files", "dirs", "bytes", "content_bytes"}
+        """
+        with self._lock:
+            now = time.time()
+            self._data = {
+                "files": stats["files"],
+                "dirs": stats["dirs"],
+                "bytes": stats["bytes"],
+                "content_bytes": stats.get("content_bytes", 0),
+                "scanned_at": now,
+                "updated_at": now,
+            }
+            self._loaded = True
+            self._save()
+
+    def adjust(self, files=0, dirs=0, bytes=0, content_bytes=0):
+        """增减台账中的数字，没有完整扫描过时不做任何事"""
+        with self._lock:
+            data = self._load()
+            if data is None:
+                return
+            data["files"] = max(0, data["files"] + files)
+            data["dirs"] = max(0, data["dirs"] + dirs)
+            data["bytes"] = max(0, data["bytes"] + bytes)
+            data["content_bytes"] = max(0, data["content_bytes"] + content_bytes)
+            data["updated_at"] = time.time()
+            try:
+                self._save()
+            except OSError:
+                # 备份目录不可写时快照本身也会失败，这里不再报错
+                pass
+
+    def invalidate(self):
+        """删除台账，下次需要重新完整扫描"""
+        with self._lock:
+            self._data = None
+            self._loaded = True
+            if os.path.exists(self.ledger_file):
+                os.remove(self.ledger_file)
+
+
+def measure_path(path):
+    """统计文件或文件夹（包括其本身）的 {"files", "dirs", "bytes"}，路径不存在时全为 0"""
+    stats = {"files": 0, "dirs": 0, "bytes": 0}
+    try:
+        st = os.stat(path)
+    except OSError:
+        return stats
+    if not os.path.isdir(path):
+        stats["files"] = 1
+        stats["bytes"] = st.st_size
+        return stats
+    stats["dirs"] = 1
+    _scan_into(path, stats)
+    return stats
+
+
+def scan_directory(directory, progress=None):
+    """用 os.scandir 完整扫描目录（不包括其本身），返回 {"files", "dirs", "bytes"}
+
+    DirEntry 自带文件类型，Windows 上还自带 stat 结果，比 os.walk 加 os.path.getsize 少很多系统调用
+
+    参数:
+        progress: 进度回调 progress(已扫描文件数, 0)，总数未知；抛出异常（如任务被取消）时停止扫描
+    """
+    stats = {"files": 0, "dirs": 0, "bytes": 0}
+    _scan_into(directory, stats, progress)
+    return stats
+
+
+# 扫描时每隔多少个文件报告一次进度
+_PROGRESS_EVERY = 500
+
+
+def _scan_into(directory, stats, progress=None):
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            # 扫描期间被删除或没有权限的目录跳过
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stats["dirs"] += 1
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    stats["files"] += 1
+                    stats["bytes"] += entry.stat().st_size
+                    if progress is not None and stats["files"] % _PROGRESS_EVERY == 0:
+                        progress(stats["files"], 0)
+            except OSError:
+                continue
+    return stats
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(backup_dir):
+    """获取备份目录对应的大小台账"""
+    key = os.path.normcase(os.path.abspath(backup_dir))
+    with _ledgers_lock:
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            ledger = SizeLedger(backup_dir)
+            _ledgers[key] = ledger
+        return ledger
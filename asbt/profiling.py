@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from asbt.copier import throughput
+
+
+# 每次操作（备份、还原、校验、保存配置等）按阶段计时，结果保存到日志中，
+# 设置了指标文件时同时追加到该文件（每行一个 JSON）；性能分析数据保存在备份目录的 .profiles 文件夹中
+PROFILE_DIR = ".profiles"
+PROFILE_CPU = "cpu"  # cProfile，保存为 .prof，可用 python -m pstats 或 snakeviz 查看
+PROFILE_MEMORY = "memory"  # tracemalloc，保存为文本，列出分配内存最多的代码行
+PROFILE_MODES = (PROFILE_CPU, PROFILE_MEMORY)
+MEMORY_TOP_LINES = 30
+
+# 阶段的显示名称
+PHASE_NAMES = {
+    "scan": "扫描",
+    "copy": "复制",
+    "integrity": "完整性清单",
+    "metadata": "写入记录",
+    "prune": "清理旧备份",
+    "pre_backup": "还原前备份",
+    "restore": "还原",
+    "verify": "校验",
+    "journal": "写入配置",
+    "catalog": "重建目录",
+    "backup_list": "刷新备份列表",
+}
+
+
+class OperationTimer:
+    """一次操作的分阶段计时
+
+    用 span 包住每个阶段；传入或在阶段中设置 files、bytes 时同时计算该阶段的吞吐量
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.phases = []
+        self.profile = None  # 性能分析数据的文件路径
+        self.error = None
+
+    @property
+    def elapsed(self):
+        """从开始计时到现在的秒数"""
+        return time.perf_counter() - self.start
+
+    @contextmanager
+    def span(self, name, files=None, nbytes=None):
+        """计时一个阶段，返回的字典中可以在阶段结束前填入 files 和 bytes"""
+        phase = {"name": name, "files": files, "bytes": nbytes}
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase["seconds"] = time.perf_counter() - start
+            self.phases.append(phase)
+
+    def summary(self):
+        """到目前为止的计时结果：{"operation", "started_at", "seconds", "phases": [...]}"""
+        phases = []
+        for phase in self.phases:
+            item = {"name": phase["name"], "seconds": round(phase["seconds"], 4)}
+            if phase["files"] is not None:
+                item["files"] = phase["files"]
+            if phase["bytes"] is not None:
+                item["bytes"] = phase["bytes"]
+            if phase["files"] is not None and phase["bytes"] is not None and phase["seconds"] > 0:
+                rate = throughput(phase["files"], phase["bytes"], phase["seconds"])
+                item["files_per_sec"] = rate["files_per_sec"]
+                item["mb_per_sec"] = rate["mb_per_sec"]
+            phases.append(item)
+        summary = {
+            "operation": self.operation,
+            "started_at": self.started_at,
+            "seconds": round(self.elapsed, 4),
+            "phases": phases,
+        }
+        if self.profile:
+            summary["profile"] = self.profile
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+
+def format_timing(timing):
+    """计时结果的简短描述，如 "共 1.2 秒：扫描 0.05 秒，复制 1.1 秒（120 文件/秒，35.2 MB/秒）" """
+    parts = []
+    for phase in timing["phases"]:
+        text = f"{PHASE_NAMES.get(phase['name'], phase['name'])} {phase['seconds']:.3f} 秒"
+        if "mb_per_sec" in phase:
+            text += f"（{phase['files_per_sec']} 文件/秒，{phase['mb_per_sec']} MB/秒）"
+        parts.append(text)
+    return f"共 {timing['seconds']:.3f} 秒：" + "，".join(parts)
+
+
+_metrics_lock = threading.Lock()
+
+
+def append_metrics(path, record):
+    """把一次操作的计时结果追加到指标文件（JSON Lines），多个引擎共用同一个文件时不会交错"""
+    line = json.dumps(record, ensure_ascii=False)
+    with _metrics_lock:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class ProfileCapture:
+    """为一次操作采集 cProfile 或 tracemalloc 数据，结束后保存到 <output_dir>/.profiles/<name>
+
+    cProfile 只记录调用线程，并行复制时工作线程中的耗时表现为等待；
+    tracemalloc 会让操作明显变慢，只应在排查问题时使用
+    """
+
+    def __init__(self, mode, output_dir, name):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的性能分析类型: {mode}")
+        self.mode = mode
+        suffix = ".prof" if mode == PROFILE_CPU else ".txt"
+        self.path = os.path.join(output_dir, PROFILE_DIR, name + suffix)
+        self._profiler = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.mode == PROFILE_CPU:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.mode == PROFILE_CPU:
+            self._profiler.disable()
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracing:
+                tracemalloc.stop()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self.mode == PROFILE_CPU:
+                self._profiler.dump_stats(self.path)
+            else:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.write(f"当前 {current / 1024 / 1024:.2f} MB，峰值 {peak / 1024 / 1024:.2f} MB\n\n")
+                    for stat in snapshot.statistics("lineno")[:MEMORY_TOP_LINES]:
+                        f.write(f"{stat}\n")
+        except OSError:
+            # 保存失败不影响操作本身
+            self.path = None
+        return False
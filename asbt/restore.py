@@ -0,0 +1,513 @@
+import os
+import shutil
+
+from asbt.snapshot import (FORMAT_COPY, FORMAT_MANIFEST, FORMAT_ARCHIVE, get_format, load_manifest, restore_snapshot,
+                           snapshot_file_openers)
+from asbt.archive import MEMBER_DIR, MEMBER_FILE, iter_members, iter_archive_entries, safe_target
+from asbt.delta import read_header
+from asbt.copier import ProgressCounter, create_copier, run_parallel
+from asbt.integrity import load_integrity, hash_snapshot, check_algorithm, new_hasher, CHUNK_SIZE
+
+
+# 差异还原：只写入与快照不同的文件、只删除快照中没有的文件，而不是删除整个文件夹后重新复制
+DEFAULT_RESTORE = {
+    "differential": True,
+    "compare": "mtime",  # mtime：按大小和修改时间比较；hash：大小相同时再比较内容的校验值（需要读取当前文件）
+    "atomic": False,  # 先在临时文件夹中组装还原结果，完成后再替换目标文件夹
+}
+
+COMPARE_MTIME = "mtime"
+COMPARE_HASH = "hash"
+
+# 比较修改时间时允许的误差（秒）：zip 只精确到 2 秒，tar（PAX 格式）和其他格式保存了小数部分
+_ZIP_MTIME_TOLERANCE = 2.0
+_DEFAULT_MTIME_TOLERANCE = 0.001
+
+# 还原过程中的临时文件和文件夹的后缀
+_TMP_SUFFIX = ".asbt_restore"
+_OLD_SUFFIX = ".asbt_old"
+
+
+def normalize_restore(options):
+    """补全还原设置中缺少的字段"""
+    merged = dict(DEFAULT_RESTORE)
+    if options:
+        merged.update(options)
+    return merged
+
+
+def _mtime_tolerance(backup_info):
+    if get_format(backup_info) == FORMAT_ARCHIVE and backup_info["archive_type"] == "zip":
+        return _ZIP_MTIME_TOLERANCE
+    return _DEFAULT_MTIME_TOLERANCE
+
+
+def snapshot_entries(backup_info):
+    """列出文件夹快照中的文件和目录，返回 ({相对路径: (大小, 修改时间)}, [相对目录])"""
+    backup_path = backup_info["backup_path"]
+    fmt = get_format(backup_info)
+    if fmt == FORMAT_MANIFEST:
+        manifest = load_manifest(backup_path)
+        return {entry["path"]: (entry["size"], entry["mtime"]) for entry in manifest["files"]}, list(manifest["dirs"])
+    if fmt == FORMAT_ARCHIVE:
+        files = {}
+        dirs = set()
+        for name, kind, size, mtime, mode, chunks in iter_archive_entries(backup_path, backup_info["archive_type"]):
+            # 符号链接、硬链接等成员完整还原时也不还原
+            if kind == MEMBER_DIR:
+                dirs.add(name)
+            elif kind == MEMBER_FILE:
+                files[name] = (size, mtime)
+        # 压缩包中不一定有父目录的条目
+        for rel_path in files:
+            parts = rel_path.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                dirs.add("/".join(parts[:i]))
+        return files, sorted(dirs)
+    files, dirs = _walk_tree(backup_path)
+    return files, sorted(dirs)
+
+
+def _walk_tree(root_path):
+    """遍历文件夹，返回 ({相对路径: (大小, 修改时间)}, {相对目录})
+
+    符号链接等非普通文件的大小记为 -1，总会被视为与快照不同
+    """
+    files = {}
+    dirs = set()
+    stack = [("", root_path)]
+    while stack:
+        rel_root, root = stack.pop()
+        with os.scandir(root) as entries:
+            for entry in entries:
+                rel_path = f"{rel_root}/{entry.name}" if rel_root else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.add(rel_path)
+                    stack.append((rel_path, entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    files[rel_path] = (st.st_size, st.st_mtime)
+                else:
+                    files[rel_path] = (-1, 0)
+    return files, dirs
+
+
+def _hash_file(path, algorithm):
+    hasher = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def plan_restore(backup_info, target_path, compare=COMPARE_MTIME, workers=1):
+    """比较快照与目标文件夹，返回需要执行的操作
+
+    返回 {"write": [需要写入的文件], "unchanged": [相同的文件], "remove": [多余的文件],
+          "remove_dirs": [多余的目录（从深到浅）], "dirs": [快照中的目录], "entries": 快照文件列表}
+    """
+    entries, snapshot_dirs = snapshot_entries(backup_info)
+    live_files, live_dirs = _walk_tree(target_path)
+    tolerance = _mtime_tolerance(backup_info)
+
+    write = []
+    candidates = []
+    for rel_path, (size, mtime) in entries.items():
+        live = live_files.get(rel_path)
+        if live is None or live[0] != size:
+            write.append(rel_path)
+        elif compare == COMPARE_HASH:
+            candidates.append(rel_path)
+        elif abs(live[1] - mtime) > tolerance:
+            write.append(rel_path)
+        else:
+            candidates.append(rel_path)
+
+    unchanged = candidates
+    if compare == COMPARE_HASH and candidates:
+        # 大小相同的文件再比较内容：快照一侧优先使用完整性清单中的校验值，没有时才读取快照
+        integrity = load_integrity(backup_info["backup_path"])
+        if integrity is not None and all(rel_path in integrity["files"] for rel_path in candidates):
+            algorithm = integrity["algorithm"]
+            expected = {rel_path: integrity["files"][rel_path][2] for rel_path in candidates}
+        else:
+            algorithm = (integrity or {}).get("algorithm") or "blake2b"
+            expected = {rel_path: digest for rel_path, (size, digest)
+                        in hash_snapshot(backup_info, algorithm, set(candidates), workers).items()}
+
+        def same_content(rel_path):
+            return _hash_file(os.path.join(target_path, *rel_path.split("/")), algorithm) == expected.get(rel_path)
+
+        same = run_parallel(same_content, candidates, workers)
+        unchanged = [rel_path for rel_path, is_same in zip(candidates, same) if is_same]
+        write.extend(rel_path for rel_path, is_same in zip(candidates, same) if not is_same)
+
+    snapshot_dir_set = set(snapshot_dirs)
+    return {
+        "write": sorted(write),
+        "unchanged": unchanged,
+        # 快照中同名的是目录（或文件）时，创建该目录（写入该文件）时已经删除了原来的文件（目录）
+        "remove": sorted(rel_path for rel_path in live_files
+                         if rel_path not in entries and rel_path not in snapshot_dir_set),
+        # 按路径倒序排列，子目录总在父目录之前
+        "remove_dirs": sorted((rel_dir for rel_dir in live_dirs
+                               if rel_dir not in snapshot_dir_set and rel_dir not in entries), reverse=True),
+        "dirs": snapshot_dirs,
+        "entries": entries,
+    }
+
+
+def _replace_file(tmp_path, target):
+    # 目标是目录（快照中是文件）时先删除
+    if os.path.isdir(target) and not os.path.islink(target):
+        shutil.rmtree(target)
+    os.replace(tmp_path, target)
+
+
+def _write_snapshot_files(backup_info, rel_paths, target_root, workers=1, progress=None):
+    """把完整复制或去重存储快照中的指定文件写入 target_root，每个文件先写临时文件再替换，返回写入的字节数
+
+    压缩归档只能顺序读取，由 _restore_archive 在读取时直接写入
+    """
+    if not rel_paths:
+        return 0
+    backup_path = backup_info["backup_path"]
+    fmt = get_format(backup_info)
+    wanted = set(rel_paths)
+    counter = ProgressCounter(len(wanted), progress)
+
+    def target_of(rel_path):
+        return os.path.join(target_root, *rel_path.split("/"))
+
+    if fmt == FORMAT_COPY:
+        copier = create_copier(target_root)
+
+        def write_one(rel_path):
+            target = target_of(rel_path)
+            tmp_path = target + _TMP_SUFFIX
+            copier.copy(os.path.join(backup_path, *rel_path.split("/")), tmp_path)
+            _replace_file(tmp_path, target)
+            counter.step()
+            return os.path.getsize(target)
+
+        return sum(run_parallel(write_one, sorted(wanted), workers))
+
+    manifest_entries = {entry["path"]: entry for entry in load_manifest(backup_path)["files"]}
+    openers = snapshot_file_openers(backup_info)
+
+    def restore_one(rel_path):
+        entry = manifest_entries[rel_path]
+        target = target_of(rel_path)
+        tmp_path = target + _TMP_SUFFIX
+        with openers[rel_path][1]() as src, open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        if "mode" in entry:
+            os.chmod(tmp_path, entry["mode"])
+        os.utime(tmp_path, (entry["mtime"], entry["mtime"]))
+        _replace_file(tmp_path, target)
+        counter.step()
+        return entry["size"]
+
+    return sum(run_parallel(restore_one, sorted(wanted), workers))
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _make_dirs(root, rel_dirs):
+    for rel_dir in rel_dirs:
+        path = os.path.join(root, *rel_dir.split("/"))
+        if os.path.lexists(path) and not os.path.isdir(path):
+            # 当前是文件（快照中是目录）
+            os.remove(path)
+        os.makedirs(path, exist_ok=True)
+
+
+def _restore_archive(backup_info, target_path, options, progress):
+    """压缩归档的差异还原：只读取一遍归档，边读取边比较和写入
+
+    tar 只能顺序解压，先列出成员再读取数据需要解压两遍，比完整还原还慢。
+    这里先遍历目标文件夹，读取归档时逐个成员与当前文件比较，变化的文件直接从数据流写入；
+    按内容比较且完整性清单中没有校验值时，先写入临时文件并计算校验值，与当前文件相同时丢弃。
+    成员路径越出目标文件夹（绝对路径或 ..）时拒绝还原，符号链接等非普通文件与完整还原一样跳过。
+    """
+    backup_path = backup_info["backup_path"]
+    live_files, live_dirs = _walk_tree(target_path)
+    tolerance = _mtime_tolerance(backup_info)
+    compare = options["compare"]
+    integrity = load_integrity(backup_path) if compare == COMPARE_HASH else None
+    algorithm = integrity["algorithm"] if integrity is not None else "blake2b"
+    # 在修改目标文件夹之前确认校验算法可用，避免还原到一半才因为没有安装 xxhash 而失败
+    check_algorithm(algorithm)
+
+    root = target_path
+    staging = None
+    old_path = target_path + _OLD_SUFFIX
+    if options["atomic"]:
+        staging = target_path + _TMP_SUFFIX
+        for path in (staging, old_path):
+            # 上一次还原中断时留下的临时文件夹
+            if os.path.lexists(path):
+                _remove(path)
+        os.makedirs(staging)
+        root = staging
+    copier = create_copier(root) if staging is not None else None
+
+    entries = {}
+    snapshot_dirs = set()
+    ensured = set()
+    written = 0
+    changed = 0
+    unchanged = 0
+    counter = ProgressCounter(backup_info.get("file_count") or 0, progress)
+
+    def ensure_parents(rel_path):
+        parts = rel_path.split("/")[:-1]
+        missing = []
+        for i in range(1, len(parts) + 1):
+            rel_dir = "/".join(parts[:i])
+            if rel_dir not in ensured:
+                ensured.add(rel_dir)
+                snapshot_dirs.add(rel_dir)
+                missing.append(rel_dir)
+        _make_dirs(root, missing)
+
+    try:
+        for name, kind, size, mtime, mode, chunks in iter_archive_entries(backup_path, backup_info["archive_type"],
+                                                                           CHUNK_SIZE):
+            # 与完整还原相同的检查：拒绝越出目标文件夹的成员
+            target = safe_target(root, name)
+            if kind == MEMBER_DIR:
+                if name and name not in ensured:
+                    ensure_parents(name)
+                    ensured.add(name)
+                    snapshot_dirs.add(name)
+                    _make_dirs(root, [name])
+                continue
+            if kind != MEMBER_FILE:
+                continue
+            entries[name] = (size, mtime)
+            ensure_parents(name)
+            live_path = os.path.join(target_path, *name.split("/"))
+            live = live_files.get(name)
+            same = live is not None and live[0] == size
+            digest = None
+            if same and compare == COMPARE_HASH:
+                if integrity is not None and name in integrity["files"]:
+                    same = _hash_file(live_path, algorithm) == integrity["files"][name][2]
+                else:
+                    same = None  # 写入临时文件时计算
+            elif same:
+                same = abs(live[1] - mtime) <= tolerance
+
+            if same:
+                if staging is not None and not copier.link(live_path, target):
+                    copier.copy(live_path, target)
+                unchanged += 1
+                counter.step()
+                continue
+
+            tmp_path = target + _TMP_SUFFIX
+            hasher = new_hasher(algorithm) if same is None else None
+            size_written = 0
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size_written += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            if hasher is not None:
+                digest = hasher.hexdigest()
+            if digest is not None and _hash_file(live_path, algorithm) == digest:
+                # 内容相同，保留当前文件
+                os.remove(tmp_path)
+                if staging is not None and not copier.link(live_path, target):
+                    copier.copy(live_path, target)
+                unchanged += 1
+                counter.step()
+                continue
+            # 与完整还原相同，恢复权限和修改时间
+            if mode is not None:
+                os.chmod(tmp_path, mode)
+            os.utime(tmp_path, (mtime, mtime))
+            _replace_file(tmp_path, target)
+            written += size_written
+            changed += 1
+            counter.step()
+
+        removed = [rel_path for rel_path in live_files if rel_path not in entries and rel_path not in snapshot_dirs]
+        if staging is not None:
+            shutil.copystat(target_path, staging)
+            os.rename(target_path, old_path)
+    except BaseException:
+        if staging is not None and os.path.lexists(staging):
+            _remove(staging)
+        raise
+
+    if staging is not None:
+        try:
+            os.rename(staging, target_path)
+        except BaseException:
+            os.rename(old_path, target_path)
+            _remove(staging)
+            raise
+        _remove(old_path)
+    else:
+        # 先写入变化的文件，最后才删除多余的文件
+        for rel_path in removed:
+            _remove(os.path.join(target_path, *rel_path.split("/")))
+        for rel_dir in sorted((d for d in live_dirs if d not in snapshot_dirs and d not in entries), reverse=True):
+            _remove(os.path.join(target_path, *rel_dir.split("/")))
+    return {
+        "files": changed,
+        "bytes": written,
+        "unchanged": unchanged,
+        "removed": len(removed),
+        "mode": "differential",
+    }
+
+
+def _restore_in_place(backup_info, target_path, plan, workers, progress):
+    # 先写入变化的文件，最后才删除多余的文件：中途失败时不会丢失当前的文件
+    _make_dirs(target_path, plan["dirs"])
+    written = _write_snapshot_files(backup_info, plan["write"], target_path, workers, progress)
+    for rel_path in plan["remove"]:
+        _remove(os.path.join(target_path, *rel_path.split("/")))
+    for rel_dir in plan["remove_dirs"]:
+        _remove(os.path.join(target_path, *rel_dir.split("/")))
+    return written
+
+
+def _restore_atomic(backup_info, target_path, plan, workers, progress):
+    """在临时文件夹中组装还原结果再替换目标文件夹，中途失败时目标文件夹保持不变
+
+    未变化的文件硬链接到临时文件夹（不支持硬链接时复制），只有变化的文件需要从快照写入
+    """
+    staging = target_path + _TMP_SUFFIX
+    old_path = target_path + _OLD_SUFFIX
+    for path in (staging, old_path):
+        # 上一次还原中断时留下的临时文件夹
+        if os.path.lexists(path):
+            _remove(path)
+    try:
+        os.makedirs(staging)
+        _make_dirs(staging, plan["dirs"])
+        copier = create_copier(staging)
+
+        def link_one(rel_path):
+            parts = rel_path.split("/")
+            if not copier.link(os.path.join(target_path, *parts), os.path.join(staging, *parts)):
+                copier.copy(os.path.join(target_path, *parts), os.path.join(staging, *parts))
+
+        run_parallel(link_one, plan["unchanged"], workers)
+        written = _write_snapshot_files(backup_info, plan["write"], staging, workers, progress)
+        shutil.copystat(target_path, staging)
+        os.rename(target_path, old_path)
+    except BaseException:
+        if os.path.lexists(staging):
+            _remove(staging)
+        raise
+    try:
+        os.rename(staging, target_path)
+    except BaseException:
+        os.rename(old_path, target_path)
+        _remove(staging)
+        raise
+    _remove(old_path)
+    return written
+
+
+def restore_differential(backup_info, target_path, options=None, workers=1, progress=None):
+    """差异还原：只写入与快照不同的文件，只删除快照中没有的文件
+
+    还原所需的时间取决于变化的大小，而不是整个存档的大小。单个文件的快照与当前文件相同时跳过，
+    否则写入临时文件后再替换；目标不存在或类型不同时与完整还原相同。
+
+    参数:
+        options: 还原设置，见 DEFAULT_RESTORE
+        progress: 每写入一个文件调用 progress(done, total)
+
+    返回 {"files": 写入的文件数, "bytes": 写入的字节数, "unchanged", "removed", "mode"}
+    """
+    options = normalize_restore(options)
+    is_directory = backup_info.get("is_directory", False)
+
+    if not is_directory:
+        return _restore_single_file(backup_info, target_path, options, progress)
+    if not os.path.isdir(target_path) or os.path.islink(target_path):
+        result = restore_snapshot(backup_info, target_path, workers, progress)
+        return dict(result, unchanged=0, removed=0, mode="full")
+
+    if get_format(backup_info) == FORMAT_ARCHIVE:
+        return _restore_archive(backup_info, target_path, options, progress)
+    plan = plan_restore(backup_info, target_path, options["compare"], workers)
+    if options["atomic"]:
+        written = _restore_atomic(backup_info, target_path, plan, workers, progress)
+    else:
+        written = _restore_in_place(backup_info, target_path, plan, workers, progress)
+    return {
+        "files": len(plan["write"]),
+        "bytes": written,
+        "unchanged": len(plan["unchanged"]),
+        "removed": len(plan["remove"]),
+        "mode": "differential",
+    }
+
+
+def _restore_single_file(backup_info, target_path, options, progress):
+    if os.path.isfile(target_path) and not os.path.islink(target_path):
+        rel_path = os.path.basename(backup_info["original"])
+        expected = _single_file_entry(backup_info)
+        st = os.stat(target_path)
+        same = expected is not None and st.st_size == expected[0]
+        if same and options["compare"] == COMPARE_HASH:
+            integrity = load_integrity(backup_info["backup_path"])
+            if integrity is not None and rel_path in integrity["files"]:
+                algorithm, digest = integrity["algorithm"], integrity["files"][rel_path][2]
+            else:
+                algorithm = "blake2b"
+                digest = hash_snapshot(backup_info, algorithm)[rel_path][1]
+            same = _hash_file(target_path, algorithm) == digest
+        elif same:
+            same = abs(st.st_mtime - expected[1]) <= _mtime_tolerance(backup_info)
+        if same:
+            return {"files": 0, "bytes": 0, "unchanged": 1, "removed": 0, "mode": "differential"}
+
+    # 先还原到临时文件，完成后再替换，中途失败时当前文件保持不变
+    tmp_path = target_path + _TMP_SUFFIX
+    if os.path.lexists(tmp_path):
+        _remove(tmp_path)
+    try:
+        result = restore_snapshot(backup_info, tmp_path, progress=progress)
+        if os.path.isdir(target_path) and not os.path.islink(target_path):
+            shutil.rmtree(target_path)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            _remove(tmp_path)
+        raise
+    return dict(result, unchanged=0, removed=0, mode="differential")
+
+
+def _single_file_entry(backup_info):
+    """单个文件快照中文件的 (大小, 修改时间)，无法获取时返回 None"""
+    backup_path = backup_info["backup_path"]
+    fmt = get_format(backup_info)
+    if fmt == FORMAT_COPY:
+        st = os.stat(backup_path)
+        return st.st_size, st.st_mtime
+    if fmt == FORMAT_MANIFEST:
+        entry = load_manifest(backup_path)["files"][0]
+        return entry["size"], entry["mtime"]
+    if fmt == FORMAT_ARCHIVE:
+        for name, is_dir, size, mtime in iter_members(backup_path, backup_info["archive_type"]):
+            if not is_dir:
+                return size, mtime
+        return None
+    # 块级增量的头部记录了完整文件的大小和修改时间
+    header = read_header(backup_path)
+    return header["size"], header["mtime"]
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+
+# 默认保留策略：最近 20 个全部保留，24 小时内每小时保留一个，
+# 30 天内每天保留一个，8 周内每周保留一个，其余的清理
+DEFAULT_POLICY = {
+    "enabled": False,
+    "keep_last": 20,
+    "hourly": 24,
+    "daily": 30,
+    "weekly": 8,
+}
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def normalize_policy(policy):
+    """补全保留策略中缺少的字段"""
+    merged = dict(DEFAULT_POLICY)
+    if policy:
+        merged.update(policy)
+    return merged
+
+
+def _parse_date(backup):
+    try:
+        return datetime.strptime(backup["date"], DATE_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def select_backups_to_prune(backups, policy, now=None):
+    """根据保留策略选出需要清理的备份
+
+    规则按源路径分别计算，满足任意一条规则的备份都会保留：
+        keep_last: 保留最近的 N 个备份
+        hourly: 最近 N 小时内，每小时保留最新的一个
+        daily: 最近 N 天内，每天保留最新的一个
+        weekly: 最近 N 周内，每周保留最新的一个
+    无法解析日期的备份总是保留。
+
+    参数:
+        backups: 备份记录列表（按时间先后排列）
+        policy: 保留策略
+        now: 当前时间，默认为 datetime.now()
+
+    返回需要清理的备份记录列表，顺序与 backups 相同
+    """
+    policy = normalize_policy(policy)
+    now = now or datetime.now()
+    # 最新的一个备份无论如何都保留
+    keep_last = max(1, int(policy["keep_last"]))
+    tiers = [
+        (int(policy["hourly"]), timedelta(hours=1), lambda d: (d.year, d.month, d.day, d.hour)),
+        (int(policy["daily"]), timedelta(days=1), lambda d: (d.year, d.month, d.day)),
+        (int(policy["weekly"]), timedelta(weeks=1), lambda d: tuple(d.isocalendar()[:2])),
+    ]
+
+    by_source = {}
+    for position, backup in enumerate(backups):
+        by_source.setdefault(backup.get("original"), []).append((position, backup))
+
+    keep = set()
+    for items in by_source.values():
+        # 从新到旧
+        items = sorted(items, key=lambda item: (_parse_date(item[1]) or datetime.max, item[0]), reverse=True)
+        for position, backup in items[:keep_last]:
+            keep.add(position)
+        for count, period, bucket_of in tiers:
+            if count <= 0:
+                continue
+            start = now - period * count
+            seen = set()
+            for position, backup in items:
+                date = _parse_date(backup)
+                if date is None:
+                    keep.add(position)
+                    continue
+                if date < start:
+                    break
+                bucket = bucket_of(date)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(position)
+
+    return [backup for position, backup in enumerate(backups) if position not in keep]
@@ -0,0 +1,62 @@
+import os
+
+
+def _stat_record(st):
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def scan_source(source_path, is_directory):
+    """只用 stat 扫描源文件或文件夹
+
+    返回 {"files": {相对路径: [size, mtime_ns, inode]}, "dirs": [相对路径]}
+    """
+    files = {}
+    dirs = []
+    if not is_directory:
+        files[os.path.basename(source_path)] = _stat_record(os.stat(source_path))
+        return {"files": files, "dirs": dirs}
+
+    stack = [("", source_path)]
+    while stack:
+        rel_root, root = stack.pop()
+        with os.scandir(root) as entries:
+            for entry in entries:
+                rel_path = f"{rel_root}/{entry.name}" if rel_root else entry.name
+                if entry.is_dir():
+                    dirs.append(rel_path)
+                    stack.append((rel_path, entry.path))
+                else:
+                    files[rel_path] = _stat_record(entry.stat())
+    dirs.sort()
+    return {"files": files, "dirs": dirs}
+
+
+def diff_scan(previous, scan):
+    """比较两次扫描结果，返回各类文件数量
+
+    previous 为 None 时所有文件都视为新增
+    """
+    old_files = previous["files"] if previous else {}
+    new_files = scan["files"]
+    added = modified = unchanged = 0
+    changed_bytes = 0
+    for rel_path, record in new_files.items():
+        old = old_files.get(rel_path)
+        if old is None:
+            added += 1
+            changed_bytes += record[0]
+        elif old == record:
+            unchanged += 1
+        else:
+            modified += 1
+            changed_bytes += record[0]
+    removed = sum(1 for rel_path in old_files if rel_path not in new_files)
+    dirs_changed = previous is None or previous["dirs"] != scan["dirs"]
+    return {
+        "added": added,
+        "modified": modified,
+        "removed": removed,
+        "unchanged": unchanged,
+        "changed_bytes": changed_bytes,  # 新增和修改的文件的总大小
+        "is_changed": bool(added or modified or removed or dirs_changed),
+    }
@@ -0,0 +1,170 @@
+import time
+import threading
+
+from asbt.engine import BackupEngine, job_settings, validate_jobs
+
+
+class ScheduledJob:
+    """调度器中的一个任务"""
+
+    def __init__(self, name, interval, run):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_run = 0
+        self.running = False
+        self.last_run = None  # 最近一次完成的时间（time.time()）
+        self.last_error = None
+
+
+class BackupScheduler:
+    """多个备份任务共用的调度器
+
+    每个任务按自己的间隔运行，同一时间最多运行 max_concurrent 个任务，
+    两个任务开始的时间至少相隔 stagger 秒，所有任务在同一分钟到期时依次错开启动，
+    不会同时占满磁盘。任务还在运行时不会重复启动，下一次运行从本次完成时开始计算间隔。
+    任务出错时记录在 last_error 中并调用 on_error(name, error)，之后照常调度。
+    """
+
+    def __init__(self, max_concurrent=1, stagger=30, on_error=None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.stagger = max(0, stagger)
+        self.on_error = on_error
+        self.jobs = []
+        self._cond = threading.Condition()
+        self._running_count = 0
+        self._last_start = None
+        self._stopped = True
+        self._thread = None
+        # 每次 start 加一，调度线程发现与启动时不同就退出，stop 后立即 start 时旧线程不会继续调度
+        self._generation = 0
+        # asbt.exporter.BackupMetrics，任务结束后刷新指标文本文件中的排队和运行中任务数
+        self.metrics = None
+
+    def add(self, name, interval, run):
+        """添加任务
+
+        参数:
+            interval: 运行间隔（秒）
+            run: run()，在单独的线程中执行
+        """
+        with self._cond:
+            self.jobs.append(ScheduledJob(name, max(1, interval), run))
+            self._cond.notify()
+
+    @property
+    def is_running(self):
+        return not self._stopped
+
+    def start(self):
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+            self._generation += 1
+            now = time.monotonic()
+            for job in self.jobs:
+                job.next_run = now
+            self._thread = threading.Thread(target=self._loop, args=(self._generation,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止调度，已经在运行的任务会执行完"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """等待正在运行的任务结束，返回是否已全部结束"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._running_count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def status(self):
+        """各任务的状态 [{"name", "running", "next_in"（距下次运行的秒数）, "last_run", "last_error"}]"""
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                "name": job.name,
+                "running": job.running,
+                "next_in": None if self._stopped or job.running else max(0, job.next_run - now),
+                "last_run": job.last_run,
+                "last_error": job.last_error,
+            } for job in self.jobs]
+
+    def _loop(self, generation):
+        with self._cond:
+            while not self._stopped and self._generation == generation:
+                now = time.monotonic()
+                # 下一个允许启动任务的时间（与上一个任务错开 stagger 秒）
+                slot_time = now if self._last_start is None else self._last_start + self.stagger
+                waiting = [job for job in self.jobs if not job.running]
+                if not waiting:
+                    self._cond.wait()
+                    continue
+                job = min(waiting, key=lambda j: j.next_run)
+                start_time = max(job.next_run, slot_time)
+                if self._running_count >= self.max_concurrent:
+                    # 等待有任务结束
+                    self._cond.wait()
+                    continue
+                if start_time > now:
+                    self._cond.wait(start_time - now)
+                    continue
+                job.running = True
+                self._running_count += 1
+                self._last_start = now
+                threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+
+    def _run_job(self, job):
+        error = None
+        try:
+            job.run()
+        except Exception as e:
+            error = e
+        with self._cond:
+            job.running = False
+            job.last_run = time.time()
+            job.last_error = str(error) if error is not None else None
+            job.next_run = time.monotonic() + job.interval
+            self._running_count -= 1
+            self._cond.notify_all()
+        if self.metrics is not None:
+            self.metrics.flush()
+        if error is not None and self.on_error is not None:
+            self.on_error(job.name, error)
+
+
+def create_job_scheduler(settings, make_listener=None, on_error=None, metrics=None):
+    """按全局配置中启用的备份任务创建调度器（尚未启动）
+
+    每个任务有自己的 BackupEngine，配置为全局配置加上任务自己的字段（见 asbt.engine.job_settings）。
+
+    参数:
+        make_listener: make_listener(job_name)，返回该任务引擎的 EngineListener
+        on_error: 见 BackupScheduler
+        metrics: asbt.exporter.BackupMetrics，各任务的备份结果按任务名称记录到其中
+
+    返回 (调度器, {任务名称: 引擎})，配置有误时抛出 ValueError
+    """
+    jobs = [job for job in settings.get("jobs", []) if job.get("enabled", True)]
+    validate_jobs(jobs)
+    scheduler = BackupScheduler(settings.get("max_concurrent_jobs", 1), settings.get("job_stagger_seconds", 30),
+                                on_error)
+    engines = {}
+    for job in jobs:
+        listener = make_listener(job["name"]) if make_listener else None
+        engine = BackupEngine(job_settings(settings, job), listener)
+        engine.metrics = metrics
+        engine.metrics_job = job["name"]
+        engines[job["name"]] = engine
+        scheduler.add(job["name"], float(job["interval"]) * 60, engine.run_scheduled_backup)
+    if metrics is not None:
+        metrics.scheduler = scheduler
+        scheduler.metrics = metrics
+    return scheduler, engines
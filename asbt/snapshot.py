@@ -0,0 +1,651 @@
+import os
+import json
+import time
+import shutil
+
+from asbt.store import get_store
+from asbt.scan import scan_source
+from asbt.copier import DEFAULT_WORKERS, STRATEGY_RENAME, ProgressCounter, copy_tree, create_copier, run_parallel
+from asbt.delta import create_delta, restore_delta, delete_delta, iter_blocks
+from asbt.archive import (create_archive, restore_archive, iter_members, iter_archive_files, list_archive_dir,
+                          read_archive_text)
+from asbt.statcache import stat_cache
+from asbt.ledger import get_ledger, measure_path
+
+
+# 快照格式
+FORMAT_COPY = "copy"  # 完整复制（旧版本的默认方式）
+FORMAT_MANIFEST = "manifest"  # 去重存储，快照只是一份指向对象仓库的清单
+FORMAT_DELTA = "delta"  # 块级增量，仅用于单个文件，只保存变化的数据块
+FORMAT_ARCHIVE = "archive"  # 压缩归档（tar.gz/tar.xz/zip 等），快照为单个压缩文件
+
+
+def get_format(backup_info):
+    """获取备份记录的快照格式，旧版本记录没有该字段，视为完整复制"""
+    return backup_info.get("format", FORMAT_COPY)
+
+
+def resolve_format(store_mode, is_directory):
+    """根据存储模式确定实际使用的快照格式
+
+    块级增量只适用于单个文件，文件夹使用去重存储（按文件去重）
+    """
+    if store_mode == FORMAT_DELTA and is_directory:
+        return FORMAT_MANIFEST
+    return store_mode
+
+
+def snapshot_suffix(fmt, options=None):
+    """快照文件名需要追加的扩展名，压缩归档使用归档格式的扩展名"""
+    if fmt == FORMAT_ARCHIVE:
+        return "." + (options or {}).get("archive_type", "tar.gz")
+    return ""
+
+
+def _backup_dir_of(backup_path):
+    return os.path.dirname(os.path.abspath(backup_path))
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# 快照的完整性清单保存在备份目录的这个文件夹中，见 asbt.integrity
+INTEGRITY_DIR = ".integrity"
+
+
+def integrity_path(backup_path):
+    """快照的完整性清单路径"""
+    return os.path.join(_backup_dir_of(backup_path), INTEGRITY_DIR, os.path.basename(backup_path) + ".json")
+
+
+def load_manifest(backup_path):
+    with open(backup_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_path(path, is_directory):
+    if is_directory:
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def create_snapshot(source_path, backup_path, is_directory, fmt=FORMAT_COPY, scan=None, previous=None,
+                    options=None, progress=None, consistency=None):
+    """创建快照
+
+    参数:
+        source_path: 源文件或文件夹
+        backup_path: 快照保存路径
+        is_directory: 源是否为文件夹
+        fmt: 快照格式
+        scan: 源的 stat 扫描结果（见 asbt.scan.scan_source），可选
+        previous: 上一次快照的索引记录，提供时未变化的文件直接引用上一次快照的数据
+        options: 格式相关的选项，如块级增量的 keyframe_interval、block_size，
+            压缩归档的 archive_type
+        progress: 进度回调 progress(已完成数量, 总数量)，抛出异常（如任务被取消）时
+            会删除未完成的快照
+        consistency: 一致性模式的设置（见 DEFAULT_CONSISTENCY），None 时不检查。
+            启用时 scan 会被更新为快照实际对应的扫描结果
+
+    返回需要合并到备份记录中的信息
+    """
+    options = dict(options or {})
+    # 复制线程数对所有格式通用，其余选项按格式传递
+    workers = options.pop("workers", DEFAULT_WORKERS)
+    if consistency is not None and scan is None:
+        scan = scan_source(source_path, is_directory)
+    # 完整复制会逐个写入文件，启用暂存时先写入临时路径，完成后一次重命名；其他格式本身就是原子写入的
+    staging = consistency is not None and consistency.get("staging") and fmt == FORMAT_COPY
+    target_path = backup_path + ".partial" if staging else backup_path
+    try:
+        if staging and os.path.lexists(target_path):
+            # 上次中途崩溃留下的暂存
+            _remove_path(target_path, os.path.isdir(target_path))
+        if consistency is not None:
+            stats = _write_until_complete(source_path, target_path, is_directory, fmt, scan, previous, options,
+                                          workers, progress, consistency)
+        else:
+            stats = _write_snapshot(source_path, target_path, is_directory, fmt, scan, previous, options, workers,
+                                    progress)
+        if consistency is not None:
+            stats["consistency"] = _settle_snapshot(source_path, target_path, is_directory, fmt, scan, stats,
+                                                    consistency, lambda new_scan: _write_snapshot(
+                                                        source_path, target_path, is_directory, fmt, new_scan,
+                                                        previous, options, workers, progress))
+        if staging:
+            os.rename(target_path, backup_path)
+    except BaseException:
+        # 去重存储中途失败时只会留下未被引用的对象，不影响已有快照
+        for path in {target_path, backup_path}:
+            if os.path.lexists(path):
+                _remove_path(path, os.path.isdir(path))
+        stat_cache.invalidate(backup_path)
+        raise
+    stat_cache.set(backup_path, True)
+    info = {"format": fmt}
+    info.update(stats)
+    _ledger_add(backup_path, info)
+    return info
+
+
+def move_into_snapshot(source_path, backup_path, scan):
+    """把源文件或文件夹直接重命名为完整复制格式的快照，不复制任何数据
+
+    用于完整还原前的备份：源反正要被删除后重新还原，移入备份目录后正好是还原前状态的快照。
+    源与备份目录不在同一个文件系统、或文件正被占用（Windows）时抛出 OSError，源保持不变。
+
+    参数:
+        scan: 移动前源的扫描结果（见 asbt.scan.scan_source）
+
+    返回需要合并到备份记录中的信息（与 create_snapshot 相同）
+    """
+    os.rename(source_path, backup_path)
+    stat_cache.set(backup_path, True)
+    info = {
+        "format": FORMAT_COPY,
+        "file_count": len(scan["files"]),
+        "total_bytes": sum(record[0] for record in scan["files"].values()),
+        "copy_strategy": STRATEGY_RENAME,
+        "copy_methods": {STRATEGY_RENAME: len(scan["files"])},
+    }
+    _ledger_add(backup_path, info)
+    return info
+
+
+def _write_snapshot(source_path, backup_path, is_directory, fmt, scan, previous, options, workers, progress):
+    """按格式写入快照，返回统计信息"""
+    if fmt == FORMAT_DELTA:
+        return create_delta(source_path, backup_path,
+                            previous["snapshot"]["backup_path"] if previous else None,
+                            progress=progress, **options)
+    if fmt == FORMAT_ARCHIVE:
+        return create_archive(source_path, backup_path, is_directory, options.get("archive_type", "tar.gz"),
+                              total=len(scan["files"]) if scan else 0, progress=progress)
+    if fmt == FORMAT_MANIFEST:
+        return _create_manifest(source_path, backup_path, is_directory, scan, previous, workers, progress)
+    # 按备份目录所在文件系统选择开销最小的复制方式（reflink / copy_file_range / 普通复制）
+    copier = create_copier(_backup_dir_of(backup_path))
+    if is_directory:
+        stats = _create_copy(source_path, backup_path, scan, previous, workers, copier, progress)
+    else:
+        # 单个文件按块报告进度，自动备份的限速（见 asbt.throttle）对它同样有效
+        copier.copy(source_path, backup_path, progress)
+        stats = {}
+    stats["copy_strategy"] = copier.strategy
+    stats["copy_methods"] = dict(copier.counts)
+    return stats
+
+
+def _write_until_complete(source_path, target_path, is_directory, fmt, scan, previous, options, workers,
+                          progress, consistency):
+    """一致性模式下写入快照，复制期间有文件或文件夹被删除（如存档正在替换）时等待后重新扫描并整个重写"""
+    settings = dict(DEFAULT_CONSISTENCY, **consistency)
+    attempt = 0
+    while True:
+        try:
+            return _write_snapshot(source_path, target_path, is_directory, fmt, scan, previous, options, workers,
+                                   progress)
+        except FileNotFoundError:
+            attempt += 1
+            if attempt > settings["max_retries"] or not os.path.exists(source_path):
+                raise
+        if os.path.lexists(target_path):
+            _remove_path(target_path, os.path.isdir(target_path))
+        time.sleep(settings["wait_seconds"])
+        rescan = scan_source(source_path, is_directory)
+        scan["files"] = rescan["files"]
+        scan["dirs"] = rescan["dirs"]
+
+
+# 一致性模式的默认设置
+DEFAULT_CONSISTENCY = {
+    "enabled": False,
+    "max_retries": 3,  # 最多重试几轮，仍在变化时保留最后一次的结果并标记为不一致
+    "wait_seconds": 1,  # 发现变化后等待多久再重试，让正在写入的程序写完
+    "staging": True,  # 完整复制时先写入临时文件夹，完成后再重命名
+}
+
+
+def _changed_files(old_scan, new_scan):
+    """两次扫描之间大小、修改时间或 inode 变化的文件（包括新增和删除的），返回相对路径集合"""
+    old_files = old_scan["files"]
+    new_files = new_scan["files"]
+    changed = {rel_path for rel_path, record in new_files.items() if old_files.get(rel_path) != record}
+    changed.update(rel_path for rel_path in old_files if rel_path not in new_files)
+    return changed
+
+
+def _settle_snapshot(source_path, target_path, is_directory, fmt, scan, stats, consistency, rewrite):
+    """快照写完后重新扫描源，复制期间有变化的文件重新写入，直到两次扫描一致
+
+    完整复制的文件夹和去重存储只重写变化的文件，其他格式（单个文件、压缩归档、块级增量）整个重写。
+    scan 和 stats 会被原地更新为最终结果。
+
+    返回 {"rounds": 检查次数, "retried": 重写的文件数, "stable": 最后一次检查时是否已不再变化}
+    """
+    settings = dict(DEFAULT_CONSISTENCY, **consistency)
+    retried = 0
+    rounds = 0
+    while True:
+        rounds += 1
+        rescan = scan_source(source_path, is_directory)
+        changed = _changed_files(scan, rescan)
+        if not changed and rescan["dirs"] == scan["dirs"]:
+            return {"rounds": rounds, "retried": retried, "stable": True}
+        if rounds > settings["max_retries"]:
+            return {"rounds": rounds, "retried": retried, "stable": False}
+        # 等正在写入的程序写完，再以等待后的状态为准
+        time.sleep(settings["wait_seconds"])
+        rescan = scan_source(source_path, is_directory)
+        changed = _changed_files(scan, rescan)
+        if is_directory and fmt == FORMAT_COPY:
+            _patch_copy(source_path, target_path, scan, rescan, changed)
+            stats["file_count"] = len(rescan["files"])
+            stats["total_bytes"] = sum(record[0] for record in rescan["files"].values())
+        elif fmt == FORMAT_MANIFEST:
+            stats.update(_patch_manifest(source_path, target_path, is_directory, rescan, changed,
+                                         stats.get("stored_bytes", 0)))
+        else:
+            new_stats = rewrite(rescan)
+            for key in ("copied", "reused"):
+                if key in stats:
+                    new_stats[key] = stats[key]
+            stats.update(new_stats)
+        retried += len(changed)
+        scan["files"] = rescan["files"]
+        scan["dirs"] = rescan["dirs"]
+
+
+def _patch_copy(source_path, target_path, scan, rescan, changed):
+    """在完整复制的文件夹快照中重新复制变化的文件"""
+    for rel_dir in rescan["dirs"]:
+        os.makedirs(os.path.join(target_path, *rel_dir.split("/")), exist_ok=True)
+    copier = create_copier(_backup_dir_of(target_path))
+    for rel_path in sorted(changed):
+        target = os.path.join(target_path, *rel_path.split("/"))
+        # 先删除再复制：未变化的文件可能硬链接到上一次快照，直接覆盖会改坏上一次快照
+        if os.path.lexists(target):
+            os.remove(target)
+        if rel_path in rescan["files"]:
+            copier.copy(os.path.join(source_path, *rel_path.split("/")), target)
+    # 从深到浅删除源中已不存在的文件夹
+    removed_dirs = set(scan["dirs"]) - set(rescan["dirs"])
+    for rel_dir in sorted(removed_dirs, reverse=True):
+        shutil.rmtree(os.path.join(target_path, *rel_dir.split("/")), ignore_errors=True)
+
+
+def _patch_manifest(source_path, backup_path, is_directory, rescan, changed, stored_bytes):
+    """在去重存储的清单中重新写入变化的文件，返回更新后的统计信息"""
+    store = get_store(_backup_dir_of(backup_path))
+    manifest = load_manifest(backup_path)
+    entries = {entry["path"]: entry for entry in manifest["files"]}
+    added_refs = []
+    released_refs = []
+    for rel_path in changed:
+        old_entry = entries.pop(rel_path, None)
+        if old_entry is not None:
+            released_refs.append(old_entry["object"])
+        if rel_path in rescan["files"]:
+            file_path = os.path.join(source_path, *rel_path.split("/")) if is_directory else source_path
+            entry = _file_entry(file_path, rel_path)
+            entry["object"], entry["size"], written = store.put_file(file_path)
+            stored_bytes += written
+            entries[rel_path] = entry
+            added_refs.append(entry["object"])
+    manifest["dirs"] = list(rescan["dirs"])
+    manifest["files"] = [entries[rel_path] for rel_path in sorted(entries)]
+    # 与创建时相同：先登记新引用，写入清单后再释放旧引用
+    store.add_refs(added_refs)
+    _write_json_atomic(backup_path, manifest)
+    store.release_refs(released_refs)
+    return {
+        "file_count": len(manifest["files"]),
+        "total_bytes": sum(entry["size"] for entry in manifest["files"]),
+        "stored_bytes": stored_bytes,
+    }
+
+
+def _ledger_add(backup_path, info):
+    """把新快照计入备份目录的大小台账"""
+    ledger = get_ledger(_backup_dir_of(backup_path))
+    if ledger.get() is None:
+        return
+    measured = measure_path(backup_path)
+    stored = measured["bytes"]
+    if info["format"] == FORMAT_MANIFEST:
+        # 清单之外，新写入对象仓库的数据也占用空间
+        stored += info.get("stored_bytes", 0)
+    ledger.adjust(files=measured["files"], dirs=measured["dirs"], bytes=stored,
+                  content_bytes=info.get("total_bytes", measured["bytes"]))
+
+
+def _ledger_remove(ledger, backup_info, measured, freed):
+    """从备份目录的大小台账中减去已删除的快照"""
+    fmt = get_format(backup_info)
+    if fmt in (FORMAT_DELTA, FORMAT_ARCHIVE):
+        # 块级增量删除时会把数据块合并到后续快照，实际释放的空间以 freed 为准
+        removed = freed
+    elif fmt == FORMAT_MANIFEST:
+        removed = measured["bytes"] + freed
+    else:
+        removed = measured["bytes"]
+    ledger.adjust(files=-measured["files"], dirs=-measured["dirs"], bytes=-removed,
+                  content_bytes=-backup_info.get("total_bytes", measured["bytes"]))
+
+
+def _create_copy(source_path, backup_path, scan, previous, workers, copier, progress=None):
+    """并行复制文件夹；有上一次快照时，未变化的文件硬链接到上一次快照，只复制有变化的文件"""
+    reuse = {}
+    if scan is not None and previous is not None:
+        previous_path = previous["snapshot"]["backup_path"]
+        previous_files = previous["files"]
+        for rel_path, record in scan["files"].items():
+            if previous_files.get(rel_path) == record:
+                reuse[rel_path] = os.path.join(previous_path, *rel_path.split("/"))
+
+    result = copy_tree(source_path, backup_path, workers, scan=scan, reuse=reuse, copier=copier, progress=progress)
+    stats = {
+        "file_count": result["copied"] + result["reused"],
+        "total_bytes": result["bytes"],
+    }
+    if scan is not None:
+        stats["copied"] = result["copied"]
+        stats["reused"] = result["reused"]
+    return stats
+
+
+def _file_entry(path, rel_path):
+    st = os.stat(path)
+    return {
+        "path": rel_path,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "mode": st.st_mode & 0o7777,
+    }
+
+
+def _create_manifest(source_path, backup_path, is_directory, scan=None, previous=None, workers=1, progress=None):
+    store = get_store(_backup_dir_of(backup_path))
+    incremental = scan is not None
+    if scan is None:
+        scan = scan_source(source_path, is_directory)
+
+    # 有上一次快照时，未变化的文件直接沿用上一次清单中的对象，不再读取内容
+    known = {}
+    if previous is not None:
+        previous_manifest = load_manifest(previous["snapshot"]["backup_path"])
+        for entry in previous_manifest["files"]:
+            if previous["files"].get(entry["path"]) == scan["files"].get(entry["path"]):
+                known[entry["path"]] = entry["object"]
+
+    counter = ProgressCounter(len(scan["files"]), progress)
+
+    def store_one(rel_path):
+        if is_directory:
+            file_path = os.path.join(source_path, *rel_path.split("/"))
+        else:
+            file_path = source_path
+        entry = _file_entry(file_path, rel_path)
+        digest = known.get(rel_path)
+        if digest is not None and store.has_object(digest):
+            entry["object"] = digest
+            counter.step()
+            return entry, 0, True
+        entry["object"], entry["size"], written = store.put_file(file_path)
+        counter.step()
+        return entry, written, False
+
+    # 多个文件并行读取、计算哈希并写入仓库
+    results = run_parallel(store_one, scan["files"], workers)
+    files = [entry for entry, _, _ in results]
+    stored_bytes = sum(written for _, written, _ in results)
+    reused = sum(1 for _, _, was_reused in results if was_reused)
+
+    manifest = {
+        "version": 1,
+        "type": "directory" if is_directory else "file",
+        "dirs": list(scan["dirs"]),
+        "files": files,
+    }
+    # 先登记引用再写清单：中途失败只会留下多余对象，不会出现清单引用了被回收的对象
+    store.add_refs([entry["object"] for entry in files])
+    _write_json_atomic(backup_path, manifest)
+
+    stats = {
+        "file_count": len(files),
+        "total_bytes": sum(entry["size"] for entry in files),
+        "stored_bytes": stored_bytes,
+    }
+    if incremental:
+        stats["copied"] = len(files) - reused
+        stats["reused"] = reused
+    return stats
+
+
+def snapshot_exists(backup_info, cached=False):
+    """检查快照是否仍然存在
+
+    参数:
+        cached: 为 True 时使用路径存在性缓存（见 asbt.statcache），用于刷新列表等
+            不要求实时结果的场合；还原、删除前的检查应使用默认值
+    """
+    if cached:
+        return stat_cache.exists(backup_info["backup_path"])
+    return os.path.exists(backup_info["backup_path"])
+
+
+def restore_snapshot(backup_info, target_path, workers=DEFAULT_WORKERS, progress=None):
+    """把快照还原到目标路径，目标路径已存在时先删除
+
+    参数:
+        workers: 文件夹快照并行复制的线程数
+        progress: 进度回调 progress(已完成数量, 总数量)
+
+    返回 {"files": 还原的文件数, "bytes": 还原的字节数}，用于计算吞吐量
+    """
+    is_directory = backup_info.get("is_directory", False)
+    backup_path = backup_info["backup_path"]
+
+    if os.path.exists(target_path):
+        _remove_path(target_path, is_directory)
+
+    fmt = get_format(backup_info)
+    if fmt == FORMAT_MANIFEST:
+        return _restore_manifest(backup_path, target_path, workers, progress)
+    if fmt == FORMAT_DELTA:
+        restore_delta(backup_path, target_path, progress)
+    elif fmt == FORMAT_ARCHIVE:
+        restore_archive(backup_path, backup_info["archive_type"], target_path, is_directory,
+                        total=backup_info.get("file_count", 0), progress=progress)
+        if is_directory:
+            return {"files": backup_info.get("file_count", 0), "bytes": backup_info.get("total_bytes", 0)}
+    elif is_directory:
+        result = copy_tree(backup_path, target_path, workers, progress=progress)
+        return {"files": result["copied"], "bytes": result["bytes"]}
+    else:
+        create_copier(os.path.dirname(os.path.abspath(target_path))).copy(backup_path, target_path)
+    return {"files": 1, "bytes": os.path.getsize(target_path)}
+
+
+def _copy_object(store, entry, target_file):
+    with store.open_object(entry["object"]) as src, open(target_file, "wb") as dst:
+        shutil.copyfileobj(src, dst, store.CHUNK_SIZE)
+    if "mode" in entry:
+        os.chmod(target_file, entry["mode"])
+    os.utime(target_file, (entry["mtime"], entry["mtime"]))
+
+
+def _restore_manifest(backup_path, target_path, workers=1, progress=None):
+    manifest = load_manifest(backup_path)
+    store = get_store(_backup_dir_of(backup_path))
+    stats = {"files": len(manifest["files"]), "bytes": sum(entry["size"] for entry in manifest["files"])}
+
+    if manifest["type"] == "file":
+        parent = os.path.dirname(target_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        _copy_object(store, manifest["files"][0], target_path)
+        return stats
+
+    os.makedirs(target_path, exist_ok=True)
+    for rel_dir in manifest["dirs"]:
+        os.makedirs(os.path.join(target_path, *rel_dir.split("/")), exist_ok=True)
+    counter = ProgressCounter(len(manifest["files"]), progress)
+
+    def restore_one(entry):
+        _copy_object(store, entry, os.path.join(target_path, *entry["path"].split("/")))
+        counter.step()
+
+    run_parallel(restore_one, manifest["files"], workers)
+    return stats
+
+
+def delete_snapshot(backup_info):
+    """删除快照，返回释放的字节数（去重存储和块级增量时统计）"""
+    backup_path = backup_info["backup_path"]
+    # 台账存在时先统计快照的大小，删除后从台账中减去
+    ledger = get_ledger(_backup_dir_of(backup_path))
+    measured = measure_path(backup_path) if ledger.get() is not None else None
+    try:
+        freed = _delete_snapshot_data(backup_info)
+    except BaseException:
+        # 删除了一部分，下次检查时重新 stat
+        stat_cache.invalidate(backup_path)
+        raise
+    stat_cache.set(backup_path, False)
+    if os.path.exists(integrity_path(backup_path)):
+        os.remove(integrity_path(backup_path))
+    if measured is not None and (measured["files"] or measured["dirs"]):
+        _ledger_remove(ledger, backup_info, measured, freed)
+    return freed
+
+
+def _delete_snapshot_data(backup_info):
+    backup_path = backup_info["backup_path"]
+    if not os.path.exists(backup_path):
+        return 0
+
+    if get_format(backup_info) == FORMAT_DELTA:
+        # 后续快照依赖它时会先合并数据块，保证仍可还原
+        return delete_delta(backup_path)
+
+    if get_format(backup_info) == FORMAT_MANIFEST:
+        manifest = load_manifest(backup_path)
+        os.remove(backup_path)
+        store = get_store(_backup_dir_of(backup_path))
+        return store.release_refs([entry["object"] for entry in manifest["files"]])
+
+    if get_format(backup_info) == FORMAT_ARCHIVE:
+        freed = os.path.getsize(backup_path)
+        os.remove(backup_path)
+        return freed
+
+    _remove_path(backup_path, backup_info.get("is_directory", False))
+    return 0
+
+
+def snapshot_file_openers(backup_info):
+    """可以随机读取的快照（完整复制、去重存储）返回 {相对路径: (数据标识, 打开函数)}，其他格式返回 None
+
+    数据标识相同的文件内容一定相同（同一个对象，或硬链接到同一个 inode），校验时只需读取一次。
+    单个文件的快照以源文件名作为相对路径，与 asbt.scan.scan_source 一致。
+    """
+    backup_path = backup_info["backup_path"]
+    fmt = get_format(backup_info)
+    if fmt == FORMAT_MANIFEST:
+        manifest = load_manifest(backup_path)
+        store = get_store(_backup_dir_of(backup_path))
+        return {entry["path"]: (("object", entry["object"]),
+                                lambda digest=entry["object"]: store.open_object(digest))
+                for entry in manifest["files"]}
+    if fmt != FORMAT_COPY:
+        return None
+    if not backup_info.get("is_directory", False):
+        st = os.stat(backup_path)
+        return {os.path.basename(backup_info["original"]): (("inode", st.st_dev, st.st_ino),
+                                                            lambda: open(backup_path, "rb"))}
+    openers = {}
+    stack = [("", backup_path)]
+    while stack:
+        rel_root, root = stack.pop()
+        with os.scandir(root) as entries:
+            for entry in entries:
+                rel_path = f"{rel_root}/{entry.name}" if rel_root else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((rel_path, entry.path))
+                elif entry.is_file():
+                    st = entry.stat()
+                    openers[rel_path] = (("inode", st.st_dev, st.st_ino), lambda path=entry.path: open(path, "rb"))
+    return openers
+
+
+def iter_snapshot_streams(backup_info, chunk_size=1024 * 1024):
+    """按顺序流式读取只能顺序访问的快照（压缩归档、块级增量），返回 (相对路径, 数据块迭代器)"""
+    backup_path = backup_info["backup_path"]
+    if get_format(backup_info) == FORMAT_DELTA:
+        yield os.path.basename(backup_info["original"]), iter_blocks(backup_path)
+        return
+    for name, chunks in iter_archive_files(backup_path, backup_info["archive_type"], chunk_size):
+        yield name, chunks
+
+
+def snapshot_content_size(backup_info):
+    """快照内容的原始大小（字节），无法确定时返回 None
+
+    优先使用备份记录中的 total_bytes；压缩归档缺少记录时直接读取归档成员头部
+    """
+    if "total_bytes" in backup_info:
+        return backup_info["total_bytes"]
+    if get_format(backup_info) == FORMAT_ARCHIVE and snapshot_exists(backup_info):
+        try:
+            return sum(size for _, is_dir, size, _ in iter_members(backup_info["backup_path"],
+                                                                 backup_info["archive_type"]) if not is_dir)
+        except Exception:
+            return None
+    return None
+
+
+def list_snapshot_dir(backup_info):
+    """列出文件夹快照第一层的内容，返回 [(名称, 是否为目录)]"""
+    backup_path = backup_info["backup_path"]
+    if get_format(backup_info) == FORMAT_MANIFEST:
+        manifest = load_manifest(backup_path)
+        items = {}
+        for rel_dir in manifest["dirs"]:
+            items[rel_dir.split("/")[0]] = True
+        for entry in manifest["files"]:
+            parts = entry["path"].split("/")
+            items.setdefault(parts[0], len(parts) > 1)
+        return sorted(items.items())
+
+    if get_format(backup_info) == FORMAT_ARCHIVE:
+        return list_archive_dir(backup_path, backup_info["archive_type"])
+
+    return [(item, os.path.isdir(os.path.join(backup_path, item)))
+            for item in os.listdir(backup_path)]
+
+
+def read_snapshot_text(backup_info, limit=2000):
+    """读取单文件快照的开头部分用于预览"""
+    backup_path = backup_info["backup_path"]
+    if get_format(backup_info) == FORMAT_MANIFEST:
+        manifest = load_manifest(backup_path)
+        store = get_store(_backup_dir_of(backup_path))
+        with store.open_object(manifest["files"][0]["object"]) as f:
+            # 按 UTF-8 最长 4 字节读取，再截取字符数
+            return f.read(limit * 4).decode("utf-8", errors="ignore")[:limit]
+
+    if get_format(backup_info) == FORMAT_DELTA:
+        data = b"".join(iter_blocks(backup_path, limit * 4))
+        return data.decode("utf-8", errors="ignore")[:limit]
+
+    if get_format(backup_info) == FORMAT_ARCHIVE:
+        return read_archive_text(backup_path, backup_info["archive_type"], limit)
+
+    with open(backup_path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read(limit)
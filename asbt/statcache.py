@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+
+
+class StatCache:
+    """路径存在性缓存
+
+    界面刷新备份列表和历史备份目录列表时，每条记录都要检查路径是否存在，
+    备份目录在网络共享或慢速 U 盘上时这些 stat 是界面卡顿的主要原因。
+    缓存的结果在 ttl 秒内直接使用；本程序自己创建或删除快照时直接更新缓存（见 set），
+    外部的修改由过期后重新检查或后台校验线程发现。
+    """
+
+    DEFAULT_TTL = 30
+    # 后台校验时每检查一个路径后暂停的时间（秒），避免占满慢速磁盘
+    VALIDATE_PAUSE = 0.01
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._entries = {}  # 路径 -> (是否存在, 检查时间)
+        self._lock = threading.Lock()
+        self._validator = None
+        self._stop_event = threading.Event()
+
+    def exists(self, path):
+        """路径是否存在，缓存过期或没有缓存时重新检查"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+        exists = os.path.exists(path)
+        self.set(path, exists)
+        return exists
+
+    def set(self, path, exists):
+        """直接记录路径是否存在（本程序自己创建或删除路径后调用）"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[path] = (exists, time.monotonic())
+
+    def invalidate(self, path=None):
+        """删除路径的缓存，path 为 None 时清空全部缓存"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def invalidate_tree(self, directory):
+        """删除目录本身及其下所有路径的缓存"""
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for path in [p for p in self._entries if p == directory or p.startswith(prefix)]:
+                del self._entries[path]
+
+    def validate(self, stop_event=None):
+        """重新检查所有已缓存的路径，返回结果发生变化的路径列表"""
+        with self._lock:
+            paths = list(self._entries)
+        changed = []
+        for path in paths:
+            if stop_event is not None and stop_event.is_set():
+                break
+            exists = os.path.exists(path)
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is None:
+                    # 检查期间已被清除
+                    continue
+                if entry[0] != exists:
+                    changed.append(path)
+                self._entries[path] = (exists, time.monotonic())
+            time.sleep(self.VALIDATE_PAUSE)
+        return changed
+
+    def start_validator(self, interval=None, on_change=None):
+        """启动后台校验线程，每隔 interval 秒（默认为 ttl 的一半）校验一次
+
+        参数:
+            on_change: 有路径变化时在校验线程中调用 on_change(changed_paths)
+        """
+        if self._validator is not None and self._validator.is_alive():
+            return
+        if interval is None:
+            interval = max(1, self.ttl / 2)
+        self._stop_event = threading.Event()
+        stop_event = self._stop_event
+
+        def run():
+            while not stop_event.wait(interval):
+                changed = self.validate(stop_event)
+                if changed and on_change is not None and not stop_event.is_set():
+                    on_change(changed)
+
+        self._validator = threading.Thread(target=run, daemon=True)
+        self._validator.start()
+
+    def stop_validator(self):
+        self._stop_event.set()
+        self._validator = None
+
+
+# 整个程序共用的缓存，快照的创建和删除会直接更新它
+stat_cache = StatCache()
@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import threading
+
+
+class ObjectStore:
+    """内容寻址的对象仓库
+
+    文件内容按哈希值存放在备份目录下的 .objects 文件夹中，内容相同的文件只保存一份，
+    多个快照通过清单(manifest)引用同一个对象。refs.json 记录每个对象被引用的次数，
+    引用数归零时对象才会被删除。
+    """
+
+    DIR_NAME = ".objects"
+    HASH_NAME = "sha256"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, backup_dir):
+        self.root = os.path.join(backup_dir, self.DIR_NAME)
+        self.refs_file = os.path.join(self.root, "refs.json")
+        self._refs = None
+        self._lock = threading.RLock()
+
+    def object_path(self, digest):
+        """返回对象在仓库中的路径"""
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def has_object(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def hash_file(self, path):
+        """计算文件内容的哈希值"""
+        h = hashlib.new(self.HASH_NAME)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.hexdigest()
+
+    def put_file(self, path, digest=None):
+        """把文件存入仓库
+
+        参数:
+            path: 要保存的文件路径
+            digest: 已知的哈希值（可选），仓库中已有该对象时不再读取文件
+
+        返回 (digest, size, stored_bytes)，stored_bytes 为本次实际写入的字节数
+        """
+        if digest is None:
+            digest = self.hash_file(path)
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            return digest, os.path.getsize(object_path), 0
+
+        # 边复制边计算哈希，防止文件在两次读取之间被修改导致内容与哈希不符
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"tmp_{threading.get_ident()}_{os.getpid()}")
+        h = hashlib.new(self.HASH_NAME)
+        size = 0
+        try:
+            with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                while True:
+                    chunk = src.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    dst.write(chunk)
+                    size += len(chunk)
+            actual = h.hexdigest()
+            object_path = self.object_path(actual)
+            if os.path.exists(object_path):
+                os.remove(tmp_path)
+                return actual, size, 0
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+            return actual, size, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_bytes(self, data):
+        """把一段数据存入仓库，返回 (digest, stored_bytes)"""
+        digest = hashlib.new(self.HASH_NAME, data).hexdigest()
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            return digest, 0
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.tmp_{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, object_path)
+        return digest, len(data)
+
+    def open_object(self, digest):
+        return open(self.object_path(digest), "rb")
+
+    def _load_refs(self):
+        if self._refs is None:
+            self._refs = {}
+            if os.path.exists(self.refs_file):
+                with open(self.refs_file, "r", encoding="utf-8") as f:
+                    self._refs = json.load(f)
+        return self._refs
+
+    def _save_refs(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.refs_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._refs, f)
+        os.replace(tmp_path, self.refs_file)
+
+    def add_refs(self, digests):
+        """增加对象引用计数（在写入清单之前调用，中途失败只会多占空间而不会丢数据）"""
+        with self._lock:
+            refs = self._load_refs()
+            for digest in digests:
+                refs[digest] = refs.get(digest, 0) + 1
+            self._save_refs()
+
+    def release_refs(self, digests):
+        """减少对象引用计数，删除不再被引用的对象
+
+        返回释放的字节数
+        """
+        freed = 0
+        with self._lock:
+            refs = self._load_refs()
+            for digest in digests:
+                count = refs.get(digest, 0) - 1
+                if count > 0:
+                    refs[digest] = count
+                    continue
+                refs.pop(digest, None)
+                object_path = self.object_path(digest)
+                if os.path.exists(object_path):
+                    freed += os.path.getsize(object_path)
+                    os.remove(object_path)
+            self._save_refs()
+        return freed
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(backup_dir):
+    """获取备份目录对应的对象仓库，同一目录共用一个实例以保证引用计数一致"""
+    key = os.path.normcase(os.path.abspath(backup_dir))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ObjectStore(backup_dir)
+            _stores[key] = store
+        return store
@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import ctypes
+import platform
+import threading
+
+
+# 默认限速设置：只对自动备份（定时、文件变化和备份任务）生效，手动备份总是全速执行
+DEFAULT_THROTTLE = {
+    "enabled": False,
+    "mb_per_sec": 20,  # 每秒最多读写的数据量（MB），0 表示不限制
+    "files_per_sec": 0,  # 每秒最多处理的文件数，0 表示不限制
+    "low_priority": True,  # 降低自动备份线程的 CPU 和磁盘 I/O 优先级
+    "pause_load": 0,  # 每个 CPU 的平均负载超过该值时暂停备份，0 表示不暂停（只支持 Linux 和 macOS）
+}
+
+# 负载较高时每隔多少秒重新检查一次
+PAUSE_CHECK_SECONDS = 5
+
+# ioprio_set 的系统调用号，见 linux/ioprio.h
+_IOPRIO_SYSCALLS = {
+    "x86_64": 251,
+    "amd64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "arm64": 30,
+    "armv7l": 314,
+}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def normalize_throttle(throttle):
+    """补全限速设置中缺少的字段"""
+    merged = dict(DEFAULT_THROTTLE)
+    if throttle:
+        merged.update(throttle)
+    return merged
+
+
+def lower_priority():
+    """降低当前线程的 CPU 优先级（nice 10）和磁盘 I/O 优先级（idle），返回实际生效的项目列表
+
+    Linux 上 nice 和 ioprio 都是按线程设置的，之后由该线程创建的复制线程会继承，
+    界面线程不受影响；普通用户降低后无法再恢复，所以只在专门执行自动备份的线程中调用。
+    其他系统上不支持的项目直接跳过。
+    """
+    applied = []
+    if hasattr(os, "nice"):
+        try:
+            if os.nice(0) < 10:
+                os.nice(10 - os.nice(0))
+            applied.append("nice")
+        except OSError:
+            pass
+    syscall_number = _IOPRIO_SYSCALLS.get(platform.machine().lower())
+    if sys.platform.startswith("linux") and syscall_number is not None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            # who 为 0 表示调用的线程
+            if libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, 0,
+                            _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) == 0:
+                applied.append("ioprio")
+        except (OSError, AttributeError):
+            pass
+    return applied
+
+
+def system_load():
+    """每个 CPU 的 1 分钟平均负载，不支持时返回 None"""
+    if not hasattr(os, "getloadavg"):
+        return None
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return None
+
+
+class Throttle:
+    """按进度回调给快照限速
+
+    所有快照格式都会在每完成一个文件（块级增量为每个数据块，单个文件的完整复制为每 1 MB）后调用进度回调，
+    限速器在回调中按已完成的比例估算已处理的数据量和文件数，超过限速时等待，
+    因此不需要修改各种格式的复制代码。
+
+    参数:
+        mb_per_sec: 每秒最多处理的数据量（MB），0 表示不限制
+        files_per_sec: 每秒最多处理的文件数，0 表示不限制
+        pause_load: 每个 CPU 的平均负载超过该值时暂停，0 表示不暂停
+        should_release: should_release() 返回 True 时（如停止自动备份）不再等待，全速完成本次备份
+        on_pause: on_pause(load)，因负载较高开始暂停时调用
+    """
+
+    def __init__(self, mb_per_sec=0, files_per_sec=0, pause_load=0, should_release=None, on_pause=None):
+        self.bytes_per_sec = float(mb_per_sec) * 1024 * 1024
+        self.files_per_sec = float(files_per_sec)
+        self.pause_load = float(pause_load)
+        self.should_release = should_release
+        self.on_pause = on_pause
+        self.paused_seconds = 0
+        self._lock = threading.Lock()
+        self._last_load_check = 0
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    @classmethod
+    def from_settings(cls, settings, should_release=None, on_pause=None):
+        """按限速设置（见 DEFAULT_THROTTLE）创建限速器，未启用时返回 None"""
+        settings = normalize_throttle(settings)
+        if not settings["enabled"]:
+            return None
+        return cls(settings["mb_per_sec"], settings["files_per_sec"], settings["pause_load"],
+                   should_release, on_pause)
+
+    def _released(self):
+        return self.should_release is not None and self.should_release()
+
+    def _sleep(self, seconds):
+        # 分段等待，停止自动备份后尽快返回
+        deadline = time.monotonic() + seconds
+        while not self._released():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.5, remaining))
+
+    def _wait_for_load(self):
+        """系统负载较高时暂停，所有复制线程一起等待"""
+        if self.pause_load <= 0:
+            return
+        if not self._resumed.is_set():
+            # 其他线程正在暂停中，一起等待
+            while not self._resumed.wait(0.5) and not self._released():
+                pass
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_load_check < PAUSE_CHECK_SECONDS or not self._resumed.is_set():
+                return
+            self._last_load_check = now
+            load = system_load()
+            if load is None or load < self.pause_load:
+                return
+            self._resumed.clear()
+        if self.on_pause is not None:
+            self.on_pause(load)
+        start = time.monotonic()
+        try:
+            while not self._released():
+                self._sleep(PAUSE_CHECK_SECONDS)
+                load = system_load()
+                if load is None or load < self.pause_load:
+                    break
+        finally:
+            with self._lock:
+                self.paused_seconds += time.monotonic() - start
+                self._last_load_check = time.monotonic()
+            self._resumed.set()
+
+    def wrap(self, progress, file_count, total_bytes):
+        """返回限速的进度回调
+
+        参数:
+            progress: 原来的进度回调，可以为 None
+            file_count: 本次快照要处理的文件数
+            total_bytes: 本次快照要读写的数据量
+        """
+        start = time.monotonic()
+        # 暂停的时间不计入限速，恢复后不会突然全速追赶
+        paused_before = self.paused_seconds
+
+        def callback(done, total):
+            if progress is not None:
+                progress(done, total)
+            if self._released():
+                return
+            self._wait_for_load()
+            fraction = min(1.0, done / total) if total else 0
+            target = 0
+            if self.bytes_per_sec > 0:
+                target = max(target, fraction * total_bytes / self.bytes_per_sec)
+            if self.files_per_sec > 0:
+                target = max(target, fraction * file_count / self.files_per_sec)
+            delay = start + (self.paused_seconds - paused_before) + target - time.monotonic()
+            if delay > 0:
+                self._sleep(delay)
+
+        return callback
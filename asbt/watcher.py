@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from asbt.scan import scan_source
+
+
+# inotify 事件掩码（见 linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class InotifyWatcher:
+    """基于 Linux inotify 的文件变化监听
+
+    文件夹会递归添加监听，新建的子文件夹自动加入；单个文件监听其所在目录，
+    这样游戏用"写临时文件再重命名"的方式保存时也能收到事件。
+    监听的根目录被删除或移走后，每隔 poll_interval 秒检查它是否重新出现，出现后重新添加监听。
+    """
+
+    def __init__(self, path, is_directory, libc, poll_interval=2, notify=None):
+        self.libc = libc
+        self.is_directory = is_directory
+        self.file_name = None if is_directory else os.path.basename(path)
+        self.root = os.path.abspath(path) if is_directory else os.path.dirname(os.path.abspath(path))
+        self.poll_interval = poll_interval
+        self.notify = notify  # 根目录丢失和恢复监听时调用，参数为状态文本
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches = {}
+        self.root_wd = None
+        self._add_root()
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+        return wd
+
+    def _add_root(self):
+        """添加根目录（及文件夹模式下其中所有子文件夹）的监听，根目录不存在时返回 False"""
+        wd = self._add_watch(self.root)
+        if wd < 0:
+            return False
+        self.root_wd = wd
+        if self.is_directory:
+            self._add_tree(self.root)
+        return True
+
+    def _lose_root(self):
+        """根目录被删除或移走：移除剩余的监听，之后轮询等待根目录重新出现"""
+        for wd in list(self.watches):
+            # 已被内核移除的监听会返回错误，忽略
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches.clear()
+        self.root_wd = None
+        if self.notify:
+            self.notify(f"监听的文件夹已被删除或移动，等待其重新出现: {self.root}")
+
+    def _wait_for_root(self, timeout):
+        """根目录丢失时轮询等待其重新出现，重新添加监听后返回 True（其中的内容视为已变化）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if os.path.isdir(self.root) and self._add_root():
+                if self.notify:
+                    self.notify(f"已恢复监听: {self.root}")
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def _add_tree(self, directory):
+        self._add_watch(directory)
+        for root, dir_names, _ in os.walk(directory):
+            for name in dir_names:
+                self._add_watch(os.path.join(root, name))
+
+    def wait(self, timeout):
+        """等待事件，timeout 秒内收到相关事件返回 True"""
+        if self.root_wd is None:
+            return self._wait_for_root(timeout)
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        changed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                changed = True
+                continue
+            if wd == self.root_wd and mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # 移走的目录仍被监听但路径已经不对，与删除一样处理；根目录消失本身也是一次变化
+                self._lose_root()
+                changed = True
+                break
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if self.file_name is not None and name != self.file_name:
+                continue
+            if self.is_directory and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                parent = self.watches.get(wd)
+                if parent:
+                    self._add_tree(os.path.join(parent, name))
+            changed = True
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """轮询方式的文件变化监听，在不支持 inotify 的系统上代替 InotifyWatcher
+
+    每隔 poll_interval 秒做一次 stat 扫描，与上一次的结果比较
+    """
+
+    def __init__(self, path, is_directory, poll_interval=2):
+        self.path = path
+        self.is_directory = is_directory
+        self.poll_interval = poll_interval
+        self.last_scan = self._scan()
+
+    def _scan(self):
+        try:
+            return scan_source(self.path, self.is_directory)
+        except OSError:
+            return None
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(max(0, min(self.poll_interval, deadline - time.monotonic())))
+            scan = self._scan()
+            if scan != self.last_scan:
+                self.last_scan = scan
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        pass
+
+
+def create_watcher(path, is_directory, notify=None):
+    """创建文件变化监听，优先使用 inotify，不可用时退回轮询
+
+    参数:
+        notify: 监听状态变化（如监听的文件夹被删除）时调用，参数为状态文本
+    """
+    libc = _load_libc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(path, is_directory, libc, notify=notify)
+        except OSError:
+            pass
+    return PollingWatcher(path, is_directory)
+
+
+def wait_for_quiet_change(watcher, quiet_seconds, max_delay, should_stop):
+    """等待源文件发生变化并静默下来
+
+    收到第一个事件后继续等待，直到 quiet_seconds 秒内没有新事件（合并连续写入），
+    但从第一个事件起最多等待 max_delay 秒，避免持续写入时一直不备份。
+
+    参数:
+        watcher: create_watcher 返回的监听对象
+        quiet_seconds: 静默时间（秒）
+        max_delay: 最长等待时间（秒）
+        should_stop: 返回 True 时立即结束等待
+
+    返回 True 表示需要备份，False 表示被 should_stop 中断
+    """
+    # 等待第一个事件，每秒检查一次是否需要停止
+    while not watcher.wait(1):
+        if should_stop():
+            return False
+
+    first_event = time.monotonic()
+    last_event = first_event
+    while True:
+        if should_stop():
+            return False
+        now = time.monotonic()
+        if now - last_event >= quiet_seconds or now - first_event >= max_delay:
+            return True
+        if watcher.wait(min(1, quiet_seconds - (now - last_event))):
+            last_event = time.monotonic()
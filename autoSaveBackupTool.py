@@ -1,17 +1,182 @@
 import os
+import sys
 import shutil
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from datetime import datetime
 import json
-import time
 import threading
 import copy
 
+from asbt.snapshot import (FORMAT_COPY, FORMAT_MANIFEST, FORMAT_DELTA, FORMAT_ARCHIVE, DEFAULT_CONSISTENCY,
+                           snapshot_exists, delete_snapshot, list_snapshot_dir, read_snapshot_text, get_format,
+                           snapshot_content_size)
+from asbt.archive import ARCHIVE_TYPES
+from asbt.engine import (ACTION_NAMES, GLOBAL_CONFIG_FILE, BackupEngine, EngineListener, default_settings,
+                         format_throughput, validate_jobs)
+from asbt.scheduler import create_job_scheduler
+from asbt.jobs import Job, JobExecutor
+from asbt.journal import get_journal
+from asbt.catalog import get_catalog
+from asbt.statcache import StatCache, stat_cache
+from asbt.ledger import get_ledger, scan_directory
+from asbt.store import ObjectStore
+from asbt.index import SourceIndex
+from asbt.retention import normalize_policy
+from asbt.throttle import normalize_throttle
+from asbt.integrity import load_integrity
+from asbt.restore import COMPARE_HASH, COMPARE_MTIME, normalize_restore
+from asbt.profiling import PROFILE_CPU, PROFILE_MEMORY, OperationTimer, format_timing
+from asbt.exporter import create_exporter, normalize_exporter
+
+
+class PagedTree:
+    """分页加载的 Treeview
+
+    只插入第一页，滚动到接近底部时再加载下一页，记录很多时打开列表不需要一次插入全部行；
+    新增的记录直接插入到最前面，删除的记录按标签移除，不需要重建整个列表。
+
+    参数:
+        tree: ttk.Treeview，行的第一个标签为记录的时间戳
+        scrollbar: 纵向滚动条
+        fetch: fetch(offset, limit) 返回从新到旧的记录
+        make_row: make_row(record) 返回 (values, tag)，返回 None 时不显示该记录
+    """
+
+    PAGE_SIZE = 200
+    # 可见区域的末端超过该比例时加载下一页
+    LOAD_THRESHOLD = 0.9
+
+    def __init__(self, tree, scrollbar, fetch, make_row):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch = fetch
+        self.make_row = make_row
+        self.offset = 0  # 已读取的记录数（包括不显示的记录）
+        self.exhausted = False
+        self._loading = False
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # 列表不满一屏时 last 为 1.0，也会继续加载，直到填满或没有更多记录
+        if not self.exhausted and not self._loading and float(last) >= self.LOAD_THRESHOLD:
+            self._loading = True
+            self.tree.after_idle(self._load_next)
+
+    def _load_next(self):
+        self._loading = False
+        if self.tree.winfo_exists():
+            self.load_page()
+
+    def load_page(self):
+        """读取并插入下一页，返回读取的记录数"""
+        records = self.fetch(self.offset, self.PAGE_SIZE)
+        self.offset += len(records)
+        if len(records) < self.PAGE_SIZE:
+            self.exhausted = True
+        for record in records:
+            row = self.make_row(record)
+            if row is not None:
+                self.tree.insert("", tk.END, values=row[0], tags=(row[1],))
+        return len(records)
+
+    def reset(self):
+        """清空列表并重新加载第一页"""
+        self.tree.delete(*self.tree.get_children())
+        self.offset = 0
+        self.exhausted = False
+        self.load_page()
+
+    def prepend(self, record):
+        """在最前面插入一条新记录"""
+        # 新记录排在最前，后面的分页偏移都要加一
+        self.offset += 1
+        row = self.make_row(record)
+        if row is not None:
+            self.tree.insert("", 0, values=row[0], tags=(row[1],))
+
+    def update(self, record):
+        """刷新已显示的记录"""
+        row = self.make_row(record)
+        if row is not None:
+            for item in self.tree.tag_has(row[1]):
+                self.tree.item(item, values=row[0])
+
+    def remove(self, tag):
+        """移除标签为 tag 的行"""
+        items = self.tree.tag_has(tag)
+        if items:
+            self.tree.delete(*items)
+            # 只有已加载的记录才计入了 offset，还没加载到的记录删除后不影响后面的分页
+            self.offset = max(0, self.offset - 1)
+
+
+class TkEngineListener(EngineListener):
+    """把引擎事件切回 Tk 主线程更新界面"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def status(self, text):
+        self.app.root.after(0, lambda: self.app.status_var.set(text))
+
+    def backup_added(self, backup_info):
+        # 只把新备份插入到列表最前面，不重建整个列表
+        self.app.root.after(0, lambda: self.app.backup_list.prepend(backup_info))
+
+    def backups_changed(self):
+        self.app.root.after(0, self.app.update_backup_list)
+
+    def log_added(self, log):
+        self.app.root.after(0, lambda: self.app.refresh_log_row(log, added=True))
+
+    def log_updated(self, log):
+        self.app.root.after(0, lambda: self.app.refresh_log_row(log, added=False))
+
+
+class TkJobListener(EngineListener):
+    """备份任务的引擎事件，只在状态栏显示（任务的备份目录不是界面当前的备份目录）"""
+
+    def __init__(self, app, name):
+        self.app = app
+        self.name = name
+
+    def status(self, text):
+        self.app.root.after(0, lambda: self.app.status_var.set(f"[{self.name}] {text}"))
+
 
 class AutoSaveBackupTool:
     
     VERSION = "v0.6.2"
+    # 日志操作类型的显示名称
+    ACTION_NAMES = ACTION_NAMES
+    # 自动备份触发方式：定时 / 文件变化
+    TRIGGER_MODES = {
+        "interval": "定时",
+        "event": "文件变化",
+    }
+    # 为下一次操作采集的性能分析数据，见 asbt.profiling
+    PROFILE_MODES = {
+        "": "不采集",
+        PROFILE_CPU: "CPU（cProfile）",
+        PROFILE_MEMORY: "内存（tracemalloc）",
+    }
+    # 存储模式：完整复制 / 去重存储 / 块级增量 / 压缩归档
+    STORE_MODES = {
+        FORMAT_COPY: "完整复制",
+        FORMAT_MANIFEST: "去重存储",
+        FORMAT_DELTA: "块级增量",
+        FORMAT_ARCHIVE: "压缩归档",
+    }
+    # 完整复制时使用的复制方式，见 asbt.copier
+    COPY_METHOD_NAMES = {
+        "reflink": "reflink 克隆",
+        "copy_file_range": "内核复制",
+        "copy": "普通复制",
+        "hardlink": "硬链接",
+        "rename": "直接移入",
+    }
     # 公告信息常量，直接存储在源代码中
     ANNOUNCEMENTS = [
 
@@ -53,7 +218,7 @@ class AutoSaveBackupTool:
         }
     ]
     
-    def __init__(self, root):
+    def __init__(self, root, start_minimized=False):
         self.root = root
         self.root.title(f"ASBT · 自动存档备份工具 {self.VERSION} | by@Yanxiao")
         self.root.geometry("700x620")
@@ -62,50 +227,63 @@ class AutoSaveBackupTool:
         # 将窗口居中显示
         self.center_window(self.root)
 
-        # 默认全局配置
-        self.global_config = {
-            "source_path": "",
-            "is_directory": False,
-            "backup_dir": "",
-            "backup_dirs": [],  # 历史备份目录列表
-            "interval": 5,  # 默认备份间隔（分钟）
-        }
+        # 默认全局配置（见 asbt.engine.default_settings）
+        self.global_config = default_settings()
         
-        # 默认备份目录配置
-        self.backup_config = {
-            "backups": [],
-            "logs": []  # 日志记录列表
-        }
+        # 备份引擎与界面共用全局配置，备份目录配置（backups/logs）保存在引擎中，见 backup_config 属性
+        self.engine = BackupEngine(self.global_config, TkEngineListener(self))
         
         # 合并配置用于兼容现有代码
         self.config = {**self.global_config, **self.backup_config}
         
         # 配置文件路径
-        self.global_config_file = os.path.join(os.path.expanduser("~"), "autoSaveBackupTool_config.json")
+        self.global_config_file = GLOBAL_CONFIG_FILE
         self.backup_config_file = None
         
         # 旧版本配置文件路径
         self.old_config_file = os.path.join(os.path.expanduser("~"), ".game_backup_tool", "config.json")
         
-        # 检查旧版本配置文件
-        self.check_old_config()
+        # 检查旧版本配置文件（只在旧文件存在时才需要弹出迁移对话框）
+        if os.path.isfile(self.old_config_file):
+            self.check_old_config()
         
-        # 加载全局配置
+        # 加载全局配置（只有几 KB，创建界面时需要其中的源路径和备份间隔）
         self.load_global_config()
 
         # 备份线程控制
         self.backup_thread = None
         self.is_running = False
+        # 耗时的文件操作（手动备份、还原、删除等）在后台任务执行器中执行，
+        # 进度和结果通过 root.after 回到主线程更新界面
+        self.jobs = JobExecutor(on_update=self.on_job_update, dispatch=lambda callback: self.root.after(0, callback))
+        # 后台任务和自动备份线程都会读写备份目录，同一时间只允许一个操作
+        self.engine_lock = self.engine.lock
+        # 多个备份任务共用的调度器，开始运行备份任务时创建，见 start_backup_jobs
+        self.job_scheduler = None
+        # Prometheus 指标导出，第一次开始自动备份或备份任务时按设置启动，见 ensure_metrics_exporter
+        self.metrics = None
+        self.metrics_server = None
 
         # 创建界面
         self.create_widgets()
-        
-        # 如果有备份目录，加载备份目录配置
-        if self.global_config["backup_dir"]:
-            self.load_backup_config()
 
-        # 更新备份列表
-        self.update_backup_list()
+        # 最小化启动时窗口第一次显示才填充备份列表
+        self.list_pending = start_minimized
+        if start_minimized:
+            self.root.iconify()
+            self.root.bind("<Map>", self.on_first_map, add="+")
+
+        # 备份目录的配置（重放 journal、同步目录）在后台读取，窗口先显示出来，读取完成后再填充备份列表
+        self.load_backup_config_async()
+    @property
+    def backup_config(self):
+        """当前备份目录的配置 {"backups": [...], "logs": [...]}，保存在引擎中"""
+        return self.engine.backup_config
+
+    @backup_config.setter
+    def backup_config(self, value):
+        self.engine.backup_config = value
+
     # 创建滚动文本
     def create_scrolling_text(self, parent, announcement_var, width=500, speed=100, font=("微软雅黑", 10)):
         canvas = tk.Canvas(parent, width=width, height=25, bg="white", highlightthickness=0)
@@ -249,6 +427,10 @@ class AutoSaveBackupTool:
         self.start_auto_btn = ttk.Button(settings_frame, text="开始自动备份", command=self.toggle_auto_backup)
         self.start_auto_btn.grid(row=0, column=3, padx=5, pady=5)
 
+        ttk.Button(settings_frame, text="高级设置", command=self.show_advanced_settings).grid(row=0, column=4, padx=5, pady=5)
+
+        ttk.Button(settings_frame, text="备份任务", command=self.show_backup_jobs).grid(row=0, column=5, padx=5, pady=5)
+
         # 备份列表区域
         list_frame = ttk.LabelFrame(main_frame, text="备份历史", padding="10")
         list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -265,12 +447,15 @@ class AutoSaveBackupTool:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.backup_tree.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.backup_tree.configure(yscrollcommand=scrollbar.set)
+        # 分页加载，滚动到底部时再读取更早的备份
+        self.backup_list = PagedTree(self.backup_tree, scrollbar, self.engine.fetch_backups, self.make_backup_row)
 
         # 添加右键菜单
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="还原", command=self.restore_backup)
         self.context_menu.add_command(label="删除", command=self.delete_backup)
+        self.context_menu.add_command(label="校验", command=self.verify_backup)
+        self.context_menu.add_command(label="校验全部备份", command=self.verify_all_backups)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="删除备份文件夹", command=self.delete_backup_folder)
 
@@ -281,10 +466,15 @@ class AutoSaveBackupTool:
         log_btn.pack(side=tk.RIGHT, padx=(30, 10), pady=2)
         
         # 状态栏
+        status_frame = ttk.Frame(main_frame)
+        status_frame.pack(fill=tk.X, pady=5)
         self.status_var = tk.StringVar()
         self.status_var.set(f"准备就绪，当前版本 {self.VERSION}")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.pack(fill=tk.X, pady=5)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # 后台任务的进度条和取消按钮，只在有任务时显示
+        self.job_cancel_btn = ttk.Button(status_frame, text="取消", width=6, command=self.jobs.cancel_all)
+        self.job_progress = ttk.Progressbar(status_frame, length=150, mode="determinate")
         
         # 更新公告显示 - 确保在界面创建后立即显示最新公告
         self.update_announcement_display()
@@ -314,6 +504,10 @@ class AutoSaveBackupTool:
             file_type = "文件夹" if is_directory else "文件"
             self.status_var.set(f"已选择{file_type}: {path}")
 
+    def get_valid_backup_dirs(self):
+        """历史备份目录中仍然存在的目录"""
+        return [d for d in self.global_config["backup_dirs"] if stat_cache.exists(d)]
+
     def show_backup_dirs_list(self):
         """显示历史备份目录列表窗口"""
         # 创建一个新窗口
@@ -345,8 +539,8 @@ class AutoSaveBackupTool:
         scrollbar = ttk.Scrollbar(list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # 过滤掉不存在的目录
-        valid_dirs = [d for d in self.global_config["backup_dirs"] if os.path.exists(d)]
+        # 过滤掉不存在的目录（使用路径缓存，慢速磁盘上也能立即打开）
+        valid_dirs = self.get_valid_backup_dirs()
         # 更新全局配置中的备份目录列表
         if self.global_config["backup_dirs"] != valid_dirs:
             self.global_config["backup_dirs"] = valid_dirs
@@ -399,7 +593,7 @@ class AutoSaveBackupTool:
                 try:
                     # 刷新valid_dirs列表，确保只包含存在的目录
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     
                     # 如果刷新后列表为空，更新显示并返回
                     if not valid_dirs:
@@ -413,7 +607,10 @@ class AutoSaveBackupTool:
                     if selection[0] < len(valid_dirs):
                         selected_dir = valid_dirs[selection[0]]
                         # 检查目录是否存在
-                        if os.path.exists(selected_dir):
+                        if self.is_job_backup_dir(selected_dir):
+                            messagebox.showwarning("提示", "该目录正被运行中的备份任务使用，请先停止备份任务",
+                                                   parent=dirs_window)
+                        elif os.path.exists(selected_dir):
                             # 更新输入框
                             self.backup_dir_entry.delete(0, tk.END)
                             self.backup_dir_entry.insert(0, selected_dir)
@@ -436,7 +633,7 @@ class AutoSaveBackupTool:
                     # 刷新列表
                     dirs_listbox.delete(0, tk.END)
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     if valid_dirs:
                         for directory in valid_dirs:
                             dirs_listbox.insert(tk.END, directory)
@@ -475,7 +672,7 @@ class AutoSaveBackupTool:
                     messagebox.showerror("错误", f"删除历史记录时出错: {str(e)}")
                     # 确保valid_dirs与全局配置同步
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     # 刷新列表
                     dirs_listbox.delete(0, tk.END)
                     if valid_dirs:
@@ -492,7 +689,7 @@ class AutoSaveBackupTool:
                 try:
                     # 刷新valid_dirs列表，确保只包含存在的目录
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     
                     # 如果刷新后列表为空，更新显示并返回
                     if not valid_dirs:
@@ -546,7 +743,7 @@ class AutoSaveBackupTool:
                     messagebox.showerror("错误", f"删除备份文件夹时出错: {str(e)}")
                     # 确保valid_dirs与全局配置同步
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     # 刷新列表
                     dirs_listbox.delete(0, tk.END)
                     if valid_dirs:
@@ -588,7 +785,7 @@ class AutoSaveBackupTool:
                 if listbox and valid_dirs is not None:
                     # 确保valid_dirs是最新的，与全局配置同步
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     
                     # 更新列表显示
                     listbox.delete(0, tk.END)
@@ -639,36 +836,50 @@ class AutoSaveBackupTool:
         button_frame.pack(side="bottom", pady=10)
         
         def on_confirm():
-            try:
-                delete_config = delete_config_var.get()
-                delete_backups = delete_backups_var.get()
-                
-                if not delete_config and not delete_backups:
-                    messagebox.showinfo("提示", "未选择任何删除选项")
-                    return
-                
-                # 定义配置文件路径
-                temp_config_file = os.path.join(backup_dir, "config.json")
-                
-                # 删除备份文件
+            delete_config = delete_config_var.get()
+            delete_backups = delete_backups_var.get()
+            
+            if not delete_config and not delete_backups:
+                messagebox.showinfo("提示", "未选择任何删除选项")
+                return
+            
+            # 该目录的配置文件和 journal
+            journal = get_journal(backup_dir)
+            
+            def task(job):
+                # 删除备份文件；删除过程中不能取消，避免配置与实际文件不一致
                 if delete_backups:
                     # 加载该目录的配置
-                    if os.path.exists(temp_config_file):
-                        with open(temp_config_file, 'r', encoding='utf-8') as f:
-                            temp_config = json.load(f)
-                            if "backups" in temp_config:
-                                for backup in temp_config["backups"]:
-                                    backup_path = backup["backup_path"]
-                                    if os.path.exists(backup_path):
-                                        if backup.get("is_directory", False):
-                                            shutil.rmtree(backup_path)
-                                        else:
-                                            os.remove(backup_path)
+                    if journal.exists():
+                        backups = journal.load()["backups"]
+                        progress = job.progress("正在删除备份文件", cancellable=False)
+                        # 从最新的开始删除，块级增量快照就不需要合并到后续快照
+                        for i, backup in enumerate(reversed(backups), 1):
+                            delete_snapshot(backup)
+                            progress(i, len(backups))
+                    
+                    # 删除去重存储的对象仓库和源文件索引
+                    job.report("正在删除对象仓库", 0, 0)
+                    store_dir = os.path.join(backup_dir, ObjectStore.DIR_NAME)
+                    if os.path.exists(store_dir):
+                        shutil.rmtree(store_dir)
+                    index_file = os.path.join(backup_dir, SourceIndex.FILE_NAME)
+                    if os.path.exists(index_file):
+                        os.remove(index_file)
+                    # 该目录下的路径缓存全部失效
+                    stat_cache.invalidate_tree(backup_dir)
                 
-                # 删除配置文件
-                if delete_config and os.path.exists(temp_config_file):
-                    os.remove(temp_config_file)
+                # 对象仓库等不在台账的增量统计范围内，删除后需要重新完整扫描
+                get_ledger(backup_dir).invalidate()
                 
+                # 删除配置文件、journal 和 SQLite 目录
+                if delete_config:
+                    journal.remove_files()
+                    catalog = get_catalog(backup_dir)
+                    if catalog is not None:
+                        catalog.remove_file()
+            
+            def on_success(result):
                 # 从历史备份目录列表中移除
                 if backup_dir in self.global_config["backup_dirs"]:
                     self.global_config["backup_dirs"].remove(backup_dir)
@@ -690,11 +901,11 @@ class AutoSaveBackupTool:
                     self.config["backup_dir"] = ""
                     self.save_global_config()
                 
-                # 如果是从列表窗口调用的，更新列表
-                if listbox and valid_dirs is not None:
+                # 如果是从列表窗口调用的，且窗口还没有关闭，更新列表
+                if listbox and valid_dirs is not None and listbox.winfo_exists():
                     # 确保valid_dirs是最新的，与全局配置同步
                     valid_dirs.clear()
-                    valid_dirs.extend([d for d in self.global_config["backup_dirs"] if os.path.exists(d)])
+                    valid_dirs.extend(self.get_valid_backup_dirs())
                     
                     # 更新列表显示
                     listbox.delete(0, tk.END)
@@ -713,16 +924,13 @@ class AutoSaveBackupTool:
                 # 更新备份列表
                 self.update_backup_list()
                 
-                # 关闭对话框
-                dialog.destroy()
-                
                 # 提示用户操作成功
                 messagebox.showinfo("成功", "备份文件夹已删除")
                 self.status_var.set(f"已删除备份文件夹: {backup_dir}")
-                
-            except Exception as e:
-                messagebox.showerror("错误", f"删除失败: {str(e)}")
-                dialog.destroy()
+            
+            # 关闭对话框，删除在后台执行
+            dialog.destroy()
+            self.run_job("删除备份文件夹", task, on_success, "删除失败")
         
         ttk.Button(button_frame, text="确定", command=on_confirm).pack(side="left", padx=10)
         ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side="left", padx=10)
@@ -740,8 +948,8 @@ class AutoSaveBackupTool:
         # 更新备份配置文件路径
         self.backup_config_file = os.path.join(directory, "config.json")
         
-        # 如果新目录中已有配置文件，则加载该配置
-        if os.path.exists(self.backup_config_file):
+        # 如果新目录中已有配置文件（或 journal），则加载该配置
+        if get_journal(directory).exists():
             self.load_backup_config()
             self.status_var.set(f"已加载备份目录中的配置文件")
         else:
@@ -754,7 +962,7 @@ class AutoSaveBackupTool:
             # 更新合并配置
             self.config.update(self.backup_config)
             # 保存新的空白配置到新目录
-            self.save_backup_config()
+            self.save_backup_config(replaced=True)
             self.status_var.set(f"已为新备份目录创建空白配置文件")
         
         # 保存全局配置
@@ -768,30 +976,9 @@ class AutoSaveBackupTool:
     
     def refresh_log_display_if_open(self):
         """如果日志窗口已打开，刷新日志显示"""
-        if hasattr(self, 'log_tree') and self.log_tree.winfo_exists():
-            # 清空当前日志列表
-            for item in self.log_tree.get_children():
-                self.log_tree.delete(item)
-            
-            # 重新添加日志记录到列表
-            for log in reversed(self.backup_config["logs"]):
-                action_map = {
-                    "backup": "备份",
-                    "restore": "还原",
-                    "delete": "删除",
-                    "restore_deleted": "恢复删除的备份",
-                    "rollback": "回溯操作"
-                }
-                action_text = action_map.get(log["action"], log["action"])
-                
-                backup_info = log["backup_info"]
-                is_directory = backup_info.get("is_directory", False)
-                type_indicator = "[文件夹]" if is_directory else "[文件]"
-                filename = os.path.basename(backup_info["backup_path"])
-                display_name = f"{type_indicator} {filename}"
-                
-                self.log_tree.insert("", tk.END, values=(log["date"], action_text, display_name),
-                                    tags=(log["timestamp"],))
+        if self.is_log_window_open():
+            # 重新加载日志列表的第一页
+            self.log_list.reset()
             
             # 更新状态栏
             self.status_var.set(f"已切换备份目录并刷新日志显示")
@@ -800,7 +987,9 @@ class AutoSaveBackupTool:
     
     def select_backup_dir(self):
         directory = filedialog.askdirectory(title="选择备份目录")
-        if directory:
+        if directory and self.is_job_backup_dir(directory):
+            messagebox.showwarning("提示", "该目录正被运行中的备份任务使用，请先停止备份任务")
+        elif directory:
             # 更新UI
             self.backup_dir_entry.delete(0, tk.END)
             self.backup_dir_entry.insert(0, directory)
@@ -814,36 +1003,616 @@ class AutoSaveBackupTool:
                 # 保存全局配置
                 self.save_global_config()
                 
-            if hasattr(self, 'log_tree') and self.log_tree.winfo_exists():
-                # 清空当前日志列表
-                for item in self.log_tree.get_children():
-                    self.log_tree.delete(item)
-                
-                # 重新添加日志记录到列表
-                for log in reversed(self.backup_config["logs"]):
-                    action_map = {
-                        "backup": "备份",
-                        "restore": "还原",
-                        "delete": "删除",
-                        "restore_deleted": "恢复删除的备份",
-                        "rollback": "回溯操作"
-                    }
-                    action_text = action_map.get(log["action"], log["action"])
-                    
-                    backup_info = log["backup_info"]
-                    is_directory = backup_info.get("is_directory", False)
-                    type_indicator = "[文件夹]" if is_directory else "[文件]"
-                    filename = os.path.basename(backup_info["backup_path"])
-                    display_name = f"{type_indicator} {filename}"
-                    
-                    self.log_tree.insert("", tk.END, values=(log["date"], action_text, display_name),
-                                        tags=(log["timestamp"],))
+            if self.is_log_window_open():
+                # 重新加载日志列表的第一页
+                self.log_list.reset()
                 
                 # 更新状态栏
                 self.status_var.set(f"已切换备份目录并刷新日志显示")
             else:
                 self.status_var.set(f"已切换备份目录并刷新备份列表")
 
+    def show_advanced_settings(self):
+        """显示高级设置窗口"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("高级设置")
+        dialog.geometry("520x1050")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)  # 设置为主窗口的子窗口
+        dialog.grab_set()  # 模态窗口
+
+        # 将对话框居中显示
+        self.center_window(dialog)
+
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        row = 0
+        # 存储模式
+        ttk.Label(frame, text="存储模式:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        store_mode_var = tk.StringVar(value=self.STORE_MODES.get(self.global_config["store_mode"],
+                                                                 self.STORE_MODES[FORMAT_COPY]))
+        ttk.Combobox(frame, textvariable=store_mode_var, values=list(self.STORE_MODES.values()),
+                     state="readonly", width=15).grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        row += 1
+        ttk.Label(frame, text="去重存储：相同内容只保存一份，每次备份只记录清单\n"
+                              "块级增量：单个大文件只保存变化的数据块（文件夹按去重存储处理）\n"
+                              "压缩归档：每次备份写入一个压缩包，占用空间小但不能复用上一次的数据",
+                  foreground="gray").grid(row=row, column=0, columnspan=2, sticky=tk.W)
+        row += 1
+        ttk.Label(frame, text="关键帧间隔(次):").grid(row=row, column=0, sticky=tk.W, pady=5)
+        keyframe_spinbox = ttk.Spinbox(frame, from_=1, to=1000, width=10)
+        keyframe_spinbox.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        keyframe_spinbox.insert(0, str(self.global_config["delta_keyframe_interval"]))
+        row += 1
+        ttk.Label(frame, text="压缩格式:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        archive_type_var = tk.StringVar(value=ARCHIVE_TYPES.get(self.global_config["archive_type"],
+                                                                ARCHIVE_TYPES["tar.gz"]))
+        ttk.Combobox(frame, textvariable=archive_type_var, values=list(ARCHIVE_TYPES.values()),
+                     state="readonly", width=15).grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+
+        row += 1
+        ttk.Label(frame, text="复制线程数:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        workers_spinbox = ttk.Spinbox(frame, from_=1, to=64, width=10)
+        workers_spinbox.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        workers_spinbox.insert(0, str(self.global_config["copy_workers"]))
+        row += 1
+        use_catalog_var = tk.BooleanVar(value=self.global_config["use_catalog"])
+        ttk.Checkbutton(frame, text="使用 SQLite 目录加速查找备份和日志 (catalog.db)",
+                        variable=use_catalog_var).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        row += 1
+        ttk.Label(frame, text="路径缓存时间(秒):").grid(row=row, column=0, sticky=tk.W, pady=5)
+        stat_frame = ttk.Frame(frame)
+        stat_frame.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        stat_ttl_spinbox = ttk.Spinbox(stat_frame, from_=0, to=3600, width=10)
+        stat_ttl_spinbox.pack(side=tk.LEFT)
+        stat_ttl_spinbox.insert(0, str(self.global_config["stat_cache_ttl"]))
+        stat_validator_var = tk.BooleanVar(value=self.global_config["stat_validator"])
+        ttk.Checkbutton(stat_frame, text="后台校验", variable=stat_validator_var).pack(side=tk.LEFT, padx=10)
+
+        row += 1
+        consistency = dict(DEFAULT_CONSISTENCY, **(self.global_config.get("consistency") or {}))
+        consistency_frame = ttk.Frame(frame)
+        consistency_frame.grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        consistency_var = tk.BooleanVar(value=consistency["enabled"])
+        ttk.Checkbutton(consistency_frame, text="一致性模式：复制后检查并重新复制期间被修改的文件，最多重试",
+                        variable=consistency_var).pack(side=tk.LEFT)
+        retries_spinbox = ttk.Spinbox(consistency_frame, from_=1, to=20, width=4)
+        retries_spinbox.pack(side=tk.LEFT, padx=5)
+        retries_spinbox.insert(0, str(consistency["max_retries"]))
+        ttk.Label(consistency_frame, text="次").pack(side=tk.LEFT)
+
+        row += 1
+        integrity_var = tk.BooleanVar(value=self.global_config.get("integrity", True))
+        ttk.Checkbutton(frame, text="生成完整性清单：记录每个文件的校验值，右键备份可以校验是否损坏",
+                        variable=integrity_var).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
+
+        row += 1
+        restore_options = normalize_restore(self.global_config.get("restore"))
+        restore_frame = ttk.Frame(frame)
+        restore_frame.grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        differential_var = tk.BooleanVar(value=restore_options["differential"])
+        ttk.Checkbutton(restore_frame, text="差异还原（只写入变化的文件）",
+                        variable=differential_var).pack(side=tk.LEFT)
+        compare_hash_var = tk.BooleanVar(value=restore_options["compare"] == COMPARE_HASH)
+        ttk.Checkbutton(restore_frame, text="比较内容", variable=compare_hash_var).pack(side=tk.LEFT, padx=10)
+        atomic_var = tk.BooleanVar(value=restore_options["atomic"])
+        ttk.Checkbutton(restore_frame, text="完成后整体替换", variable=atomic_var).pack(side=tk.LEFT)
+
+        # 性能指标和性能分析
+        row += 1
+        ttk.Label(frame, text="性能指标文件:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        metrics_frame = ttk.Frame(frame)
+        metrics_frame.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        metrics_entry = ttk.Entry(metrics_frame, width=26)
+        metrics_entry.pack(side=tk.LEFT)
+        metrics_entry.insert(0, self.global_config.get("metrics_file", ""))
+
+        def choose_metrics_file():
+            path = filedialog.asksaveasfilename(title="选择性能指标文件", defaultextension=".jsonl",
+                                                filetypes=[("JSON Lines", "*.jsonl"), ("所有文件", "*.*")],
+                                                parent=dialog)
+            if path:
+                metrics_entry.delete(0, tk.END)
+                metrics_entry.insert(0, path)
+
+        ttk.Button(metrics_frame, text="浏览", command=choose_metrics_file).pack(side=tk.LEFT, padx=5)
+        row += 1
+        ttk.Label(frame, text="性能分析:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        profile_var = tk.StringVar(value=self.PROFILE_MODES[self.engine.profile_next or ""])
+        ttk.Combobox(frame, textvariable=profile_var, values=list(self.PROFILE_MODES.values()),
+                     state="readonly", width=20).grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        row += 1
+        ttk.Label(frame, text="性能分析只采集下一次备份、还原或校验，数据保存在备份目录的 .profiles 文件夹中",
+                  foreground="gray", wraplength=400).grid(row=row, column=0, columnspan=2, sticky=tk.W)
+        row += 1
+        exporter = normalize_exporter(self.global_config.get("exporter"))
+        ttk.Label(frame, text="Prometheus 端口:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        exporter_frame = ttk.Frame(frame)
+        exporter_frame.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        exporter_port_spinbox = ttk.Spinbox(exporter_frame, from_=0, to=65535, width=7)
+        exporter_port_spinbox.pack(side=tk.LEFT)
+        exporter_port_spinbox.insert(0, str(exporter["port"]))
+        ttk.Label(exporter_frame, text="文本文件:").pack(side=tk.LEFT, padx=(10, 0))
+        exporter_textfile_entry = ttk.Entry(exporter_frame, width=16)
+        exporter_textfile_entry.pack(side=tk.LEFT, padx=5)
+        exporter_textfile_entry.insert(0, exporter["textfile"])
+        row += 1
+        ttk.Label(frame, text="自动备份和备份任务的指标，端口为 0 且文本文件为空时不导出，修改后重新启动程序生效",
+                  foreground="gray", wraplength=400).grid(row=row, column=0, columnspan=2, sticky=tk.W)
+
+        # 自动备份触发方式
+        row += 1
+        ttk.Label(frame, text="自动备份触发:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        trigger_mode_var = tk.StringVar(value=self.TRIGGER_MODES.get(self.global_config["trigger_mode"],
+                                                                     self.TRIGGER_MODES["interval"]))
+        ttk.Combobox(frame, textvariable=trigger_mode_var, values=list(self.TRIGGER_MODES.values()),
+                     state="readonly", width=15).grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        row += 1
+        ttk.Label(frame, text="静默时间(秒):").grid(row=row, column=0, sticky=tk.W, pady=5)
+        quiet_spinbox = ttk.Spinbox(frame, from_=1, to=3600, width=10)
+        quiet_spinbox.grid(row=row, column=1, sticky=tk.W, padx=5, pady=5)
+        quiet_spinbox.insert(0, str(self.global_config["quiet_seconds"]))
+        row += 1
+        ttk.Label(frame, text="文件变化：存档写入后静默指定时间才备份，备份间隔作为最长等待时间",
+                  foreground="gray", wraplength=400).grid(row=row, column=0, columnspan=2, sticky=tk.W)
+
+        # 旧备份保留策略
+        row += 1
+        retention_frame, get_retention = self.create_retention_frame(frame, self.global_config.get("retention"))
+        retention_frame.grid(row=row, column=0, columnspan=2, sticky=tk.W + tk.E, pady=(10, 0))
+
+        # 自动备份限速
+        row += 1
+        throttle = normalize_throttle(self.global_config.get("throttle"))
+        throttle_frame = ttk.LabelFrame(frame, text="自动备份限速（手动备份不限速）", padding="10")
+        throttle_frame.grid(row=row, column=0, columnspan=2, sticky=tk.W + tk.E, pady=(10, 0))
+        throttle_enabled_var = tk.BooleanVar(value=throttle["enabled"])
+        ttk.Checkbutton(throttle_frame, text="启用限速",
+                        variable=throttle_enabled_var).grid(row=0, column=0, columnspan=2, sticky=tk.W)
+        low_priority_var = tk.BooleanVar(value=throttle["low_priority"])
+        ttk.Checkbutton(throttle_frame, text="降低 CPU 和磁盘优先级",
+                        variable=low_priority_var).grid(row=0, column=2, columnspan=2, sticky=tk.W)
+        throttle_spinboxes = {}
+        for i, (key, label, to) in enumerate([("mb_per_sec", "MB/秒:", 10000), ("files_per_sec", "文件/秒:", 100000),
+                                              ("pause_load", "负载暂停:", 100)]):
+            ttk.Label(throttle_frame, text=label).grid(row=1 + i // 2, column=(i % 2) * 2, sticky=tk.W, pady=2)
+            spinbox = ttk.Spinbox(throttle_frame, from_=0, to=to, increment=0.5 if key == "pause_load" else 1, width=8)
+            spinbox.grid(row=1 + i // 2, column=(i % 2) * 2 + 1, sticky=tk.W, padx=5, pady=2)
+            spinbox.insert(0, str(throttle[key]))
+            throttle_spinboxes[key] = spinbox
+        ttk.Label(throttle_frame, text="0 表示不限制；负载暂停：每个 CPU 的平均负载超过该值时暂停（Windows 不支持）",
+                  foreground="gray", wraplength=400).grid(row=3, column=0, columnspan=4, sticky=tk.W)
+
+        def on_save():
+            try:
+                quiet_seconds = int(quiet_spinbox.get())
+                if quiet_seconds <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的静默时间", parent=dialog)
+                return
+            try:
+                keyframe_interval = int(keyframe_spinbox.get())
+                if keyframe_interval <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的关键帧间隔", parent=dialog)
+                return
+            try:
+                copy_workers = int(workers_spinbox.get())
+                if copy_workers <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的复制线程数", parent=dialog)
+                return
+            try:
+                stat_cache_ttl = int(stat_ttl_spinbox.get())
+                if stat_cache_ttl < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的路径缓存时间", parent=dialog)
+                return
+            try:
+                max_retries = int(retries_spinbox.get())
+                if max_retries <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的重试次数", parent=dialog)
+                return
+            try:
+                retention = get_retention()
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的保留数量", parent=dialog)
+                return
+            try:
+                exporter_port = int(exporter_port_spinbox.get())
+                if not 0 <= exporter_port <= 65535:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的端口", parent=dialog)
+                return
+            throttle = {"enabled": throttle_enabled_var.get(), "low_priority": low_priority_var.get()}
+            try:
+                for key, spinbox in throttle_spinboxes.items():
+                    throttle[key] = float(spinbox.get()) if key == "pause_load" else int(spinbox.get())
+                    if throttle[key] < 0:
+                        raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的限速设置", parent=dialog)
+                return
+
+            for mode, text in self.STORE_MODES.items():
+                if text == store_mode_var.get():
+                    self.global_config["store_mode"] = mode
+            for archive_type, text in ARCHIVE_TYPES.items():
+                if text == archive_type_var.get():
+                    self.global_config["archive_type"] = archive_type
+            for mode, text in self.TRIGGER_MODES.items():
+                if text == trigger_mode_var.get():
+                    self.global_config["trigger_mode"] = mode
+            self.global_config["quiet_seconds"] = quiet_seconds
+            self.global_config["delta_keyframe_interval"] = keyframe_interval
+            self.global_config["copy_workers"] = copy_workers
+            self.global_config["retention"] = retention
+            self.global_config["throttle"] = throttle
+            self.global_config["consistency"] = dict(consistency, enabled=consistency_var.get(),
+                                                     max_retries=max_retries)
+            self.global_config["integrity"] = integrity_var.get()
+            self.global_config["restore"] = dict(restore_options, differential=differential_var.get(),
+                                                 compare=COMPARE_HASH if compare_hash_var.get() else COMPARE_MTIME,
+                                                 atomic=atomic_var.get())
+            self.global_config["metrics_file"] = metrics_entry.get().strip()
+            self.global_config["exporter"] = dict(exporter, port=exporter_port,
+                                                  textfile=exporter_textfile_entry.get().strip())
+            for mode, text in self.PROFILE_MODES.items():
+                if text == profile_var.get():
+                    self.engine.profile_next = mode or None
+            self.global_config["use_catalog"] = use_catalog_var.get()
+            self.global_config["stat_cache_ttl"] = stat_cache_ttl
+            self.global_config["stat_validator"] = stat_validator_var.get()
+            # 更新合并配置以保持兼容性
+            self.config.update(self.global_config)
+            self.save_global_config()
+            # 刚启用目录时从 journal 导入
+            self.engine.sync_catalog()
+            self.apply_stat_cache_settings()
+            self.status_var.set("已保存高级设置，重新开始自动备份后生效"
+                                if self.is_running else "已保存高级设置")
+            dialog.destroy()
+
+        # 添加按钮
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, pady=10)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.RIGHT, padx=10)
+        ttk.Button(button_frame, text="保存", command=on_save).pack(side=tk.RIGHT, padx=5)
+
+    def show_backup_jobs(self):
+        """显示备份任务窗口：管理多个命名的备份任务，由共用的调度器错开运行"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("备份任务")
+        dialog.geometry("760x420")
+        dialog.transient(self.root)
+
+        # 将对话框居中显示
+        self.center_window(dialog)
+
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="每个任务有自己的源文件、备份目录、备份间隔和保留策略，其余设置使用高级设置中的配置。\n"
+                              "任务按各自的间隔自动备份，源文件没有变化时跳过；同时运行的任务数有限，开始时间相互错开。",
+                  foreground="gray").pack(anchor=tk.W)
+
+        columns = ("名称", "源文件/文件夹", "备份目录", "间隔(分钟)", "状态")
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        jobs_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
+        for col, width in zip(columns, (90, 220, 220, 70, 130)):
+            jobs_tree.heading(col, text=col)
+            jobs_tree.column(col, width=width)
+        jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=jobs_tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        jobs_tree.config(yscrollcommand=scrollbar.set)
+
+        options_frame = ttk.Frame(frame)
+        options_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(options_frame, text="同时运行的任务数:").pack(side=tk.LEFT)
+        concurrent_spinbox = ttk.Spinbox(options_frame, from_=1, to=16, width=5)
+        concurrent_spinbox.pack(side=tk.LEFT, padx=5)
+        concurrent_spinbox.insert(0, str(self.global_config["max_concurrent_jobs"]))
+        ttk.Label(options_frame, text="任务开始间隔(秒):").pack(side=tk.LEFT, padx=(15, 0))
+        stagger_spinbox = ttk.Spinbox(options_frame, from_=0, to=3600, width=6)
+        stagger_spinbox.pack(side=tk.LEFT, padx=5)
+        stagger_spinbox.insert(0, str(self.global_config["job_stagger_seconds"]))
+
+        def job_state_text(job, status):
+            if not job.get("enabled", True):
+                return "已停用"
+            if status is None:
+                return "未运行"
+            if status["running"]:
+                return "正在备份"
+            if status["last_error"]:
+                return f"出错: {status['last_error']}"
+            if status["next_in"] is not None:
+                return f"{int(status['next_in'] // 60)} 分 {int(status['next_in'] % 60)} 秒后"
+            return "已停止"
+
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            statuses = {}
+            if self.job_scheduler is not None:
+                statuses = {status["name"]: status for status in self.job_scheduler.status()}
+            selection = jobs_tree.selection()
+            jobs_tree.delete(*jobs_tree.get_children())
+            for i, job in enumerate(self.global_config["jobs"]):
+                jobs_tree.insert("", tk.END, iid=str(i), values=(
+                    job["name"], job["source_path"], job["backup_dir"], job["interval"],
+                    job_state_text(job, statuses.get(job["name"]))))
+            if selection and jobs_tree.exists(selection[0]):
+                jobs_tree.selection_set(selection[0])
+            run_btn.config(text="停止全部任务" if self.is_jobs_running() else "开始全部任务")
+
+        def auto_refresh():
+            if dialog.winfo_exists():
+                refresh()
+                dialog.after(1000, auto_refresh)
+
+        def selected_index():
+            selection = jobs_tree.selection()
+            if not selection:
+                messagebox.showinfo("提示", "请先选择一个任务", parent=dialog)
+                return None
+            return int(selection[0])
+
+        def check_stopped():
+            if self.is_jobs_running():
+                messagebox.showinfo("提示", "请先停止全部任务再修改", parent=dialog)
+                return False
+            return True
+
+        def on_add():
+            if check_stopped():
+                self.edit_backup_job(dialog, None, refresh)
+
+        def on_edit():
+            index = selected_index()
+            if index is not None and check_stopped():
+                self.edit_backup_job(dialog, index, refresh)
+
+        def on_delete():
+            index = selected_index()
+            if index is None or not check_stopped():
+                return
+            name = self.global_config["jobs"][index]["name"]
+            if messagebox.askyesno("确认", f"确定要删除备份任务 {name} 吗？已有的备份不会被删除", parent=dialog):
+                del self.global_config["jobs"][index]
+                self.save_global_config()
+                refresh()
+
+        def on_toggle_enabled():
+            index = selected_index()
+            if index is not None and check_stopped():
+                job = self.global_config["jobs"][index]
+                job["enabled"] = not job.get("enabled", True)
+                self.save_global_config()
+                refresh()
+
+        def on_run():
+            if self.is_jobs_running():
+                self.stop_backup_jobs()
+            else:
+                try:
+                    max_concurrent = int(concurrent_spinbox.get())
+                    stagger = int(stagger_spinbox.get())
+                    if max_concurrent <= 0 or stagger < 0:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("错误", "请输入有效的任务数和开始间隔", parent=dialog)
+                    return
+                self.global_config["max_concurrent_jobs"] = max_concurrent
+                self.global_config["job_stagger_seconds"] = stagger
+                self.save_global_config()
+                self.start_backup_jobs(parent=dialog)
+            refresh()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, pady=10)
+        ttk.Button(button_frame, text="添加", command=on_add).pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Button(button_frame, text="编辑", command=on_edit).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="删除", command=on_delete).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="启用/停用", command=on_toggle_enabled).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT, padx=10)
+        run_btn = ttk.Button(button_frame, text="开始全部任务", command=on_run)
+        run_btn.pack(side=tk.RIGHT, padx=5)
+        jobs_tree.bind("<Double-1>", lambda event: on_edit())
+
+        auto_refresh()
+
+    def edit_backup_job(self, parent, index, on_saved):
+        """添加（index 为 None）或编辑备份任务"""
+        job = self.global_config["jobs"][index] if index is not None else {
+            "name": "", "source_path": "", "is_directory": False, "backup_dir": "",
+            "interval": self.global_config["interval"], "enabled": True,
+        }
+        dialog = tk.Toplevel(parent)
+        dialog.title("编辑备份任务" if index is not None else "添加备份任务")
+        dialog.geometry("560x430")
+        dialog.resizable(False, False)
+        dialog.transient(parent)
+        dialog.grab_set()
+
+        # 将对话框居中显示
+        self.center_window(dialog)
+
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text="名称:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        name_entry = ttk.Entry(frame, width=20)
+        name_entry.grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        name_entry.insert(0, job["name"])
+
+        is_directory_var = tk.BooleanVar(value=job.get("is_directory", False))
+        ttk.Label(frame, text="源文件/文件夹:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        source_entry = ttk.Entry(frame, width=40)
+        source_entry.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
+        source_entry.insert(0, job["source_path"])
+
+        def select_source(is_directory):
+            if is_directory:
+                path = filedialog.askdirectory(title="选择要备份的文件夹", parent=dialog)
+            else:
+                path = filedialog.askopenfilename(title="选择要备份的文件", parent=dialog)
+            if path:
+                source_entry.delete(0, tk.END)
+                source_entry.insert(0, path)
+                is_directory_var.set(is_directory)
+
+        source_btn_frame = ttk.Frame(frame)
+        source_btn_frame.grid(row=2, column=1, sticky=tk.W, padx=5)
+        ttk.Button(source_btn_frame, text="选择文件", command=lambda: select_source(False)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(source_btn_frame, text="选择文件夹", command=lambda: select_source(True)).pack(side=tk.LEFT, padx=2)
+
+        ttk.Label(frame, text="备份目录:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        backup_dir_entry = ttk.Entry(frame, width=40)
+        backup_dir_entry.grid(row=3, column=1, sticky=tk.W, padx=5, pady=5)
+        backup_dir_entry.insert(0, job["backup_dir"])
+
+        def select_backup_dir():
+            directory = filedialog.askdirectory(title="选择备份目录", parent=dialog)
+            if directory:
+                backup_dir_entry.delete(0, tk.END)
+                backup_dir_entry.insert(0, directory)
+
+        ttk.Button(frame, text="浏览", command=select_backup_dir).grid(row=3, column=2, padx=5, pady=5)
+
+        ttk.Label(frame, text="备份间隔(分钟):").grid(row=4, column=0, sticky=tk.W, pady=5)
+        interval_spinbox = ttk.Spinbox(frame, from_=1, to=1440, width=10)
+        interval_spinbox.grid(row=4, column=1, sticky=tk.W, padx=5, pady=5)
+        interval_spinbox.insert(0, str(job["interval"]))
+
+        own_retention_var = tk.BooleanVar(value=job.get("retention") is not None)
+        ttk.Checkbutton(frame, text="使用单独的保留策略（否则使用高级设置中的保留策略）",
+                        variable=own_retention_var).grid(row=5, column=0, columnspan=3, sticky=tk.W, pady=(10, 0))
+        retention_frame, get_retention = self.create_retention_frame(
+            frame, job.get("retention") or self.global_config.get("retention"))
+        retention_frame.grid(row=6, column=0, columnspan=3, sticky=tk.W + tk.E, pady=5)
+
+        def on_save():
+            try:
+                interval = int(interval_spinbox.get())
+                if interval <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的备份间隔", parent=dialog)
+                return
+            try:
+                retention = get_retention() if own_retention_var.get() else None
+            except ValueError:
+                messagebox.showerror("错误", "请输入有效的保留数量", parent=dialog)
+                return
+            source_path = source_entry.get().strip()
+            new_job = {
+                "name": name_entry.get().strip(),
+                "source_path": source_path,
+                "is_directory": os.path.isdir(source_path) if os.path.exists(source_path) else is_directory_var.get(),
+                "backup_dir": backup_dir_entry.get().strip(),
+                "interval": interval,
+                "retention": retention,
+                "enabled": job.get("enabled", True),
+            }
+            jobs = list(self.global_config["jobs"])
+            if index is not None:
+                jobs[index] = new_job
+            else:
+                jobs.append(new_job)
+            try:
+                validate_jobs(jobs)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=dialog)
+                return
+            self.global_config["jobs"] = jobs
+            self.save_global_config()
+            on_saved()
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, pady=10)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.RIGHT, padx=10)
+        ttk.Button(button_frame, text="保存", command=on_save).pack(side=tk.RIGHT, padx=5)
+
+    def is_jobs_running(self):
+        """备份任务是否在运行（停止后还有未完成的备份时也算在运行）"""
+        if self.job_scheduler is None:
+            return False
+        return self.job_scheduler.is_running or not self.job_scheduler.wait_idle(0)
+
+    def is_job_backup_dir(self, directory):
+        """目录是否正被运行中的备份任务使用"""
+        if not self.is_jobs_running():
+            return False
+        directory = os.path.normcase(os.path.abspath(directory))
+        return any(os.path.normcase(os.path.abspath(job["backup_dir"])) == directory
+                   for job in self.global_config["jobs"] if job.get("enabled", True))
+
+    def start_backup_jobs(self, parent=None):
+        """开始运行全部启用的备份任务"""
+        enabled_jobs = [job for job in self.global_config["jobs"] if job.get("enabled", True)]
+        if not enabled_jobs:
+            messagebox.showinfo("提示", "没有启用的备份任务", parent=parent)
+            return
+        try:
+            # 任务不能使用界面当前的备份目录，否则两边的备份记录会互相覆盖
+            validate_jobs(enabled_jobs, reserved_dirs=[self.global_config["backup_dir"]])
+            self.job_scheduler, engines = create_job_scheduler(
+                self.global_config, lambda name: TkJobListener(self, name),
+                lambda name, error: self.root.after(0, lambda: self.status_var.set(
+                    f"[{name}] 备份任务出错: {str(error)}")),
+                self.ensure_metrics_exporter())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e), parent=parent)
+            return
+        self.job_scheduler.start()
+        self.status_var.set(f"已开始 {len(engines)} 个备份任务")
+
+    def stop_backup_jobs(self):
+        """停止调度备份任务，正在运行的备份会执行完"""
+        if self.job_scheduler is not None:
+            self.job_scheduler.stop()
+        self.status_var.set("已停止全部备份任务，正在进行的备份完成后结束")
+
+    def create_retention_frame(self, parent, policy):
+        """创建保留策略的设置区域
+
+        返回 (区域, get_retention)，get_retention() 返回设置的保留策略，输入无效时抛出 ValueError
+        """
+        policy = normalize_policy(policy)
+        retention_frame = ttk.LabelFrame(parent, text="旧备份保留策略", padding="10")
+        retention_enabled_var = tk.BooleanVar(value=policy["enabled"])
+        ttk.Checkbutton(retention_frame, text="每次备份后自动清理旧备份",
+                        variable=retention_enabled_var).grid(row=0, column=0, columnspan=4, sticky=tk.W)
+        retention_spinboxes = {}
+        for i, (key, label) in enumerate([("keep_last", "保留最近(个):"), ("hourly", "每小时一个(小时):"),
+                                          ("daily", "每天一个(天):"), ("weekly", "每周一个(周):")]):
+            ttk.Label(retention_frame, text=label).grid(row=1 + i // 2, column=(i % 2) * 2, sticky=tk.W, pady=2)
+            spinbox = ttk.Spinbox(retention_frame, from_=0, to=10000, width=6)
+            spinbox.grid(row=1 + i // 2, column=(i % 2) * 2 + 1, sticky=tk.W, padx=5, pady=2)
+            spinbox.insert(0, str(policy[key]))
+            retention_spinboxes[key] = spinbox
+
+        def get_retention():
+            retention = {"enabled": retention_enabled_var.get()}
+            for key, spinbox in retention_spinboxes.items():
+                retention[key] = int(spinbox.get())
+                if retention[key] < 0:
+                    raise ValueError
+            return retention
+
+        return retention_frame, get_retention
+
     def toggle_auto_backup(self):
         if self.is_running:
             self.is_running = False
@@ -855,7 +1624,10 @@ class AutoSaveBackupTool:
 
             self.is_running = True
             self.start_auto_btn.config(text="停止自动备份")
-            self.status_var.set("自动备份已启动")
+            if self.global_config.get("trigger_mode") == "event":
+                self.status_var.set("自动备份已启动，源文件变化后自动备份")
+            else:
+                self.status_var.set("自动备份已启动")
 
             # 更新备份间隔
             try:
@@ -870,83 +1642,111 @@ class AutoSaveBackupTool:
                 messagebox.showerror("错误", "请输入有效的备份间隔")
                 return
 
+            self.engine.metrics = self.ensure_metrics_exporter()
+
             # 启动备份线程
             if self.backup_thread is None or not self.backup_thread.is_alive():
                 self.backup_thread = threading.Thread(target=self.auto_backup_task)
                 self.backup_thread.daemon = True
                 self.backup_thread.start()
 
-    def auto_backup_task(self):
-        while self.is_running:
+    def ensure_metrics_exporter(self):
+        """按设置启动 Prometheus 指标导出（程序运行期间只启动一次），返回 BackupMetrics，未启用时返回 None"""
+        if self.metrics is None:
             try:
-                self.perform_backup()
-                # 转换间隔为秒
-                interval_seconds = self.global_config["interval"] * 60
-                # 每秒检查一次是否需要停止
-                for _ in range(interval_seconds):
-                    if not self.is_running:
-                        break
-                    time.sleep(1)
-            except Exception as e:
-                self.status_var.set(f"自动备份出错: {str(e)}")
-                self.is_running = False
-                self.root.after(0, lambda: self.start_auto_btn.config(text="开始自动备份"))
-                break
-
-    def manual_backup(self):
-        if not self.validate_settings():
-            return
+                self.metrics, self.metrics_server = create_exporter(self.global_config.get("exporter"))
+                if self.metrics is not None:
+                    # 后台任务队列（手动备份、还原等）同样计入排队和运行中的任务数
+                    self.metrics.executor = self.jobs
+            except OSError as e:
+                self.status_var.set(f"无法启动指标导出: {str(e)}")
+        return self.metrics
 
+    def auto_backup_task(self):
+        # 定时或文件变化触发，循环由引擎执行，直到停止自动备份
         try:
-            self.perform_backup()
-            # messagebox.showinfo("成功", "手动备份完成")
+            self.engine.run_auto_backup(lambda: not self.is_running)
         except Exception as e:
-            messagebox.showerror("错误", f"备份失败: {str(e)}")
+            self.stop_auto_backup_on_error(e)
 
-    def perform_backup(self):
-        source_path = self.global_config["source_path"]
-        backup_dir = self.global_config["backup_dir"]
-        is_directory = self.global_config["is_directory"]
-
-        # 确保目录存在
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
+    def stop_auto_backup_on_error(self, error):
+        """自动备份出错时停止自动备份（在自动备份线程中调用，界面通过 root.after 更新）"""
+        self.is_running = False
+        message = f"自动备份出错: {str(error)}"
+        self.root.after(0, lambda: self.status_var.set(message))
+        self.root.after(0, lambda: self.start_auto_btn.config(text="开始自动备份"))
 
-        # 生成带时间戳的文件名（添加毫秒级精度，确保同一秒内的备份文件名也是唯一的）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:19]  # 取前19位，包含到毫秒级别
-        source_name = os.path.basename(source_path)
-        backup_path = os.path.join(backup_dir, f"{source_name}_{timestamp}")
+    def manual_backup(self):
+        if not self.validate_settings():
+            return
 
-        # 执行备份
-        if is_directory:
-            # 如果是目录，使用shutil.copytree复制整个目录结构
-            shutil.copytree(source_path, backup_path)
-        else:
-            # 如果是文件，使用shutil.copy2复制单个文件
-            shutil.copy2(source_path, backup_path)
-
-        # 记录备份信息
-        backup_info = {
-            "timestamp": timestamp,
-            "original": source_path,
-            "backup_path": backup_path,
-            "is_directory": is_directory,
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        # 在后台执行，完成后 perform_backup 会自己更新状态栏
+        self.run_job("立即备份", lambda job: self.engine.perform_backup(progress=job.progress("正在备份")),
+                     error_text="备份失败")
 
-        # 添加到备份配置中的备份列表
-        self.backup_config["backups"].append(backup_info)
-        # 更新合并配置以保持兼容性
-        self.config["backups"] = self.backup_config["backups"]
-        
-        # 添加日志记录
-        self.add_log("backup", backup_info)
-        
-        self.save_config()
+    def run_job(self, name, func, on_success=None, error_text="操作失败", on_finished=None):
+        """把耗时的文件操作提交到后台任务执行器
 
-        # 更新UI
-        self.root.after(0, self.update_backup_list)
-        self.root.after(0, lambda: self.status_var.set(f"备份完成: {source_name} 于 {backup_info['date']}"))
+        参数:
+            name: 任务名称，显示在状态栏
+            func: func(job)，在后台线程中执行，执行期间持有 engine_lock
+            on_success: on_success(result)，成功后在主线程中调用
+            error_text: 失败时提示信息的前缀
+            on_finished: on_finished(job)，无论成功、失败或取消，最后在主线程中调用
+        """
+        def task(job):
+            with self.engine_lock:
+                job.check_cancelled()
+                return func(job)
+
+        def on_done(job):
+            if job.state == Job.DONE:
+                if on_success:
+                    on_success(job.result)
+            elif job.state == Job.CANCELLED:
+                self.status_var.set(f"已取消: {name}")
+            else:
+                messagebox.showerror("错误", f"{error_text}: {str(job.error)}")
+            if on_finished:
+                on_finished(job)
+
+        return self.jobs.submit(name, task, on_done)
+
+    def on_job_update(self, job):
+        """后台任务状态变化时更新进度条（在主线程中调用）"""
+        if job.state == Job.RUNNING:
+            if not self.job_progress.winfo_ismapped():
+                self.job_cancel_btn.pack(side=tk.RIGHT, padx=(5, 0))
+                self.job_progress.pack(side=tk.RIGHT, padx=(5, 0))
+            if job.total:
+                self.job_progress.config(mode="determinate", maximum=job.total, value=job.done)
+                progress_text = f"{job.done}/{job.total}"
+            else:
+                self.job_progress.config(mode="indeterminate")
+                self.job_progress.step()
+                progress_text = "..."
+            pending = self.jobs.pending_count()
+            pending_text = f"，还有 {pending} 个任务等待" if pending else ""
+            self.status_var.set(f"{job.name}: {job.message or '正在执行'} {progress_text}{pending_text}")
+        elif job.finished and self.jobs.current is None and not self.jobs.pending_count():
+            self.job_progress.pack_forget()
+            self.job_cancel_btn.pack_forget()
+
+    def apply_stat_cache_settings(self):
+        """按全局配置设置路径缓存时间，并启动或停止后台校验"""
+        ttl = max(0, int(self.global_config.get("stat_cache_ttl", StatCache.DEFAULT_TTL)))
+        if ttl != stat_cache.ttl:
+            stat_cache.ttl = ttl
+            stat_cache.invalidate()
+        stat_cache.stop_validator()
+        if ttl > 0 and self.global_config.get("stat_validator"):
+            # 校验线程发现变化时切回主线程刷新列表
+            stat_cache.start_validator(on_change=lambda changed: self.root.after(0, self.on_stat_cache_changed))
+
+    def on_stat_cache_changed(self):
+        """后台校验发现备份被外部删除或恢复"""
+        self.update_backup_list()
+        self.status_var.set("检测到备份目录中的文件变化，已刷新备份列表")
 
     def update_announcement_display(self):
         # 更新公告显示
@@ -1006,26 +1806,25 @@ class AutoSaveBackupTool:
     # 公告管理相关函数已移除，公告现在直接存储在源代码中的ANNOUNCEMENTS常量中
     
     def update_backup_list(self):
-        # 清空当前列表
-        for item in self.backup_tree.get_children():
-            self.backup_tree.delete(item)
-
-        # 添加备份记录到列表
-        count = 0
-        for backup in reversed(self.backup_config["backups"]):
-            if os.path.exists(backup["backup_path"]):
-                # 添加类型标识
-                is_directory = backup.get("is_directory", False)
-                type_indicator = "[文件夹]" if is_directory else "[文件]"
-                filename = os.path.basename(backup["backup_path"])
-                display_name = f"{type_indicator} {filename}"
-                
-                self.backup_tree.insert("", tk.END, values=(backup["date"], display_name),
-                                        tags=(backup["timestamp"],))
-                count += 1
+        # 清空当前列表并加载第一页，其余的备份在滚动时加载（设置了性能指标文件时记录刷新用时）
+        timer = OperationTimer("ui_refresh")
+        with timer.span("backup_list", len(self.backup_config["backups"])):
+            self.backup_list.reset()
+        self.engine.record_metrics(timer)
         
         # 更新状态栏
-        self.status_var.set(f"已更新备份列表，数量：{count}")
+        self.status_var.set(f"已更新备份列表，数量：{len(self.backup_config['backups'])}")
+
+    def make_backup_row(self, backup):
+        """备份列表中的一行，备份已不存在时返回 None"""
+        if not snapshot_exists(backup, cached=True):
+            return None
+        # 添加类型标识
+        is_directory = backup.get("is_directory", False)
+        type_indicator = "[文件夹]" if is_directory else "[文件]"
+        filename = os.path.basename(backup["backup_path"])
+        display_name = f"{type_indicator} {filename}"
+        return (backup["date"], display_name), backup["timestamp"]
 
     def show_context_menu(self, event):
         # 获取选中的项
@@ -1044,11 +1843,7 @@ class AutoSaveBackupTool:
         timestamp = self.backup_tree.item(selected[0], "tags")[0]
 
         # 查找对应的备份信息
-        backup_info = None
-        for backup in self.backup_config["backups"]:
-            if backup["timestamp"] == timestamp:
-                backup_info = backup
-                break
+        backup_info = self.engine.find_backup(timestamp)
 
         if not backup_info:
             messagebox.showerror("错误", "找不到备份信息")
@@ -1059,35 +1854,19 @@ class AutoSaveBackupTool:
         if not confirm:
             return
 
-        try:
-            # 先备份当前文件或文件夹
-            self.perform_backup()
+        backup_path = backup_info["backup_path"]
 
-            # 获取是否为目录的信息
-            is_directory = backup_info.get("is_directory", False)
-            original_path = backup_info["original"]
-            backup_path = backup_info["backup_path"]
-            
-            # 如果目标路径存在，先删除
-            if os.path.exists(original_path):
-                if is_directory:
-                    shutil.rmtree(original_path)
-                else:
-                    os.remove(original_path)
-            
-            # 还原备份
-            if is_directory:
-                shutil.copytree(backup_path, original_path)
-            else:
-                shutil.copy2(backup_path, original_path)
-                
+        def task(job):
+            # 先备份当前文件或文件夹，再还原；还原开始后不能取消，避免留下不完整的存档
+            return self.engine.restore_backup(backup_info, "restore",
+                                              backup_progress=job.progress("正在备份当前存档"),
+                                              restore_progress=job.progress("正在还原", cancellable=False))
+
+        def on_success(restore_throughput):
             messagebox.showinfo("成功", "存档已还原")
-            self.status_var.set(f"已还原: {os.path.basename(backup_path)}")
-            
-            # 添加日志记录
-            self.add_log("restore", backup_info)
-        except Exception as e:
-            messagebox.showerror("错误", f"还原失败: {str(e)}")
+            self.status_var.set(f"已还原: {os.path.basename(backup_path)}（{self.format_throughput(restore_throughput)}）")
+
+        self.run_job("还原", task, on_success, "还原失败")
 
     def delete_backup(self):
         selected = self.backup_tree.selection()
@@ -1099,13 +1878,9 @@ class AutoSaveBackupTool:
         timestamp = self.backup_tree.item(selected[0], "tags")[0]
 
         # 查找对应的备份信息
-        backup_index = -1
-        for i, backup in enumerate(self.backup_config["backups"]):
-            if backup["timestamp"] == timestamp:
-                backup_index = i
-                break
+        backup_info = self.engine.find_backup(timestamp)
 
-        if backup_index == -1:
+        if not backup_info:
             messagebox.showerror("错误", "找不到备份信息")
             return
 
@@ -1114,33 +1889,84 @@ class AutoSaveBackupTool:
         if not confirm:
             return
 
-        try:
-            backup_info = self.backup_config["backups"][backup_index]
-            is_directory = backup_info.get("is_directory", False)
+        def task(job):
+            job.report("正在删除备份文件")
+            # 删除备份文件或文件夹，并从配置中移除
+            self.engine.delete_backup(backup_info)
+
+        def on_success(result):
+            # 只从列表中移除这一行
+            self.backup_list.remove(backup_info["timestamp"])
+            self.status_var.set(f"已删除备份，数量：{len(self.backup_config['backups'])}")
+            messagebox.showinfo("成功", "备份已删除")
 
-            # 删除备份文件或文件夹
-            if os.path.exists(backup_info["backup_path"]):
-                if is_directory:
-                    shutil.rmtree(backup_info["backup_path"])
-                else:
-                    os.remove(backup_info["backup_path"])
+        self.run_job("删除备份", task, on_success, "删除失败")
+            
+    def verify_backup(self):
+        """按完整性清单校验所选备份"""
+        selected = self.backup_tree.selection()
+        if not selected:
+            messagebox.showinfo("提示", "请先选择一个备份")
+            return
 
-            # 从配置中移除
-            backup_info = self.backup_config["backups"].pop(backup_index)
-            # 更新合并配置以保持兼容性
-            self.config["backups"] = self.backup_config["backups"]
-            # 保存备份目录配置
-            self.save_backup_config()
+        timestamp = self.backup_tree.item(selected[0], "tags")[0]
+        backup_info = self.engine.find_backup(timestamp)
+        if not backup_info:
+            messagebox.showerror("错误", "找不到备份信息")
+            return
 
-            # 添加日志记录
-            self.add_log("delete", backup_info)
+        def task(job):
+            return self.engine.verify_backup(backup_info, job.progress("正在校验"))
+
+        def on_success(result):
+            if result is None:
+                messagebox.showinfo("提示", "该备份没有完整性清单（在启用完整性清单之前创建），无法校验")
+            elif result["ok"]:
+                self.status_var.set(f"校验通过: {os.path.basename(backup_info['backup_path'])}")
+                messagebox.showinfo("校验", f"备份完好，共校验 {result['checked']} 个文件")
+            else:
+                self.status_var.set(f"校验发现问题: {os.path.basename(backup_info['backup_path'])}")
+                messagebox.showwarning("校验", self.format_verify_result(result))
+
+        self.run_job("校验备份", task, on_success, "校验失败")
+
+    def verify_all_backups(self):
+        """校验当前备份目录中超过一天未校验的备份，可以随时取消，下次从未校验的备份继续"""
+        def task(job):
+            return self.engine.verify_backups(max_age_days=1, progress=job.progress("正在校验全部备份"))
+
+        def on_success(results):
+            failed = [(backup, result) for backup, result in results if not result["ok"]]
+            if not failed:
+                self.status_var.set(f"已校验 {len(results)} 个备份，全部完好")
+                messagebox.showinfo("校验", f"已校验 {len(results)} 个备份，全部完好（一天内校验过的备份已跳过）")
+                return
+            self.status_var.set(f"已校验 {len(results)} 个备份，{len(failed)} 个有问题")
+            details = "\n".join(f"{backup['date']}: {self.format_verify_result(result, 3)}"
+                                 for backup, result in failed[:10])
+            messagebox.showwarning("校验", f"{len(failed)} 个备份有问题:\n{details}")
+
+        self.run_job("校验全部备份", task, on_success, "校验失败")
+
+    def format_verify_result(self, result, limit=10):
+        """校验结果的说明，最多列出 limit 个有问题的文件"""
+        lines = []
+        if result["corrupt"]:
+            lines.append(f"{len(result['corrupt'])} 个文件已损坏")
+        if result["missing"]:
+            lines.append(f"{len(result['missing'])} 个文件丢失")
+        if result["extra"]:
+            lines.append(f"{len(result['extra'])} 个多余文件")
+        if result["error"]:
+            lines.append(f"读取失败: {result['error']}")
+        text = "，".join(lines)
+        bad_files = result["corrupt"] + result["missing"]
+        if bad_files:
+            text += "\n" + "\n".join(bad_files[:limit])
+            if len(bad_files) > limit:
+                text += f"\n... 等 {len(bad_files)} 个文件"
+        return text
 
-            # 更新列表
-            self.update_backup_list()
-            messagebox.showinfo("成功", "备份已删除")
-        except Exception as e:
-            messagebox.showerror("错误", f"删除失败: {str(e)}")
-            
     def delete_backup_folder(self):
         """删除当前备份文件夹及其内容"""
         # 获取当前备份目录
@@ -1174,7 +2000,7 @@ class AutoSaveBackupTool:
             # 创建信息窗口
             info_window = tk.Toplevel(parent_window if parent_window else self.root)
             info_window.title("状态")
-            info_window.geometry("400x300")
+            info_window.geometry("400x340")
             info_window.resizable(False, False)
             info_window.transient(parent_window if parent_window else self.root)  # 设置为主窗口的临时窗口
             info_window.grab_set()  # 模态对话框
@@ -1198,7 +2024,7 @@ class AutoSaveBackupTool:
             info_frame = ttk.Frame(frame)
             info_frame.pack(fill=tk.BOTH, expand=True)
             
-            # 获取目录信息
+            # 获取目录信息（大小等数字来自台账，不遍历目录）
             dir_stats = self.get_directory_stats(directory)
             
             # 显示基本信息
@@ -1207,36 +2033,44 @@ class AutoSaveBackupTool:
             ttk.Label(info_frame, text="目录路径:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
             ttk.Label(info_frame, text=directory, anchor=tk.W, wraplength=350).grid(row=row, column=1, sticky=tk.W, pady=height)
             
-            row += 1
-            ttk.Label(info_frame, text="创建时间:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=dir_stats["created_time"], anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
-            
-            row += 1
-            ttk.Label(info_frame, text="修改时间:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=dir_stats["modified_time"], anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
-            
-            row += 1
-            ttk.Label(info_frame, text="目录大小:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=dir_stats["size"], anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
-            
-            row += 1
-            ttk.Label(info_frame, text="备份数量:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=str(dir_stats["backup_count"]), anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
+            # 其余各行的值在重新统计后需要刷新
+            value_labels = {}
+            for key, text in [("created_time", "创建时间:"), ("modified_time", "修改时间:"), ("size", "目录大小:"),
+                              ("content_size", "备份内容:"), ("backup_count", "备份数量:"), ("log_count", "日志数量:"),
+                              ("file_count", "文件数量:"), ("dir_count", "文件夹数量:"), ("scanned_time", "统计时间:")]:
+                row += 1
+                ttk.Label(info_frame, text=text, anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
+                value_labels[key] = ttk.Label(info_frame, anchor=tk.W)
+                value_labels[key].grid(row=row, column=1, sticky=tk.W, pady=height)
             
-            row += 1
-            ttk.Label(info_frame, text="日志数量:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=str(dir_stats["log_count"]), anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
+            def show_stats(dir_stats):
+                for key, label in value_labels.items():
+                    label.config(text=str(dir_stats[key]))
             
-            row += 1
-            ttk.Label(info_frame, text="文件数量:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=str(dir_stats["file_count"]), anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
+            def rescan():
+                rescan_btn.config(state=tk.DISABLED)
+                for key in ("size", "content_size", "file_count", "dir_count", "scanned_time"):
+                    value_labels[key].config(text="统计中...")
+                
+                def on_finished(job):
+                    # 取消或失败时显示原来的数字
+                    if info_window.winfo_exists():
+                        show_stats(self.get_directory_stats(directory))
+                        rescan_btn.config(state=tk.NORMAL)
+                
+                self.rescan_directory_stats(directory, on_finished)
             
-            row += 1
-            ttk.Label(info_frame, text="文件夹数量:", anchor=tk.W, font=("微软雅黑", 10)).grid(row=row, column=0, sticky=tk.W, pady=height)
-            ttk.Label(info_frame, text=str(dir_stats["dir_count"]), anchor=tk.W).grid(row=row, column=1, sticky=tk.W, pady=height)
+            # 添加按钮
+            button_frame = ttk.Frame(frame)
+            button_frame.pack(pady=20)
+            rescan_btn = ttk.Button(button_frame, text="重新统计", command=rescan)
+            rescan_btn.pack(side=tk.LEFT, padx=5)
+            ttk.Button(button_frame, text="关闭", command=info_window.destroy).pack(side=tk.LEFT, padx=5)
             
-            # 添加关闭按钮
-            ttk.Button(frame, text="关闭", command=info_window.destroy).pack(pady=20)
+            show_stats(dir_stats)
+            # 从未统计过的目录自动在后台完整扫描一次
+            if not dir_stats["scanned"]:
+                rescan()
             
         except Exception as e:
             if parent_window:
@@ -1245,15 +2079,22 @@ class AutoSaveBackupTool:
                 self.status_var.set(f"获取目录信息失败: {str(e)}")
     
     def get_directory_stats(self, directory):
-        """获取目录的统计信息"""
+        """获取目录的统计信息
+
+        大小、文件数和文件夹数来自备份目录的大小台账（见 asbt.ledger），没有台账时为"未统计"，
+        需要调用 rescan_directory_stats 完整扫描
+        """
         stats = {
             "created_time": "",
             "modified_time": "",
-            "size": "0 B",
+            "size": "未统计",
+            "content_size": "-",
             "backup_count": 0,
             "log_count": 0,
-            "file_count": 0,
-            "dir_count": 0
+            "file_count": "-",
+            "dir_count": "-",
+            "scanned_time": "-",
+            "scanned": False,
         }
         
         try:
@@ -1268,40 +2109,78 @@ class AutoSaveBackupTool:
                 stats["created_time"] = created_time
                 stats["modified_time"] = modified_time
             
-            # 计算目录大小和文件数量
-            total_size = 0
-            file_count = 0
-            dir_count = 0
-            
-            for root, dirs, files in os.walk(directory):
-                dir_count += len(dirs)
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.exists(file_path) and os.path.isfile(file_path):
-                        file_count += 1
-                        total_size += os.path.getsize(file_path)
-            
-            # 转换大小为可读格式
-            size_str = self.format_size(total_size)
-            stats["size"] = size_str
-            stats["file_count"] = file_count
-            stats["dir_count"] = dir_count
+            # 目录大小和文件数量：完整扫描一次后，每次备份和删除时增量更新
+            ledger = get_ledger(directory).get()
+            if ledger is not None:
+                stats["size"] = self.format_size(ledger["bytes"])
+                stats["file_count"] = ledger["files"]
+                stats["dir_count"] = ledger["dirs"]
+                if ledger["content_bytes"]:
+                    # 去重、增量和压缩后，目录实际大小会小于备份内容的原始大小
+                    stats["content_size"] = f"{self.format_size(ledger['content_bytes'])}（原始大小）"
+                scanned_time = datetime.fromtimestamp(ledger["scanned_at"]).strftime("%Y-%m-%d %H:%M:%S")
+                stats["scanned_time"] = f"{scanned_time}（之后增量更新）"
+                stats["scanned"] = True
             
             # 获取备份和日志数量
-            config_file = os.path.join(directory, "config.json")
-            if os.path.exists(config_file):
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                    if "backups" in config_data:
-                        stats["backup_count"] = len(config_data["backups"])
-                    if "logs" in config_data:
-                        stats["log_count"] = len(config_data["logs"])
+            stats["backup_count"], stats["log_count"] = self.get_record_counts(directory)
         
         except Exception as e:
             print(f"获取目录统计信息失败: {str(e)}")
         
         return stats
     
+    def is_current_backup_dir(self, directory):
+        current = self.global_config["backup_dir"]
+        return bool(current) and os.path.normcase(os.path.abspath(current)) == os.path.normcase(os.path.abspath(directory))
+    
+    def get_backup_records(self, directory):
+        """读取备份目录的备份配置，当前备份目录直接使用内存中的配置"""
+        if self.is_current_backup_dir(directory):
+            return self.backup_config
+        journal = get_journal(directory)
+        if journal.exists():
+            return journal.load()
+        return {"backups": [], "logs": []}
+    
+    def get_record_counts(self, directory):
+        """返回 (备份数量, 日志数量)，其他备份目录有 SQLite 目录时直接查询，不解析 config.json"""
+        if not self.is_current_backup_dir(directory) and self.global_config.get("use_catalog"):
+            catalog = get_catalog(directory)
+            if catalog is not None and os.path.exists(catalog.db_file):
+                try:
+                    return catalog.count_backups(), catalog.count_logs()
+                except Exception as e:
+                    print(f"查询备份目录数据库失败: {str(e)}")
+        records = self.get_backup_records(directory)
+        return len(records["backups"]), len(records["logs"])
+    
+    def rescan_directory_stats(self, directory, on_finished=None):
+        """在后台完整扫描备份目录，重建大小台账，返回 Job
+
+        参数:
+            on_finished: on_finished(job)，无论成功、失败或取消，结束后在主线程中调用
+        """
+        def task(job):
+            # 用 os.scandir 遍历，DirEntry 自带文件类型，比 os.walk 加 getsize 少很多系统调用
+            scan = scan_directory(directory, job.progress("正在扫描备份目录"))
+            job.report("正在统计备份内容", 0, 0)
+            # 备份内容的原始大小：优先使用备份记录，压缩归档可直接读取归档头部
+            content_bytes = 0
+            for backup_info in self.get_backup_records(directory)["backups"]:
+                size = snapshot_content_size(backup_info)
+                if size:
+                    content_bytes += size
+            # 持有 engine_lock，扫描期间不会有快照被创建或删除，台账与磁盘一致
+            get_ledger(directory).reset(dict(scan, content_bytes=content_bytes))
+            return scan
+        
+        return self.run_job("统计备份目录", task, error_text="统计失败", on_finished=on_finished)
+    
+    def format_throughput(self, stats):
+        """将吞吐量转换为可读格式"""
+        return format_throughput(stats)
+
     def format_size(self, size_bytes):
         """将字节大小转换为可读格式"""
         if size_bytes < 1024:
@@ -1456,7 +2335,7 @@ class AutoSaveBackupTool:
                                 self.config["logs"] = old_config["logs"]
                             
                             # 保存备份配置
-                            self.save_backup_config()
+                            self.save_backup_config(replaced=True)
                             messagebox.showinfo("配置迁移", "已成功导入旧版本配置并迁移历史记录和日志到备份目录")
                         else:
                             messagebox.showinfo("配置迁移", "已成功导入旧版本配置")
@@ -1510,23 +2389,51 @@ class AutoSaveBackupTool:
             return
             
         self.backup_config_file = os.path.join(self.global_config["backup_dir"], "config.json")
-        
-        if os.path.exists(self.backup_config_file):
-            try:
-                with open(self.backup_config_file, 'r', encoding='utf-8') as f:
-                    loaded_config = json.load(f)
-                    # 更新备份配置
-                    for key, value in loaded_config.items():
-                        if key in self.backup_config:
-                            self.backup_config[key] = value
-                    
-                    # 更新合并配置
-                    self.config.update(self.backup_config)
-            except Exception as e:
-                messagebox.showerror("错误", f"加载备份目录配置失败: {str(e)}")
+        try:
+            # 读取 config.json 并重放 journal 中之后的记录
+            self.engine.load_backup_config()
+            # 更新合并配置
+            self.config.update(self.backup_config)
+        except Exception as e:
+            messagebox.showerror("错误", f"加载备份目录配置失败: {str(e)}")
     
-    def save_backup_config(self):
-        """保存备份目录特定的配置文件"""
+    def load_backup_config_async(self):
+        """在后台任务中读取备份目录配置，完成后在主线程中启动路径缓存校验并刷新备份列表
+
+        备份记录很多时读取和重放 journal 需要几秒，放在后台执行界面不会卡住；
+        后台任务持有 engine_lock，读取完成前开始的备份和还原会等待读取完成
+        """
+        def on_finished(job):
+            if job is not None and job.state == Job.CANCELLED:
+                # 读取被取消时改为直接读取，否则之后保存配置会用空的记录覆盖备份目录的配置
+                self.load_backup_config()
+            self.config.update(self.backup_config)
+            # 路径存在性缓存和后台校验
+            self.apply_stat_cache_settings()
+            if not self.list_pending:
+                self.update_backup_list()
+            if self.is_log_window_open():
+                self.log_list.reset()
+
+        if not self.global_config["backup_dir"]:
+            on_finished(None)
+            return
+        self.backup_config_file = os.path.join(self.global_config["backup_dir"], "config.json")
+        self.run_job("读取备份记录", lambda job: self.engine.load_backup_config(),
+                     error_text="加载备份目录配置失败", on_finished=on_finished)
+
+    def on_first_map(self, event):
+        """最小化启动后窗口第一次显示时填充备份列表"""
+        if event.widget is self.root and self.list_pending:
+            self.list_pending = False
+            self.update_backup_list()
+
+    def save_backup_config(self, replaced=False):
+        """保存备份目录特定的配置文件
+
+        完整写入 config.json 并清空 journal（压缩），单条记录的变化由引擎追加到 journal。
+        replaced 见 asbt.engine.BackupEngine.save_backup_config
+        """
         if not self.global_config["backup_dir"] or not os.path.exists(self.global_config["backup_dir"]):
             self.status_var.set("未设置备份目录或目录不存在，无法保存配置")
             return
@@ -1535,8 +2442,7 @@ class AutoSaveBackupTool:
             self.backup_config_file = os.path.join(self.global_config["backup_dir"], "config.json")
             
         try:
-            with open(self.backup_config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.backup_config, f, ensure_ascii=False, indent=2)
+            self.engine.save_backup_config(replaced)
             # 更新状态栏
             self.status_var.set(f"已保存备份配置到: {self.backup_config_file}")
         except Exception as e:
@@ -1561,42 +2467,44 @@ class AutoSaveBackupTool:
         
         # 保存配置
         self.save_global_config()
-        self.save_backup_config()
+        self.save_backup_config(replaced=True)
         
         # 更新状态栏
         self.status_var.set("已保存所有配置文件")
             
-    def add_log(self, action_type, backup_info):
-        """添加日志记录
-        
-        参数:
-            action_type: 操作类型，可以是 'backup', 'restore', 'delete', 'restore_deleted', 'rollback'
-            backup_info: 备份信息字典
-        """
-        log_entry = {
-            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:19],  # 取前19位，包含到毫秒级别
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "action": action_type,
-            "backup_info": copy.deepcopy(backup_info)
-        }
-        
-        # 添加到备份配置中的日志列表
-        self.backup_config["logs"].append(log_entry)
-        # 更新合并配置以保持兼容性
-        self.config["logs"] = self.backup_config["logs"]
-        # 保存备份目录配置
-        self.save_backup_config()
+    def format_log_action(self, log):
+        """日志列表中显示的操作类型"""
+        action_text = self.ACTION_NAMES.get(log["action"], log["action"])
+        if log["action"] == "skip":
+            skipped = log["backup_info"].get("changes", {}).get("skipped", 1)
+            if skipped > 1:
+                action_text = f"{action_text} ×{skipped}"
+        return action_text
+    
+    def make_log_row(self, log):
+        """日志列表中的一行"""
+        backup_info = log["backup_info"]
+        if log["action"] == "prune":
+            display_name = f"{len(backup_info.get('pruned', []))} 个旧备份"
+        else:
+            is_directory = backup_info.get("is_directory", False)
+            type_indicator = "[文件夹]" if is_directory else "[文件]"
+            filename = os.path.basename(backup_info["backup_path"])
+            display_name = f"{type_indicator} {filename}"
         
-        # 更新状态栏
-        action_map = {
-            "backup": "备份",
-            "restore": "还原",
-            "delete": "删除",
-            "restore_deleted": "恢复删除的备份",
-            "rollback": "回溯操作"
-        }
-        action_text = action_map.get(action_type, action_type)
-        self.status_var.set(f"已记录{action_text}操作到日志")
+        return (log["date"], self.format_log_action(log), display_name), log["timestamp"]
+
+    def is_log_window_open(self):
+        return hasattr(self, 'log_tree') and self.log_tree.winfo_exists()
+
+    def refresh_log_row(self, log, added):
+        """日志窗口已打开时，插入新日志或刷新已显示的日志"""
+        if not self.is_log_window_open():
+            return
+        if added:
+            self.log_list.prepend(log)
+        else:
+            self.log_list.update(log)
     
     def show_logs(self):
         """显示日志窗口"""
@@ -1630,27 +2538,10 @@ class AutoSaveBackupTool:
         # 添加滚动条
         scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.log_tree.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.log_tree.configure(yscrollcommand=scrollbar.set)
-        
-        # 添加日志记录到列表
-        for log in reversed(self.backup_config["logs"]):
-            action_map = {
-                "backup": "备份",
-                "restore": "还原",
-                "delete": "删除",
-                "restore_deleted": "恢复删除的备份",
-                "rollback": "回溯操作"
-            }
-            action_text = action_map.get(log["action"], log["action"])
-            
-            backup_info = log["backup_info"]
-            is_directory = backup_info.get("is_directory", False)
-            type_indicator = "[文件夹]" if is_directory else "[文件]"
-            filename = os.path.basename(backup_info["backup_path"])
-            display_name = f"{type_indicator} {filename}"
-            
-            self.log_tree.insert("", tk.END, values=(log["date"], action_text, display_name),
-                                tags=(log["timestamp"],))
+        
+        # 分页加载日志，滚动到底部时再读取更早的日志
+        self.log_list = PagedTree(self.log_tree, scrollbar, self.engine.fetch_logs, self.make_log_row)
+        self.log_list.reset()
         
         # 添加右键菜单
         self.log_context_menu = tk.Menu(log_window, tearoff=0)
@@ -1683,21 +2574,16 @@ class AutoSaveBackupTool:
         timestamp = self.log_tree.item(selected[0], "tags")[0]
         
         # 查找对应的日志信息
-        log_entry = None
-        for log in self.config["logs"]:
-            if log["timestamp"] == timestamp:
-                log_entry = log
-                break
+        log_entry = self.engine.find_log(timestamp)
         
         if not log_entry:
             messagebox.showerror("错误", "找不到日志信息")
             return
         
         backup_info = log_entry["backup_info"]
-        backup_path = backup_info["backup_path"]
         
         # 检查备份文件是否存在
-        if not os.path.exists(backup_path):
+        if not snapshot_exists(backup_info):
             messagebox.showerror("错误", "备份文件已不存在")
             return
         
@@ -1715,11 +2601,7 @@ class AutoSaveBackupTool:
         timestamp = self.log_tree.item(selected[0], "tags")[0]
         
         # 查找对应的日志信息
-        log_entry = None
-        for log in self.config["logs"]:
-            if log["timestamp"] == timestamp:
-                log_entry = log
-                break
+        log_entry = self.engine.find_log(timestamp)
         
         if not log_entry:
             messagebox.showerror("错误", "找不到日志信息")
@@ -1732,15 +2614,17 @@ class AutoSaveBackupTool:
         if action_type == "delete":
             # 对于删除操作，恢复被删除的备份
             self.rollback_delete_action(backup_info)
-        elif action_type == "backup" or action_type == "restore":
+        elif action_type in ("backup", "restore", "skip"):
             # 对于备份或还原操作，恢复到该操作时的文件状态
             self.rollback_to_file_state(backup_info)
+        elif action_type == "prune":
+            messagebox.showinfo("提示", "清理旧备份的操作无法回溯")
     
     def rollback_delete_action(self, backup_info):
         """回溯删除操作，恢复被删除的备份"""
         # 检查备份路径是否已存在
         backup_path = backup_info["backup_path"]
-        if os.path.exists(backup_path):
+        if snapshot_exists(backup_info):
             messagebox.showinfo("提示", "该备份文件已存在，无需恢复")
             return
         
@@ -1749,47 +2633,28 @@ class AutoSaveBackupTool:
         if not confirm:
             return
         
-        try:
-            # 获取备份信息
-            is_directory = backup_info.get("is_directory", False)
-            original_path = backup_info["original"]
-            timestamp = backup_info["timestamp"]
-            date = backup_info["date"]
-            
-            # 重新创建备份目录结构
-            backup_dir = os.path.dirname(backup_path)
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
-            
-            # 从原始文件创建新的备份
-            if os.path.exists(original_path):
-                if is_directory:
-                    shutil.copytree(original_path, backup_path)
-                else:
-                    shutil.copy2(original_path, backup_path)
-                
-                # 将备份信息重新添加到配置中
-                self.config["backups"].append(backup_info)
-                
-                # 添加日志记录
-                self.add_log("restore_deleted", backup_info)
-                
-                self.save_config()
-                self.update_backup_list()
-                
-                messagebox.showinfo("成功", "已恢复被删除的备份")
-                self.status_var.set(f"已恢复被删除的备份: {os.path.basename(backup_path)}")
-            else:
-                messagebox.showerror("错误", "原始文件不存在，无法恢复备份")
-        except Exception as e:
-            messagebox.showerror("错误", f"恢复备份失败: {str(e)}")
+        # 需要从原始文件创建新的备份
+        if not os.path.exists(backup_info["original"]):
+            messagebox.showerror("错误", "原始文件不存在，无法恢复备份")
+            return
+
+        def task(job):
+            # 按原备份的存储模式重新创建
+            self.engine.restore_deleted_backup(backup_info, job.progress("正在重新创建备份"))
+
+        def on_success(result):
+            self.backup_list.prepend(backup_info)
+            messagebox.showinfo("成功", "已恢复被删除的备份")
+            self.status_var.set(f"已恢复被删除的备份: {os.path.basename(backup_path)}")
+
+        self.run_job("恢复删除的备份", task, on_success, "恢复备份失败")
     
     def rollback_to_file_state(self, backup_info):
         """回溯到备份或还原操作时的文件状态"""
         backup_path = backup_info["backup_path"]
         
         # 检查备份文件是否存在
-        if not os.path.exists(backup_path):
+        if not snapshot_exists(backup_info):
             messagebox.showerror("错误", "备份文件已不存在，无法回溯")
             return
         
@@ -1798,34 +2663,17 @@ class AutoSaveBackupTool:
         if not confirm:
             return
         
-        try:
-            # 先备份当前文件或文件夹
-            self.perform_backup()
-            
-            # 获取是否为目录的信息
-            is_directory = backup_info.get("is_directory", False)
-            original_path = backup_info["original"]
-            
-            # 如果目标路径存在，先删除
-            if os.path.exists(original_path):
-                if is_directory:
-                    shutil.rmtree(original_path)
-                else:
-                    os.remove(original_path)
-            
-            # 还原备份
-            if is_directory:
-                shutil.copytree(backup_path, original_path)
-            else:
-                shutil.copy2(backup_path, original_path)
-            
-            # 添加日志记录
-            self.add_log("rollback", backup_info)
-            
+        def task(job):
+            # 先备份当前文件或文件夹，再还原；还原开始后不能取消
+            return self.engine.restore_backup(backup_info, "rollback",
+                                              backup_progress=job.progress("正在备份当前存档"),
+                                              restore_progress=job.progress("正在回溯", cancellable=False))
+
+        def on_success(rollback_throughput):
             messagebox.showinfo("成功", "已回溯到所选操作时的文件状态")
-            self.status_var.set(f"已回溯: {os.path.basename(backup_path)}")
-        except Exception as e:
-            messagebox.showerror("错误", f"回溯失败: {str(e)}")
+            self.status_var.set(f"已回溯: {os.path.basename(backup_path)}（{self.format_throughput(rollback_throughput)}）")
+
+        self.run_job("回溯", task, on_success, "回溯失败")
     
     def show_file_info(self, backup_info, action_type):
         """显示文件信息窗口"""
@@ -1848,12 +2696,7 @@ class AutoSaveBackupTool:
         info_frame.pack(fill=tk.X, pady=5)
         
         # 操作类型
-        action_map = {
-            "backup": "备份",
-            "restore": "还原",
-            "delete": "删除"
-        }
-        action_text = action_map.get(action_type, action_type)
+        action_text = self.ACTION_NAMES.get(action_type, action_type)
         
         ttk.Label(info_frame, text=f"操作类型: {action_text}").grid(row=0, column=0, sticky=tk.W, pady=2)
         ttk.Label(info_frame, text=f"操作时间: {backup_info['date']}").grid(row=1, column=0, sticky=tk.W, pady=2)
@@ -1877,12 +2720,109 @@ class AutoSaveBackupTool:
         backup_entry.insert(0, backup_info["backup_path"])
         backup_entry.config(state="readonly")
         
+        # 文件变化情况（增量备份时记录）
+        changes = backup_info.get("changes")
+        if changes:
+            if changes.get("mode") == "skip":
+                changes_text = f"源文件未变化，已跳过 {changes.get('skipped', 1)} 次"
+            else:
+                changes_text = (f"新增 {changes['added']}，修改 {changes['modified']}，删除 {changes['removed']}，"
+                                f"未变化 {changes['unchanged']}；复制 {changes['copied']}，复用 {changes['reused']}")
+            ttk.Label(info_frame, text=f"文件变化: {changes_text}").grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 块级增量快照的数据块信息
+        if get_format(backup_info) == FORMAT_DELTA and "block_count" in backup_info:
+            frame_type = "关键帧" if backup_info.get("keyframe") else f"增量（链长 {backup_info['delta_depth']}）"
+            delta_text = (f"{frame_type}，保存 {backup_info['changed_blocks']}/{backup_info['block_count']} 个数据块，"
+                          f"{self.format_size(backup_info['stored_bytes'])}")
+            ttk.Label(info_frame, text=f"块级增量: {delta_text}").grid(row=6, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 压缩归档的成员数量和压缩率
+        if get_format(backup_info) == FORMAT_ARCHIVE and "total_bytes" in backup_info:
+            ratio = backup_info["stored_bytes"] / backup_info["total_bytes"] * 100 if backup_info["total_bytes"] else 100
+            archive_text = (f"{backup_info['archive_type']}，{backup_info['file_count']} 个文件，"
+                            f"原始 {self.format_size(backup_info['total_bytes'])}，"
+                            f"压缩后 {self.format_size(backup_info['stored_bytes'])}（{ratio:.1f}%）")
+            ttk.Label(info_frame, text=f"压缩归档: {archive_text}").grid(row=6, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 备份或还原的吞吐量
+        if "throughput" in backup_info:
+            throughput_text = f"用时 {backup_info['throughput']['seconds']} 秒，{self.format_throughput(backup_info['throughput'])}"
+            ttk.Label(info_frame, text=f"吞吐量: {throughput_text}").grid(row=7, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 完整复制时探测到的复制方式，以及各方式实际复制的文件数
+        if "copy_strategy" in backup_info:
+            methods_text = "，".join(f"{self.COPY_METHOD_NAMES.get(name, name)} {count}"
+                                    for name, count in backup_info.get("copy_methods", {}).items())
+            strategy_text = self.COPY_METHOD_NAMES.get(backup_info["copy_strategy"], backup_info["copy_strategy"])
+            ttk.Label(info_frame, text=f"复制方式: {strategy_text}（{methods_text}）").grid(row=8, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 一致性模式的检查结果
+        consistency = backup_info.get("consistency")
+        if consistency:
+            if not consistency["stable"]:
+                consistency_text = f"重试 {consistency['rounds'] - 1} 轮后源文件仍在变化，备份可能不完整"
+            elif consistency["retried"]:
+                consistency_text = f"复制期间变化的 {consistency['retried']} 个文件已重新复制"
+            else:
+                consistency_text = "复制期间源文件没有变化"
+            ttk.Label(info_frame, text=f"一致性检查: {consistency_text}").grid(row=9, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 还原和回溯时实际写入、删除的文件数
+        restore_changes = backup_info.get("restore_changes")
+        if restore_changes:
+            if restore_changes["mode"] == "full":
+                restore_text = f"完整还原 {restore_changes['files']} 个文件"
+            else:
+                restore_text = (f"差异还原，写入 {restore_changes['files']} 个文件，删除 {restore_changes['removed']} 个，"
+                                f"{restore_changes['unchanged']} 个未变化")
+            ttk.Label(info_frame, text=f"还原方式: {restore_text}").grid(row=11, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 备份或还原各阶段的用时和吞吐量
+        timing = backup_info.get("timing")
+        if timing:
+            timing_text = format_timing(timing)
+            if timing.get("profile"):
+                timing_text += f"\n性能分析: {timing['profile']}"
+            ttk.Label(info_frame, text=f"各阶段用时: {timing_text}", wraplength=560,
+                      justify=tk.LEFT).grid(row=12, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 完整性清单和最近一次校验的结果
+        integrity = (load_integrity(backup_info["backup_path"])
+                     if backup_info.get("backup_path") and "pruned" not in backup_info else None)
+        if integrity:
+            integrity_text = f"{len(integrity['files'])} 个文件（{integrity['algorithm']}）"
+            last_result = integrity.get("last_result")
+            if last_result is None:
+                integrity_text += "，尚未校验"
+            else:
+                verified_date = datetime.fromtimestamp(integrity["verified_at"]).strftime("%Y-%m-%d %H:%M:%S")
+                integrity_text += f"，{verified_date} 校验{'通过' if last_result['ok'] else '发现问题'}"
+            ttk.Label(info_frame, text=f"完整性清单: {integrity_text}").grid(row=10, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 清理旧备份的日志，列出被清理的备份
+        if "pruned" in backup_info:
+            pruned_frame = ttk.LabelFrame(main_frame, text=f"已清理的备份（{len(backup_info['pruned'])} 个）", padding="10")
+            pruned_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+            
+            pruned_text = tk.Text(pruned_frame, wrap=tk.WORD, height=10)
+            pruned_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            
+            # 添加滚动条
+            scrollbar = ttk.Scrollbar(pruned_frame, orient=tk.VERTICAL, command=pruned_text.yview)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            pruned_text.configure(yscrollcommand=scrollbar.set)
+            
+            for item in backup_info["pruned"]:
+                pruned_text.insert(tk.END, f"{item['date']}  {os.path.basename(item['backup_path'])}\n")
+            if backup_info.get("freed_bytes"):
+                pruned_text.insert(tk.END, f"\n释放空间: {self.format_size(backup_info['freed_bytes'])}\n")
+            pruned_text.config(state=tk.DISABLED)  # 设置为只读
         # 添加文件内容预览（如果是文本文件）
-        if not is_directory and os.path.exists(backup_info["backup_path"]):
+        elif not is_directory and snapshot_exists(backup_info):
             try:
                 # 尝试读取文件内容（仅适用于文本文件）
-                with open(backup_info["backup_path"], "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read(2000)  # 只读取前2000个字符
+                content = read_snapshot_text(backup_info, 2000)  # 只读取前2000个字符
                 
                 # 创建内容预览区域
                 content_frame = ttk.LabelFrame(main_frame, text="文件内容预览", padding="10")
@@ -1916,10 +2856,9 @@ class AutoSaveBackupTool:
             
             # 列出目录内容
             try:
-                dir_content = os.listdir(backup_info["backup_path"])
-                for item in dir_content:
-                    item_path = os.path.join(backup_info["backup_path"], item)
-                    if os.path.isdir(item_path):
+                dir_content = list_snapshot_dir(backup_info)
+                for item, item_is_dir in dir_content:
+                    if item_is_dir:
                         dir_text.insert(tk.END, f"[目录] {item}\n")
                     else:
                         dir_text.insert(tk.END, f"[文件] {item}\n")
@@ -1947,5 +2886,6 @@ class AutoSaveBackupTool:
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = AutoSaveBackupTool(root)
+    # --minimized: 启动时最小化，窗口第一次显示时才填充备份列表（如开机自启动时使用）
+    app = AutoSaveBackupTool(root, start_minimized="--minimized" in sys.argv[1:])
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,418 @@
+"""备份引擎的性能基准测试
+
+不需要图形界面，在临时目录中生成模拟存档（大量小文件 / 少量大文件 / 深层嵌套）和
+1 万到 100 万条记录的备份历史，分别计时引擎的各项操作，结果输出为 JSON，可以在不同版本之间比较。
+
+    python benchmarks/bench.py --quick                      # 快速运行（小数据量）
+    python benchmarks/bench.py --output new.json            # 完整运行并保存结果
+    python benchmarks/bench.py --repo ../asbt-v0.6 --output old.json   # 测试另一个版本的代码
+    python benchmarks/bench.py --compare old.json new.json  # 比较两次结果，变慢超过阈值时返回 1
+
+旧版本中不存在的操作会记录为跳过，不影响其他项目。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import importlib
+import platform
+import tempfile
+import statistics
+import subprocess
+
+SCHEMA_VERSION = 1
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 模拟存档：(名称, 完整运行的参数, 快速运行的参数)
+TREES = {
+    "small_files": ({"files": 5000, "size": 4096, "dirs": 50}, {"files": 500, "size": 4096, "dirs": 10}),
+    "huge_files": ({"files": 3, "size": 64 * 1024 * 1024, "dirs": 1}, {"files": 2, "size": 8 * 1024 * 1024, "dirs": 1}),
+    "deep_nesting": ({"files": 400, "size": 8192, "depth": 40}, {"files": 100, "size": 8192, "depth": 20}),
+}
+FORMATS = ["copy", "manifest", "archive"]
+HISTORY_SIZES = [10000, 100000, 1000000]
+QUICK_HISTORY_SIZES = [10000]
+# 每次增量备份和还原前修改的文件比例
+CHANGE_RATIO = 0.01
+PAGE_SIZE = 200
+
+
+class Skipped(Exception):
+    """当前版本不支持该操作"""
+
+
+def git_revision(repo):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def drop_modules():
+    """卸载已导入的 asbt 模块（各目录的单例会缓存状态）"""
+    for name in list(sys.modules):
+        if name == "asbt" or name.startswith("asbt."):
+            del sys.modules[name]
+
+
+# ---- 生成测试数据 ----
+
+def _write_random(path, size, rng):
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 1024 * 1024)
+            f.write(rng.randbytes(chunk))
+            remaining -= chunk
+
+
+def generate_tree(root, spec, seed=0):
+    """生成模拟存档，返回文件路径列表"""
+    rng = random.Random(seed)
+    os.makedirs(root)
+    paths = []
+    if "depth" in spec:
+        directory = root
+        dirs = []
+        for level in range(spec["depth"]):
+            directory = os.path.join(directory, f"level{level}")
+            dirs.append(directory)
+        os.makedirs(directory)
+        for i in range(spec["files"]):
+            paths.append(os.path.join(dirs[i % len(dirs)], f"file{i}.dat"))
+    else:
+        for d in range(spec["dirs"]):
+            os.makedirs(os.path.join(root, f"dir{d}"))
+        for i in range(spec["files"]):
+            paths.append(os.path.join(root, f"dir{i % spec['dirs']}", f"file{i}.dat"))
+    for path in paths:
+        _write_random(path, spec["size"], rng)
+    return paths
+
+
+def modify_files(paths, ratio, seed):
+    """改写一部分文件（大小不变，内容和修改时间变化）"""
+    rng = random.Random(seed)
+    count = max(1, int(len(paths) * ratio))
+    for path in rng.sample(paths, count):
+        with open(path, "r+b") as f:
+            f.write(rng.randbytes(64))
+    return count
+
+
+def generate_history(count, backup_dir):
+    """生成有 count 条日志、count // 10 个备份的备份配置"""
+    backups = []
+    logs = []
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    for i in range(count):
+        moment = base + i * 60
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(moment)) + f"_{i % 1000:03d}"
+        date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(moment))
+        record = {
+            "timestamp": timestamp,
+            "original": "/saves/game",
+            "backup_path": os.path.join(backup_dir, f"game_{timestamp}"),
+            "is_directory": True,
+            "date": date,
+            "format": "copy",
+        }
+        if i % 10 == 0:
+            backups.append(record)
+        logs.append({"timestamp": timestamp, "date": date, "action": "backup", "backup_info": record})
+    return {"backups": backups, "logs": logs}
+
+
+# ---- 计时 ----
+
+class Runner:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = []
+
+    def wanted(self, name):
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def might_want(self, group):
+        """一组项目（模拟存档或备份历史）中是否可能有需要运行的项目，用于跳过生成测试数据"""
+        prefixes = tuple(TREES) + ("history_",)
+        return not self.only or any(group in pattern or pattern in group or not pattern.startswith(prefixes)
+                                    for pattern in self.only)
+
+    def record(self, name, runs, **extra):
+        result = {
+            "name": name,
+            "seconds": statistics.median(runs),
+            "min": min(runs),
+            "runs": [round(run, 6) for run in runs],
+        }
+        result.update(extra)
+        self.results.append(result)
+        print(f"  {name:<55} {result['seconds'] * 1000:10.1f} ms", flush=True)
+
+    def skip(self, name, reason):
+        self.results.append({"name": name, "skipped": reason})
+        print(f"  {name:<55} 跳过: {reason}", flush=True)
+
+    def once(self, name, func, **extra):
+        """只运行一次（会修改状态的操作，如备份）"""
+        if not self.wanted(name):
+            return None
+        try:
+            start = time.perf_counter()
+            value = func()
+            self.record(name, [time.perf_counter() - start], **extra)
+            return value
+        except (Skipped, AttributeError, TypeError, ImportError) as e:
+            self.skip(name, str(e) or type(e).__name__)
+            return None
+
+    def repeated(self, name, func, setup=None, **extra):
+        """运行 repeat 次，取中位数；setup 在每次运行前执行，不计入时间"""
+        if not self.wanted(name):
+            return
+        runs = []
+        try:
+            for _ in range(self.repeat):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                func()
+                runs.append(time.perf_counter() - start)
+        except (Skipped, AttributeError, TypeError, ImportError) as e:
+            self.skip(name, str(e) or type(e).__name__)
+            return
+        self.record(name, runs, **extra)
+
+
+def make_engine(source_path, backup_dir, store_mode, is_directory=True, **overrides):
+    from asbt.engine import BackupEngine, default_settings
+
+    settings = default_settings()
+    settings.update(source_path=source_path, is_directory=is_directory, backup_dir=backup_dir, store_mode=store_mode,
+                    **overrides)
+    os.makedirs(backup_dir, exist_ok=True)
+    engine = BackupEngine(settings)
+    engine.load_backup_config()
+    return engine
+
+
+def bench_tree(runner, work_dir, tree_name, spec):
+    """在一个模拟存档上测试各存储模式的备份、还原和目录统计"""
+    from asbt.engine import BackupEngine
+    from asbt.ledger import get_ledger, scan_directory
+
+    source = os.path.join(work_dir, tree_name)
+    paths = generate_tree(source, spec)
+    file_count = len(paths)
+    total_bytes = file_count * spec["size"]
+    size = {"files": file_count, "bytes": total_bytes}
+    print(f"{tree_name}: {file_count} 个文件，{total_bytes / 1024 / 1024:.1f} MB", flush=True)
+
+    for fmt in FORMATS:
+        prefix = f"{tree_name}.{fmt}"
+        if not runner.might_want(prefix):
+            continue
+        backup_dir = os.path.join(work_dir, f"backups_{tree_name}_{fmt}")
+        engine = make_engine(source, backup_dir, fmt)
+        runner.once(f"{prefix}.backup_full", engine.perform_backup, **size)
+        changed = modify_files(paths, CHANGE_RATIO, seed=1)
+        runner.once(f"{prefix}.backup_incremental", engine.perform_backup, changed_files=changed, **size)
+        runner.once(f"{prefix}.backup_unchanged", lambda: engine.perform_backup(skip_unchanged=True), **size)
+
+        latest = engine.backup_config["backups"][-1]
+        if hasattr(BackupEngine, "verify_backup"):
+            runner.once(f"{prefix}.verify", lambda: engine.verify_backup(latest), **size)
+        else:
+            runner.skip(f"{prefix}.verify", "该版本没有 verify_backup")
+
+        # 还原最新的备份：先改动一部分当前文件，还原时不再备份当前文件，只测还原本身
+        def restore(full):
+            def run():
+                try:
+                    return engine.restore_backup(latest, pre_backup=False, full=full)
+                except TypeError:
+                    if not full:
+                        raise Skipped("该版本没有差异还原")
+                    return engine.restore_backup(latest, pre_backup=False)
+            return run
+
+        runner.repeated(f"{prefix}.restore_differential", restore(False),
+                        setup=lambda: modify_files(paths, CHANGE_RATIO, seed=2), **size)
+        runner.repeated(f"{prefix}.restore_full", restore(True),
+                        setup=lambda: modify_files(paths, CHANGE_RATIO, seed=3), **size)
+        runner.repeated(f"{prefix}.restore_with_pre_backup",
+                        lambda: engine.restore_backup(latest),
+                        setup=lambda: modify_files(paths, CHANGE_RATIO, seed=4), **size)
+
+        # 历史备份目录的"状态"：完整扫描一次（之后由台账增量维护）
+        def dir_stats():
+            ledger = get_ledger(backup_dir)
+            ledger.reset(scan_directory(backup_dir))
+            ledger.get()
+
+        runner.repeated(f"{prefix}.dir_stats_scan", dir_stats)
+        runner.repeated(f"{prefix}.dir_stats_ledger", lambda: get_ledger(backup_dir).get())
+        shutil.rmtree(backup_dir)
+
+    # 单个大文件的块级增量
+    if tree_name == "huge_files":
+        prefix = f"{tree_name}.delta"
+        backup_dir = os.path.join(work_dir, "backups_delta")
+        engine = make_engine(paths[0], backup_dir, "delta", is_directory=False)
+        single = {"files": 1, "bytes": spec["size"]}
+        runner.once(f"{prefix}.backup_full", engine.perform_backup, **single)
+        modify_files(paths[:1], 1, seed=5)
+        runner.once(f"{prefix}.backup_incremental", engine.perform_backup, **single)
+        shutil.rmtree(backup_dir)
+    shutil.rmtree(source)
+
+
+def bench_history(runner, work_dir, count):
+    """在有 count 条日志的备份目录上测试加载、列表分页、查找和保存"""
+    from asbt.journal import get_journal
+
+    print(f"history_{count}: {count} 条日志，{count // 10} 个备份", flush=True)
+    for catalog in (True, False):
+        backup_dir = os.path.join(work_dir, f"history_{count}_{'catalog' if catalog else 'memory'}")
+        os.makedirs(backup_dir)
+        config = generate_history(count, backup_dir)
+        get_journal(backup_dir).compact(config)
+        prefix = f"history_{count}.{'catalog' if catalog else 'memory'}"
+
+        # 第一次加载会导入 SQLite 目录
+        engine = runner.once(f"{prefix}.load_first", lambda: make_engine("/saves/game", backup_dir, "copy",
+                                                                         use_catalog=catalog), records=count)
+        if engine is None:
+            engine = make_engine("/saves/game", backup_dir, "copy", use_catalog=catalog)
+
+        def reload():
+            drop_modules()
+            make_engine("/saves/game", backup_dir, "copy", use_catalog=catalog)
+
+        runner.repeated(f"{prefix}.load", reload, records=count)
+
+        # 刷新备份列表：读取第一页并检查每个备份是否存在（同界面的 update_backup_list）
+        def list_page(offset):
+            def run():
+                from asbt.snapshot import snapshot_exists
+                for backup in engine.fetch_backups(offset, PAGE_SIZE):
+                    snapshot_exists(backup, cached=True)
+            return run
+
+        backup_count = len(engine.backup_config["backups"])
+        runner.repeated(f"{prefix}.list_first_page", list_page(0), records=count)
+        runner.repeated(f"{prefix}.list_last_page", list_page(max(0, backup_count - PAGE_SIZE)), records=count)
+        runner.repeated(f"{prefix}.logs_first_page", lambda: engine.fetch_logs(0, PAGE_SIZE), records=count)
+
+        rng = random.Random(0)
+        timestamps = [b["timestamp"] for b in rng.sample(engine.backup_config["backups"], min(100, backup_count))]
+        runner.repeated(f"{prefix}.find_backup_x100", lambda: [engine.find_backup(t) for t in timestamps],
+                        records=count)
+
+        def append_logs():
+            for i in range(100):
+                engine.add_log("skip", engine.backup_config["backups"][i])
+
+        runner.repeated(f"{prefix}.append_log_x100", append_logs, records=count)
+        runner.repeated(f"{prefix}.save_backup_config", engine.save_backup_config, records=count)
+        shutil.rmtree(backup_dir)
+
+
+# ---- 比较 ----
+
+def compare(old_path, new_path, threshold):
+    """比较两次结果，返回变慢超过 threshold（比例）的项目数"""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {r["name"]: r for r in json.load(f)["results"] if "seconds" in r}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = {r["name"]: r for r in json.load(f)["results"] if "seconds" in r}
+    regressions = 0
+    print(f"{'项目':<55} {'旧 (ms)':>10} {'新 (ms)':>10} {'比例':>8}")
+    for name in sorted(set(old) & set(new)):
+        old_seconds = old[name]["seconds"]
+        new_seconds = new[name]["seconds"]
+        ratio = new_seconds / old_seconds if old_seconds > 0 else float("inf")
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  变慢"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = "  变快"
+        print(f"{name:<55} {old_seconds * 1000:10.1f} {new_seconds * 1000:10.1f} {ratio:7.2f}x{mark}")
+    for name in sorted(set(new) - set(old)):
+        print(f"{name:<55} {'-':>10} {new[name]['seconds'] * 1000:10.1f}  （新增）")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="备份引擎的性能基准测试")
+    parser.add_argument("--quick", action="store_true", help="使用较小的数据量")
+    parser.add_argument("--repeat", type=int, default=3, help="可重复的操作运行的次数，取中位数（默认 %(default)s）")
+    parser.add_argument("--only", action="append", help="只运行名称包含该字符串的项目，可以指定多次")
+    parser.add_argument("--history", help="备份历史的日志条数，逗号分隔（默认 10000,100000,1000000，--quick 时 10000）")
+    parser.add_argument("--repo", default=REPO_ROOT, help="被测试的代码目录（默认为本仓库），用于测试其他版本")
+    parser.add_argument("--work-dir", help="生成测试数据的目录，默认使用系统临时目录")
+    parser.add_argument("--output", help="结果保存为 JSON 文件")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比较两次结果")
+    parser.add_argument("--threshold", type=float, default=0.1, help="比较时视为变慢的比例（默认 %(default)s）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+
+    repo = os.path.abspath(args.repo)
+    sys.path.insert(0, repo)
+    drop_modules()
+    try:
+        importlib.import_module("asbt.engine")
+    except ImportError:
+        print(f"错误: {repo} 中没有 asbt.engine，无法在没有图形界面的情况下测试该版本", file=sys.stderr)
+        return 1
+    if args.history:
+        history_sizes = [int(size) for size in args.history.split(",") if size]
+    else:
+        history_sizes = QUICK_HISTORY_SIZES if args.quick else HISTORY_SIZES
+
+    runner = Runner(max(1, args.repeat), args.only)
+    work_dir = tempfile.mkdtemp(prefix="asbt_bench_", dir=args.work_dir)
+    started = time.time()
+    try:
+        for tree_name, (full_spec, quick_spec) in TREES.items():
+            if runner.might_want(tree_name):
+                bench_tree(runner, work_dir, tree_name, quick_spec if args.quick else full_spec)
+        for count in history_sizes:
+            if runner.might_want(f"history_{count}"):
+                bench_history(runner, work_dir, count)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "started_at": started,
+        "duration": round(time.time() - started, 3),
+        "revision": git_revision(repo),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "repeat": runner.repeat,
+        "results": runner.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
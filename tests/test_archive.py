@@ -0,0 +1,110 @@
+import io
+import os
+import stat
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from asbt.archive import available_archive_types, create_archive, restore_archive, safe_target
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read_tree(root):
+    """{相对路径: 内容}，目录的内容为 None"""
+    tree = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in dir_names:
+            tree[os.path.relpath(os.path.join(dir_path, name), root)] = None
+        for name in file_names:
+            path = os.path.join(dir_path, name)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+class ArchiveTest(unittest.TestCase):
+    """压缩归档的往返和不安全成员"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        write_file(os.path.join(self.source, "a.sav"), b"a" * 1000)
+        write_file(os.path.join(self.source, "sub", "b.sav"), os.urandom(5000))
+        os.makedirs(os.path.join(self.source, "empty"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        for archive_type in available_archive_types():
+            with self.subTest(archive_type=archive_type):
+                backup_path = os.path.join(self.dir, f"backup.{archive_type}")
+                info = create_archive(self.source, backup_path, True, archive_type)
+                self.assertEqual(info["file_count"], 2)
+                self.assertEqual(info["total_bytes"], 6000)
+                target = os.path.join(self.dir, f"restored_{archive_type}")
+                restore_archive(backup_path, archive_type, target, True)
+                self.assertEqual(read_tree(target), read_tree(self.source))
+
+    def test_single_file_round_trip(self):
+        source = os.path.join(self.source, "a.sav")
+        backup_path = os.path.join(self.dir, "single.zip")
+        create_archive(source, backup_path, False, "zip")
+        target = os.path.join(self.dir, "a_restored.sav")
+        restore_archive(backup_path, "zip", target, False)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"a" * 1000)
+
+    def test_safe_target(self):
+        root = os.path.join(self.dir, "target")
+        self.assertEqual(safe_target(root, "sub/b.sav"), os.path.join(root, "sub", "b.sav"))
+        for name in ("../escaped", "sub/../../escaped", "/etc/passwd"):
+            with self.assertRaises(ValueError):
+                safe_target(root, name)
+
+    def test_tar_traversal_refused(self):
+        backup_path = os.path.join(self.dir, "evil.tar.gz")
+        with tarfile.open(backup_path, "w:gz") as tar:
+            member = tarfile.TarInfo("../escaped")
+            member.size = 3
+            tar.addfile(member, io.BytesIO(b"pwn"))
+        with self.assertRaises(ValueError):
+            restore_archive(backup_path, "tar.gz", os.path.join(self.dir, "target"), True)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "escaped")))
+
+    def test_zip_traversal_refused(self):
+        backup_path = os.path.join(self.dir, "evil.zip")
+        with zipfile.ZipFile(backup_path, "w") as zf:
+            zf.writestr("../escaped", b"pwn")
+        with self.assertRaises(ValueError):
+            restore_archive(backup_path, "zip", os.path.join(self.dir, "target"), True)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "escaped")))
+
+    def test_links_not_restored(self):
+        tar_path = os.path.join(self.dir, "links.tar.gz")
+        with tarfile.open(tar_path, "w:gz") as tar:
+            link = tarfile.TarInfo("link")
+            link.type = tarfile.SYMTYPE
+            link.linkname = "/etc/passwd"
+            tar.addfile(link)
+        zip_path = os.path.join(self.dir, "links.zip")
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            info = zipfile.ZipInfo("link")
+            info.external_attr = (stat.S_IFLNK | 0o777) << 16
+            zf.writestr(info, "/etc/passwd")
+        for backup_path, archive_type in ((tar_path, "tar.gz"), (zip_path, "zip")):
+            with self.subTest(archive_type=archive_type):
+                target = os.path.join(self.dir, f"target_{archive_type}")
+                restore_archive(backup_path, archive_type, target, True)
+                self.assertEqual(os.listdir(target), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from asbt.catalog import BackupCatalog, get_catalog
+from asbt.engine import BackupEngine, EngineListener, default_settings
+
+
+def make_backup(i, original="/saves/a"):
+    return {"timestamp": f"20250101_000000_{i:03d}", "backup_path": f"/backups/a_{i}", "original": original}
+
+
+def make_log(i, action="backup"):
+    return {"timestamp": f"20250101_000000_{i:03d}", "action": action, "backup_info": make_backup(i)}
+
+
+class RecordingListener(EngineListener):
+
+    def __init__(self):
+        self.messages = []
+
+    def status(self, text):
+        self.messages.append(text)
+
+
+class CatalogTest(unittest.TestCase):
+    """SQLite 目录的导入、逐条同步和分页查询"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.catalog = BackupCatalog(self.dir)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_import_and_page(self):
+        data = {"backups": [make_backup(i, "/saves/a" if i % 2 else "/saves/b") for i in range(5)],
+                "logs": [make_log(i, "backup" if i < 3 else "restore") for i in range(5)]}
+        self.catalog.import_data(data, 7)
+        self.assertEqual(self.catalog.get_seq(), 7)
+        # 最新的在前
+        self.assertEqual([b["timestamp"] for b in self.catalog.page_backups(0, 2)],
+                         [make_backup(4)["timestamp"], make_backup(3)["timestamp"]])
+        self.assertEqual(len(self.catalog.page_backups(4, 10)), 1)
+        self.assertEqual(self.catalog.count_backups("/saves/a"), 2)
+        self.assertEqual(self.catalog.count_logs("restore"), 2)
+        self.assertEqual(self.catalog.find_log(make_log(1)["timestamp"])["action"], "backup")
+        self.assertIsNone(self.catalog.find_backup("missing"))
+
+    def test_apply_in_sequence(self):
+        self.catalog.import_data({"backups": [], "logs": []}, 0)
+        self.assertTrue(self.catalog.apply("add_backup", {"record": make_backup(1)}, 1))
+        self.assertTrue(self.catalog.apply("add_backup", {"record": make_backup(2)}, 2))
+        self.assertTrue(self.catalog.apply("remove_backups", {"keys": [[make_backup(1)["timestamp"],
+                                                                        make_backup(1)["backup_path"]]]}, 3))
+        self.assertTrue(self.catalog.apply("add_log", {"record": make_log(1)}, 4))
+        self.assertTrue(self.catalog.apply("update_last_log", {"record": make_log(2, "skip")}, 5))
+        self.assertEqual([b["timestamp"] for b in self.catalog.page_backups()], [make_backup(2)["timestamp"]])
+        self.assertEqual([log["action"] for log in self.catalog.page_logs()], ["skip"])
+        # 跳过了序号，调用方需要重新导入
+        self.assertFalse(self.catalog.apply("add_log", {"record": make_log(3)}, 7))
+        self.assertEqual(self.catalog.get_seq(), 5)
+
+    def test_sync_only_when_seq_differs(self):
+        data = {"backups": [make_backup(1)], "logs": []}
+        self.assertTrue(self.catalog.sync(data, 3))
+        self.assertFalse(self.catalog.sync({"backups": [], "logs": []}, 3))
+        self.assertEqual(self.catalog.count_backups(), 1)
+
+    def test_corrupt_file_rebuilt(self):
+        self.catalog.close()
+        with open(self.catalog.db_file, "wb") as f:
+            f.write(b"not a database" * 100)
+        self.catalog = BackupCatalog(self.dir)
+        self.catalog.import_data({"backups": [make_backup(1)], "logs": []}, 1)
+        self.assertEqual(self.catalog.count_backups(), 1)
+
+
+class EngineCatalogTest(unittest.TestCase):
+    """引擎使用目录查询，目录出错时退回内存中的配置并通过 listener 报告"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        settings = default_settings()
+        settings["backup_dir"] = self.dir
+        self.listener = RecordingListener()
+        self.engine = BackupEngine(settings, self.listener)
+        self.engine.switch_backup_dir(self.dir)
+        self.catalog = get_catalog(self.dir)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_query_failure_reported(self):
+        self.engine.add_log("backup", make_backup(1))
+        error = sqlite3.OperationalError("disk I/O error")
+        with mock.patch.object(self.catalog, "page_logs", side_effect=error), \
+                mock.patch.object(self.catalog, "find_log", side_effect=error):
+            logs = self.engine.fetch_logs(0, 10)
+            found = self.engine.find_log(logs[0]["timestamp"])
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(found, logs[0])
+        self.assertEqual(sum("查询备份目录数据库失败" in text for text in self.listener.messages), 2)
+
+    def test_compaction_does_not_reimport(self):
+        for i in range(3):
+            self.engine.add_log("backup", make_backup(i))
+        with mock.patch.object(self.catalog, "import_data", wraps=self.catalog.import_data) as import_data:
+            self.engine.save_backup_config()
+            self.assertFalse(import_data.called)
+            self.engine.save_backup_config(replaced=True)
+            self.assertTrue(import_data.called)
+        self.assertEqual(self.catalog.count_logs(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
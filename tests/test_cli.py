@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from asbt.catalog import get_catalog
+from asbt.cli import main
+from tests.test_archive import read_tree, write_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CliTest(unittest.TestCase):
+    """命令行：备份、列出、还原、校验"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        write_file(os.path.join(self.source, "slot1.sav"), b"first")
+        write_file(os.path.join(self.source, "sub", "slot2.sav"), b"second")
+        self.first = read_tree(self.source)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_cli(self, *argv):
+        """运行命令，返回 (退出码, 标准输出, 标准错误)"""
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        argv = ["--config", os.path.join(self.dir, "settings.json"), "--source", self.source,
+                "--backup-dir", self.backup_dir] + list(argv)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            code = main(argv)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def timestamps(self):
+        code, out, _ = self.run_cli("list")
+        self.assertEqual(code, 0)
+        return [line.split()[0] for line in out.splitlines()]
+
+    def test_backup_list_restore(self):
+        self.assertEqual(self.run_cli("-q", "backup")[0], 0)
+        # 源没有变化时跳过
+        self.assertEqual(self.run_cli("-q", "backup", "--skip-unchanged")[0], 0)
+        first = self.timestamps()
+        self.assertEqual(len(first), 1)
+
+        write_file(os.path.join(self.source, "slot1.sav"), b"changed")
+        code, out, _ = self.run_cli("backup")
+        self.assertEqual(code, 0)
+        self.assertIn("各阶段用时", out)
+        self.assertEqual(len(self.timestamps()), 2)
+
+        target = os.path.join(self.dir, "restored")
+        self.assertEqual(self.run_cli("-q", "restore", first[0], "--target", target)[0], 0)
+        self.assertEqual(read_tree(target), self.first)
+
+        # 还原到源路径，还原前先备份当前文件
+        code, out, _ = self.run_cli("restore", first[0])
+        self.assertEqual(code, 0)
+        self.assertIn("还原完成", out)
+        self.assertEqual(read_tree(self.source), self.first)
+
+        code, out, _ = self.run_cli("list", "--logs")
+        self.assertEqual(code, 0)
+        actions = [line.split()[3] for line in out.splitlines()]
+        # 还原前的备份与最近一次快照相同，记录为跳过
+        self.assertEqual(actions.count("备份"), 2)
+        self.assertEqual(actions.count("还原"), 2)
+
+    def test_verify(self):
+        self.run_cli("-q", "backup")
+        self.assertEqual(self.run_cli("-q", "verify")[0], 0)
+        timestamp = self.timestamps()[0]
+        snapshot = [name for name in os.listdir(self.backup_dir) if name.startswith("save_")][0]
+        write_file(os.path.join(self.backup_dir, snapshot, "slot1.sav"), b"broken")
+        code, _, err = self.run_cli("-q", "verify", timestamp)
+        self.assertEqual(code, 1)
+        self.assertIn("slot1.sav", err)
+
+    def test_errors(self):
+        code, _, err = self.run_cli("restore", "no-such-timestamp")
+        self.assertEqual(code, 1)
+        self.assertIn("no-such-timestamp", err)
+        shutil.rmtree(self.source)
+        code, _, err = self.run_cli("backup")
+        self.assertEqual(code, 1)
+        self.assertIn("源文件不存在", err)
+
+    def test_module_entry_point(self):
+        """python -m asbt 不依赖图形界面"""
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, "-m", "asbt", "--config", os.path.join(self.dir, "settings.json"),
+                                 "--source", self.source, "--backup-dir", self.backup_dir, "-q", "backup"],
+                                cwd=self.dir, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len(self.timestamps()), 1)
+        result = subprocess.run([sys.executable, "-c", "import sys, asbt.cli; print('tkinter' in sys.modules)"],
+                                cwd=self.dir, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.engine import BackupEngine, default_settings
+from asbt.snapshot import FORMAT_COPY, FORMAT_MANIFEST, create_snapshot, restore_snapshot
+from tests.test_archive import read_tree, write_file
+
+CONSISTENCY = {"enabled": True, "max_retries": 3, "wait_seconds": 0, "staging": True}
+
+
+class ConsistencyTest(unittest.TestCase):
+    """一致性模式：复制期间源被修改时重新复制"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        for i in range(6):
+            write_file(os.path.join(self.source, f"d{i % 2}", f"f{i}"), b"old" * (i + 1))
+        self.backup_path = os.path.join(self.backup_dir, "snapshot")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def modify_on_first_call(self, action):
+        calls = []
+
+        def progress(done, total):
+            if not calls:
+                action()
+            calls.append(done)
+        return progress
+
+    def assert_no_partial(self):
+        self.assertEqual([name for name in os.listdir(self.backup_dir) if name.endswith(".partial")], [])
+
+    def test_modified_file_recopied(self):
+        def modify():
+            # 大小也变化，避免修改时间精度不够时扫描结果相同
+            write_file(os.path.join(self.source, "d0", "f0"), b"new content")
+            write_file(os.path.join(self.source, "d1", "added"), b"added")
+        info = create_snapshot(self.source, self.backup_path, True, FORMAT_COPY, options={"workers": 1},
+                               progress=self.modify_on_first_call(modify), consistency=CONSISTENCY)
+        self.assertEqual(read_tree(self.backup_path), read_tree(self.source))
+        self.assertEqual(info["consistency"]["retried"], 2)
+        self.assertTrue(info["consistency"]["stable"])
+        self.assertEqual(info["file_count"], 7)
+        self.assert_no_partial()
+
+    def test_deleted_file_rescanned(self):
+        def delete():
+            os.remove(os.path.join(self.source, "d1", "f5"))
+            shutil.rmtree(os.path.join(self.source, "d0"))
+        info = create_snapshot(self.source, self.backup_path, True, FORMAT_COPY, options={"workers": 1},
+                               progress=self.modify_on_first_call(delete), consistency=CONSISTENCY)
+        self.assertEqual(read_tree(self.backup_path), read_tree(self.source))
+        self.assertTrue(info["consistency"]["stable"])
+        self.assert_no_partial()
+
+    def test_manifest_patched(self):
+        def modify():
+            write_file(os.path.join(self.source, "d1", "f1"), b"new content")
+        info = create_snapshot(self.source, self.backup_path, True, FORMAT_MANIFEST, options={"workers": 1},
+                               progress=self.modify_on_first_call(modify), consistency=CONSISTENCY)
+        self.assertEqual(info["consistency"]["retried"], 1)
+        target = os.path.join(self.dir, "restored")
+        restore_snapshot(dict(info, backup_path=self.backup_path, is_directory=True), target)
+        self.assertEqual(read_tree(target), read_tree(self.source))
+
+    def test_unstable_file(self):
+        source = os.path.join(self.source, "d0", "f0")
+        sizes = iter(range(10, 100))
+
+        def progress(done, total):
+            # 每次复制时文件都在变化
+            write_file(source, b"x" * next(sizes))
+        info = create_snapshot(source, self.backup_path, False, FORMAT_COPY, progress=progress,
+                               consistency=CONSISTENCY)
+        self.assertFalse(info["consistency"]["stable"])
+        self.assertEqual(info["consistency"]["rounds"], CONSISTENCY["max_retries"] + 1)
+        self.assertTrue(os.path.isfile(self.backup_path))
+        self.assert_no_partial()
+
+    def test_failure_leaves_nothing(self):
+        def cancel(done, total):
+            raise RuntimeError("cancelled")
+        with self.assertRaises(RuntimeError):
+            create_snapshot(self.source, self.backup_path, True, FORMAT_COPY, progress=cancel,
+                            consistency=CONSISTENCY)
+        self.assertFalse(os.path.exists(self.backup_path))
+        self.assert_no_partial()
+
+    def test_engine_setting(self):
+        settings = default_settings()
+        self.assertIsNone(BackupEngine(settings).get_consistency())
+        settings["consistency"] = {"enabled": True}
+        self.assertEqual(BackupEngine(settings).get_consistency()["max_retries"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
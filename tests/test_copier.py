@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import errno
+import threading
+import unittest
+from unittest import mock
+
+from asbt import copier
+from asbt.copier import (STRATEGIES, STRATEGY_COPY, STRATEGY_REFLINK, FileCopier, ProgressCounter, copy_tree,
+                         probe_strategy, run_parallel)
+from asbt.scan import scan_source
+from asbt.snapshot import create_snapshot
+from tests.test_archive import read_tree, write_file
+
+
+class CopyTreeTest(unittest.TestCase):
+    """线程池并行复制文件夹"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        for i in range(30):
+            write_file(os.path.join(self.source, f"d{i % 3}", f"f{i}"), os.urandom(100 + i))
+        os.makedirs(os.path.join(self.source, "empty"))
+        os.utime(os.path.join(self.source, "d1"), (1000000, 1000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_parallel_copy(self):
+        calls = []
+        target = os.path.join(self.dir, "copy")
+        stats = copy_tree(self.source, target, workers=4, progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(read_tree(target), read_tree(self.source))
+        self.assertEqual(stats["copied"], 30)
+        self.assertEqual(stats["reused"], 0)
+        self.assertEqual(sorted(calls)[-1], (30, 30))
+        # 目录属性在复制完文件后才设置
+        self.assertEqual(os.stat(os.path.join(target, "d1")).st_mtime, 1000000)
+
+    def test_reuse_hardlinks(self):
+        first = os.path.join(self.dir, "first")
+        copy_tree(self.source, first, workers=4)
+        scan = scan_source(self.source, True)
+        reuse = {rel_path: os.path.join(first, *rel_path.split("/")) for rel_path in scan["files"]
+                 if rel_path.startswith("d0/")}
+        reuse["d1/f1"] = os.path.join(self.dir, "missing")  # 已丢失的文件退回复制
+        second = os.path.join(self.dir, "second")
+        stats = copy_tree(self.source, second, workers=4, scan=scan, reuse=reuse)
+        self.assertEqual(read_tree(second), read_tree(self.source))
+        self.assertEqual(stats["reused"], 10)
+        self.assertEqual(stats["copied"], 20)
+        self.assertEqual(os.stat(os.path.join(second, "d0", "f0")).st_ino,
+                         os.stat(os.path.join(first, "d0", "f0")).st_ino)
+
+    def test_error_propagates(self):
+        def fail(done, total):
+            raise RuntimeError("cancelled")
+        with self.assertRaises(RuntimeError):
+            copy_tree(self.source, os.path.join(self.dir, "copy"), workers=4, progress=fail)
+
+
+class ParallelTest(unittest.TestCase):
+
+    def test_run_parallel_keeps_order(self):
+        self.assertEqual(run_parallel(lambda x: x * 2, range(50), 8), [x * 2 for x in range(50)])
+        self.assertEqual(run_parallel(lambda x: x, [], 8), [])
+
+    def test_progress_counter_thread_safe(self):
+        calls = []
+        counter = ProgressCounter(400, lambda done, total: calls.append(done))
+        threads = [threading.Thread(target=lambda: [counter.step() for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.done, 400)
+        self.assertEqual(sorted(calls), list(range(1, 401)))
+
+
+
+class StrategyTest(unittest.TestCase):
+    """复制方式的探测和回退"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "source.bin")
+        write_file(self.source, os.urandom(3000))
+        os.utime(self.source, (1000000, 1000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_probe_cached_and_clean(self):
+        strategy = probe_strategy(self.dir)
+        self.assertIn(strategy, STRATEGIES)
+        self.assertEqual(os.listdir(self.dir), ["source.bin"])
+        with mock.patch.object(copier, "_supported_strategies", side_effect=AssertionError):
+            self.assertEqual(probe_strategy(self.dir), strategy)
+
+    def test_fallback_disables_strategy(self):
+        calls = []
+
+        def unsupported(source, target, progress=None):
+            calls.append(source)
+            raise OSError(errno.EXDEV, "cross-device")
+
+        file_copier = FileCopier(STRATEGY_REFLINK)
+        with mock.patch.dict(copier._COPY_FUNCTIONS, {STRATEGY_REFLINK: unsupported}):
+            for i in range(3):
+                target = os.path.join(self.dir, f"copy{i}")
+                self.assertNotEqual(file_copier.copy(self.source, target), STRATEGY_REFLINK)
+                self.assertEqual(read_tree(target), read_tree(self.source))
+                self.assertEqual(os.stat(target).st_mtime, 1000000)
+        # 不支持的方式只尝试一次
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(file_copier.counts.values()), 3)
+        self.assertNotIn(STRATEGY_REFLINK, file_copier.counts)
+
+    def test_other_errors_raised(self):
+        file_copier = FileCopier(STRATEGY_REFLINK)
+        with self.assertRaises(FileNotFoundError):
+            file_copier.copy(os.path.join(self.dir, "missing"), os.path.join(self.dir, "copy"))
+        # 源文件不存在不代表复制方式不可用
+        self.assertEqual(file_copier._disabled, set())
+
+    def test_plain_copy_progress(self):
+        calls = []
+        target = os.path.join(self.dir, "copy")
+        with mock.patch.object(copier, "COPY_CHUNK_SIZE", 1000):
+            self.assertEqual(FileCopier(STRATEGY_COPY).copy(self.source, target, lambda done, total: calls.append(done)),
+                             STRATEGY_COPY)
+        self.assertEqual(calls, [1000, 2000, 3000])
+
+    def test_snapshot_stats(self):
+        info = create_snapshot(self.source, os.path.join(self.dir, "snapshot.bin"), False)
+        self.assertEqual(info["copy_strategy"], probe_strategy(self.dir))
+        self.assertEqual(sum(info["copy_methods"].values()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.delta import create_delta, delete_delta, read_header, restore_delta
+
+BLOCK_SIZE = 4096
+
+
+class DeltaTest(unittest.TestCase):
+    """块级增量快照的往返和删除后重新指向 base"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save.dat")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        self.data = bytearray(os.urandom(BLOCK_SIZE * 8 + 100))
+        self.snapshots = []  # [(快照路径, 当时的源文件内容)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def snapshot(self, keyframe_interval=10):
+        with open(self.source, "wb") as f:
+            f.write(self.data)
+        path = os.path.join(self.backup_dir, f"save.dat_{len(self.snapshots)}")
+        previous = self.snapshots[-1][0] if self.snapshots else None
+        create_delta(self.source, path, previous, keyframe_interval, BLOCK_SIZE)
+        self.snapshots.append((path, bytes(self.data)))
+        return path
+
+    def change_block(self, index):
+        start = index * BLOCK_SIZE
+        self.data[start:start + 16] = os.urandom(16)
+
+    def assertRestores(self, path, expected):
+        target = os.path.join(self.dir, "restored")
+        restore_delta(path, target)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), expected)
+
+    def build_chain(self):
+        self.snapshot()
+        self.change_block(1)
+        self.snapshot()
+        self.change_block(3)
+        self.data += os.urandom(BLOCK_SIZE)  # 文件变长
+        self.snapshot()
+        self.change_block(1)
+        del self.data[BLOCK_SIZE * 6:]  # 文件变短
+        self.snapshot()
+
+    def test_round_trip(self):
+        self.build_chain()
+        for path, expected in self.snapshots:
+            self.assertRestores(path, expected)
+        # 只保存了变化的块
+        header = read_header(self.snapshots[1][0])
+        self.assertEqual([block[0] for block in header["blocks"]], [1])
+        self.assertEqual(header["base"], os.path.basename(self.snapshots[0][0]))
+
+    def test_keyframe_interval(self):
+        for _ in range(4):
+            self.change_block(0)
+            self.snapshot(keyframe_interval=2)
+        depths = [read_header(path)["depth"] for path, _ in self.snapshots]
+        self.assertEqual(depths, [0, 1, 0, 1])
+
+    def test_delete_middle_rebases_child(self):
+        self.build_chain()
+        middle, _ = self.snapshots.pop(1)
+        delete_delta(middle)
+        self.assertFalse(os.path.exists(middle))
+        child = read_header(self.snapshots[1][0])
+        self.assertEqual(child["base"], os.path.basename(self.snapshots[0][0]))
+        for path, expected in self.snapshots:
+            self.assertRestores(path, expected)
+
+    def test_delete_keyframe_makes_child_keyframe(self):
+        self.build_chain()
+        keyframe, _ = self.snapshots.pop(0)
+        delete_delta(keyframe)
+        child = read_header(self.snapshots[0][0])
+        self.assertIsNone(child["base"])
+        self.assertEqual(child["depth"], 0)
+        for path, expected in self.snapshots:
+            self.assertRestores(path, expected)
+
+    def test_delete_latest_leaves_chain(self):
+        self.build_chain()
+        latest, _ = self.snapshots.pop()
+        delete_delta(latest)
+        for path, expected in self.snapshots:
+            self.assertRestores(path, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.request
+from unittest import mock
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.exporter import (RESULT_FAILED, RESULT_SKIPPED, RESULT_SUCCESS, BackupMetrics, MetricsServer,
+                           create_exporter)
+from asbt.jobs import JobExecutor
+from asbt.ledger import get_ledger, scan_directory
+from asbt.scheduler import BackupScheduler
+
+
+class ExporterTest(unittest.TestCase):
+    """Prometheus 指标的计数、直方图、文本文件和 HTTP 导出"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_render(self):
+        metrics = BackupMetrics()
+        metrics.observe_backup("save", RESULT_SUCCESS, seconds=3, copied_files=2, copied_bytes=100,
+                               dir_bytes=5000, snapshots=4)
+        metrics.observe_backup("save", RESULT_SKIPPED)
+        metrics.observe_backup("save", RESULT_FAILED)
+        text = metrics.render()
+        self.assertIn('asbt_backups_total{job="save",result="success"} 1', text)
+        self.assertIn('asbt_backup_failures_total{job="save"} 1', text)
+        self.assertIn('asbt_backup_bytes_copied_total{job="save"} 100', text)
+        self.assertIn('asbt_backup_duration_seconds_bucket{job="save",le="1"} 0', text)
+        self.assertIn('asbt_backup_duration_seconds_bucket{job="save",le="5"} 1', text)
+        self.assertIn('asbt_backup_duration_seconds_count{job="save"} 1', text)
+        self.assertIn('asbt_backup_dir_bytes{job="save"} 5000', text)
+        self.assertIn("# TYPE asbt_backup_duration_seconds histogram", text)
+
+    def test_label_escaped(self):
+        metrics = BackupMetrics()
+        metrics.observe_backup('a"b\\c', RESULT_SKIPPED)
+        self.assertIn('job="a\\"b\\\\c"', metrics.render())
+
+    def test_textfile(self):
+        path = os.path.join(self.dir, "asbt.prom")
+        metrics, server = create_exporter({"textfile": path})
+        self.assertIsNone(server)
+        metrics.observe_backup("save", RESULT_SUCCESS, seconds=1)
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), metrics.render())
+        self.assertEqual(create_exporter({}), (None, None))
+
+    def test_http(self):
+        metrics = BackupMetrics()
+        metrics.observe_backup("save", RESULT_SUCCESS, seconds=1)
+        server = MetricsServer(metrics, 0).start()
+        try:
+            host, port = server.address
+            with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+                self.assertEqual(response.read().decode("utf-8"), metrics.render())
+        finally:
+            server.stop()
+
+    def test_queue_depth_includes_executor(self):
+        metrics = BackupMetrics()
+        scheduler = BackupScheduler()
+        scheduler.add("job", 60, lambda: None)
+        metrics.scheduler = scheduler
+        executor = JobExecutor()
+        metrics.executor = executor
+        started = threading.Event()
+        release = threading.Event()
+
+        def block(job):
+            started.set()
+            release.wait(5)
+
+        executor.submit("a", block)
+        started.wait(5)
+        executor.submit("b", lambda job: None)
+        executor.submit("c", lambda job: None)
+        try:
+            text = metrics.render()
+            self.assertIn("asbt_jobs_running 1", text)
+            self.assertIn("asbt_jobs_queued 2", text)
+        finally:
+            release.set()
+
+    def test_http_server_not_imported(self):
+        code = "import sys, asbt.engine, asbt.cli; print('http.server' in sys.modules)"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+class EngineMetricsTest(unittest.TestCase):
+    """第一次导出指标时在后台建立台账，扫描时间不计入备份耗时"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save.dat")
+        with open(self.source, "wb") as f:
+            f.write(b"x" * 1000)
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_ledger_built_outside_backup(self):
+        settings = default_settings()
+        settings.update(source_path=self.source, backup_dir=self.backup_dir, integrity=False)
+        engine = BackupEngine(settings)
+        engine.metrics = BackupMetrics()
+        engine.metrics_job = "save"
+
+        def slow_scan(*args, **kwargs):
+            threading.Event().wait(0.5)
+            return scan_directory(*args, **kwargs)
+
+        with mock.patch("asbt.engine.scan_directory", side_effect=slow_scan):
+            engine.perform_backup()
+            histogram = engine.metrics._histograms[("asbt_backup_duration_seconds", (("job", "save"),))]
+            self.assertLess(histogram[1], 0.5)
+            engine._ledger_thread.join(5)
+        ledger = get_ledger(self.backup_dir).get()
+        self.assertIsNotNone(ledger)
+        self.assertIn(f'asbt_backup_dir_bytes{{job="save"}} {ledger["bytes"]}', engine.metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
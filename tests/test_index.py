@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.index import SourceIndex, get_index
+from asbt.scan import diff_scan, scan_source
+from tests.test_archive import write_file
+
+
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_file(os.path.join(self.dir, "a"), b"a")
+        write_file(os.path.join(self.dir, "sub", "b"), b"bb")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_diff_scan(self):
+        previous = scan_source(self.dir, True)
+        self.assertEqual(sorted(previous["files"]), ["a", "sub/b"])
+        self.assertEqual(previous["dirs"], ["sub"])
+        self.assertFalse(diff_scan(previous, scan_source(self.dir, True))["is_changed"])
+
+        write_file(os.path.join(self.dir, "sub", "b"), b"bbbb")
+        write_file(os.path.join(self.dir, "c"), b"ccc")
+        os.remove(os.path.join(self.dir, "a"))
+        changes = diff_scan(previous, scan_source(self.dir, True))
+        self.assertEqual((changes["added"], changes["modified"], changes["removed"], changes["unchanged"]),
+                         (1, 1, 1, 0))
+        self.assertEqual(changes["changed_bytes"], 7)
+        self.assertTrue(changes["is_changed"])
+
+    def test_empty_dir_counts_as_change(self):
+        previous = scan_source(self.dir, True)
+        os.makedirs(os.path.join(self.dir, "empty"))
+        self.assertTrue(diff_scan(previous, scan_source(self.dir, True))["is_changed"])
+
+
+class SkipUnchangedTest(unittest.TestCase):
+    """按持久化的 stat 索引跳过没有变化的源"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        write_file(os.path.join(self.source, "a.sav"), b"a" * 100)
+        write_file(os.path.join(self.source, "b.sav"), b"b" * 100)
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        settings = default_settings()
+        settings.update(source_path=self.source, is_directory=True, backup_dir=self.backup_dir)
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_skip_and_merge_logs(self):
+        first = self.engine.perform_backup(skip_unchanged=True)
+        self.assertIsNotNone(first)
+        self.assertEqual(first["changes"]["mode"], "full")
+        self.assertIsNone(self.engine.perform_backup(skip_unchanged=True))
+        self.assertIsNone(self.engine.perform_backup(skip_unchanged=True))
+        # 连续跳过只保留一条日志
+        actions = [log["action"] for log in self.engine.backup_config["logs"]]
+        self.assertEqual(actions.count("skip"), 1)
+
+        write_file(os.path.join(self.source, "a.sav"), b"A" * 101)
+        second = self.engine.perform_backup(skip_unchanged=True)
+        self.assertEqual(second["changes"]["mode"], "incremental")
+        self.assertEqual((second["changes"]["modified"], second["changes"]["unchanged"]), (1, 1))
+        self.assertEqual(second["changes"]["copied_bytes"], 101)
+        # 未变化的文件沿用上一次快照的数据
+        self.assertEqual(second["changes"]["reused"], 1)
+
+    def test_index_persisted(self):
+        backup_info = self.engine.perform_backup()
+        entry = SourceIndex(self.backup_dir).get_previous(self.source, backup_info["format"])
+        self.assertEqual(entry["snapshot"]["backup_path"], backup_info["backup_path"])
+        self.assertEqual(sorted(entry["files"]), ["a.sav", "b.sav"])
+
+    def test_deleted_snapshot_not_used(self):
+        backup_info = self.engine.perform_backup()
+        shutil.rmtree(backup_info["backup_path"])
+        self.assertIsNone(SourceIndex(self.backup_dir).get_previous(self.source, backup_info["format"]))
+        # 上一次快照已被删除，不跳过
+        self.assertIsNotNone(self.engine.perform_backup(skip_unchanged=True))
+
+    def test_corrupt_index_ignored(self):
+        get_index(self.backup_dir)
+        with open(os.path.join(self.backup_dir, SourceIndex.FILE_NAME), "w") as f:
+            f.write("{not json")
+        self.assertIsNone(SourceIndex(self.backup_dir).get_previous(self.source, "copy"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.integrity import (ALGORITHM_BLAKE2, check_algorithm, load_integrity, needs_verify, new_hasher,
+                            verify_snapshot)
+from asbt.snapshot import FORMAT_ARCHIVE, FORMAT_COPY, FORMAT_DELTA, FORMAT_MANIFEST
+from tests.test_archive import write_file
+
+
+class IntegrityTest(unittest.TestCase):
+    """每种快照格式生成完整性清单，校验能发现损坏、缺失和多余的文件"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        write_file(os.path.join(self.source, "a.sav"), b"a" * 3000)
+        write_file(os.path.join(self.source, "sub", "b.sav"), os.urandom(5000))
+        self.backup_dirs = []
+
+    def tearDown(self):
+        for backup_dir in self.backup_dirs:
+            get_catalog(backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def backup(self, store_mode, is_directory=True):
+        settings = default_settings()
+        backup_dir = os.path.join(self.dir, f"backups_{len(self.backup_dirs)}")
+        os.makedirs(backup_dir)
+        self.backup_dirs.append(backup_dir)
+        source = self.source if is_directory else os.path.join(self.source, "a.sav")
+        settings.update(source_path=source, is_directory=is_directory, backup_dir=backup_dir, store_mode=store_mode)
+        return BackupEngine(settings).perform_backup()
+
+    def test_every_format_verifies(self):
+        cases = [(FORMAT_COPY, True), (FORMAT_COPY, False), (FORMAT_MANIFEST, True), (FORMAT_ARCHIVE, True),
+                 (FORMAT_DELTA, False)]
+        for store_mode, is_directory in cases:
+            with self.subTest(store_mode=store_mode, is_directory=is_directory):
+                backup_info = self.backup(store_mode, is_directory)
+                self.assertIsNotNone(load_integrity(backup_info["backup_path"]))
+                self.assertTrue(needs_verify(backup_info, 3600))
+                result = verify_snapshot(backup_info)
+                self.assertTrue(result["ok"], result)
+                self.assertEqual(result["checked"], 2 if is_directory else 1)
+                self.assertFalse(needs_verify(backup_info, 3600))
+
+    def test_copy_damage_detected(self):
+        backup_info = self.backup(FORMAT_COPY)
+        backup_path = backup_info["backup_path"]
+        with open(os.path.join(backup_path, "a.sav"), "r+b") as f:
+            f.write(b"X")
+        os.remove(os.path.join(backup_path, "sub", "b.sav"))
+        write_file(os.path.join(backup_path, "extra"), b"e")
+        result = verify_snapshot(backup_info)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["corrupt"], ["a.sav"])
+        self.assertEqual(result["missing"], ["sub/b.sav"])
+        self.assertEqual(result["extra"], ["extra"])
+        self.assertFalse(load_integrity(backup_path)["last_result"]["ok"])
+
+    def test_archive_damage_detected(self):
+        backup_info = self.backup(FORMAT_ARCHIVE)
+        with open(backup_info["backup_path"], "r+b") as f:
+            f.seek(100)
+            f.write(b"\0" * 50)
+        result = verify_snapshot(backup_info)
+        self.assertFalse(result["ok"])
+
+    def test_check_algorithm(self):
+        check_algorithm(ALGORITHM_BLAKE2)
+        self.assertEqual(len(new_hasher(ALGORITHM_BLAKE2).hexdigest()), 32)
+        with self.assertRaises(ValueError):
+            check_algorithm("md5")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.journal import BackupJournal, backup_key, get_journal
+
+
+def make_backup(i):
+    return {"timestamp": f"20250101_000000_{i:03d}", "backup_path": f"/backups/save_{i}", "date": f"2025-01-01 {i}"}
+
+
+class JournalTest(unittest.TestCase):
+    """journal 的追加、压缩和重新加载"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_reload_after_compaction(self):
+        journal = BackupJournal(self.dir)
+        data = journal.load()
+        for i in range(3):
+            journal.append("add_backup", record=make_backup(i))
+            data["backups"].append(make_backup(i))
+        journal.compact(data)
+        seq = journal.seq
+        self.assertEqual(journal.entries, 0)
+
+        # 压缩后继续追加，序号接着检查点的 journal_seq
+        journal.append("add_backup", record=make_backup(3))
+        journal.append("remove_backups", keys=[backup_key(make_backup(0))])
+        self.assertEqual(journal.seq, seq + 2)
+
+        reloaded = BackupJournal(self.dir)
+        data = reloaded.load()
+        self.assertEqual([b["timestamp"] for b in data["backups"]],
+                         [make_backup(i)["timestamp"] for i in (1, 2, 3)])
+        self.assertEqual(reloaded.seq, seq + 2)
+
+    def test_replay_skips_entries_in_checkpoint(self):
+        journal = BackupJournal(self.dir)
+        data = journal.load()
+        journal.append("add_backup", record=make_backup(0))
+        data["backups"].append(make_backup(0))
+        # 模拟写入检查点后、清空 journal 前崩溃
+        with open(journal.journal_file, "rb") as f:
+            lines = f.read()
+        journal.compact(data)
+        with open(journal.journal_file, "wb") as f:
+            f.write(lines)
+
+        data = BackupJournal(self.dir).load()
+        self.assertEqual(len(data["backups"]), 1)
+
+    def test_incomplete_last_line_ignored(self):
+        journal = BackupJournal(self.dir)
+        journal.load()
+        journal.append("add_log", record={"timestamp": "1", "action": "backup"})
+        with open(journal.journal_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": 99, "op": "add_log"})[:10])
+
+        reloaded = BackupJournal(self.dir)
+        self.assertEqual(len(reloaded.load()["logs"]), 1)
+        # 截掉不完整的一行后可以继续追加
+        reloaded.append("add_log", record={"timestamp": "2", "action": "backup"})
+        self.assertEqual(len(BackupJournal(self.dir).load()["logs"]), 2)
+
+
+class EngineCompactionTest(unittest.TestCase):
+    """引擎追加日志触发压缩后，重新加载的配置和 SQLite 目录都与内存中一致"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        settings = default_settings()
+        settings["backup_dir"] = self.backup_dir
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+        self.journal = get_journal(self.backup_dir)
+        self.journal.COMPACT_ENTRIES = 5
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_reload_after_compaction(self):
+        for i in range(12):
+            self.engine.add_log("backup", make_backup(i))
+        # 12 条日志中压缩了两次，journal 中只剩最后 2 条
+        self.assertEqual(self.journal.entries, 2)
+
+        data = BackupJournal(self.backup_dir).load()
+        self.assertEqual(data["logs"], self.engine.backup_config["logs"])
+
+        catalog = get_catalog(self.backup_dir)
+        self.assertEqual(catalog.get_seq(), self.journal.seq)
+        self.assertEqual(catalog.count_logs(), 12)
+        newest = self.engine.fetch_logs(0, 1)[0]
+        self.assertEqual(newest["backup_info"]["timestamp"], make_backup(11)["timestamp"])
+
+
+if __name__ == "__main__":
+    unittest.main()
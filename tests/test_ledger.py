@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from asbt import ledger as ledger_module
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.ledger import SizeLedger, get_ledger, measure_path, scan_directory
+from tests.test_archive import write_file
+
+
+def sizes(stats):
+    return {key: stats[key] for key in ("files", "dirs", "bytes")}
+
+
+class SizeLedgerTest(unittest.TestCase):
+    """台账的读写和扫描"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_reset_adjust_invalidate(self):
+        ledger = SizeLedger(self.dir)
+        # 没有完整扫描过时不做增量更新
+        ledger.adjust(files=1, bytes=10)
+        self.assertIsNone(ledger.get())
+        self.assertFalse(os.path.exists(ledger.ledger_file))
+
+        ledger.reset({"files": 2, "dirs": 1, "bytes": 100})
+        ledger.adjust(files=1, dirs=1, bytes=50, content_bytes=40)
+        ledger.adjust(files=-5, bytes=-20)
+        self.assertEqual(sizes(SizeLedger(self.dir).get()), {"files": 0, "dirs": 2, "bytes": 130})
+        self.assertEqual(SizeLedger(self.dir).get()["content_bytes"], 40)
+
+        ledger.invalidate()
+        self.assertIsNone(ledger.get())
+        self.assertIsNone(SizeLedger(self.dir).get())
+
+    def test_corrupt_file(self):
+        write_file(os.path.join(self.dir, SizeLedger.FILE_NAME), b"{broken")
+        self.assertIsNone(SizeLedger(self.dir).get())
+
+    def test_scan_directory(self):
+        for i in range(5):
+            write_file(os.path.join(self.dir, "a", "b" if i % 2 else "", f"f{i}"), b"x" * (i + 1))
+        os.makedirs(os.path.join(self.dir, "empty"))
+        calls = []
+        with mock.patch.object(ledger_module, "_PROGRESS_EVERY", 2):
+            stats = scan_directory(self.dir, lambda done, total: calls.append(done))
+        self.assertEqual(stats, {"files": 5, "dirs": 3, "bytes": 15})
+        self.assertEqual(calls, [2, 4])
+        # measure_path 包括目录本身
+        self.assertEqual(measure_path(self.dir), {"files": 5, "dirs": 4, "bytes": 15})
+        self.assertEqual(measure_path(os.path.join(self.dir, "a", "f0")), {"files": 1, "dirs": 0, "bytes": 1})
+        self.assertEqual(measure_path(os.path.join(self.dir, "missing")), {"files": 0, "dirs": 0, "bytes": 0})
+
+    def test_get_ledger_shared(self):
+        self.assertIs(get_ledger(self.dir), get_ledger(os.path.join(self.dir, "")))
+
+
+class EngineLedgerTest(unittest.TestCase):
+    """建立台账后，备份和删除时增量更新"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        for i in range(5):
+            write_file(os.path.join(self.source, "slot", f"f{i}"), os.urandom(1000))
+        settings = default_settings()
+        settings.update(source_path=self.source, is_directory=True, backup_dir=self.backup_dir)
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_incremental_updates(self):
+        ledger = get_ledger(self.backup_dir)
+        self.assertIsNone(ledger.get())
+        scanned = scan_directory(self.backup_dir)
+        self.engine.ensure_ledger()
+        self.assertEqual(sizes(ledger.get()), scanned)
+
+        for i in range(3):
+            write_file(os.path.join(self.source, "slot", "f0"), os.urandom(2000 + i))
+            before = ledger.get()
+            self.engine.perform_backup()
+            backup = self.engine.backup_config["backups"][-1]
+            measured = measure_path(backup["backup_path"])
+            after = ledger.get()
+            self.assertEqual(measured["files"], 5)
+            self.assertEqual({key: after[key] - before[key] for key in measured}, measured)
+            self.assertEqual(after["content_bytes"] - before["content_bytes"], backup["total_bytes"])
+
+        backup = self.engine.backup_config["backups"][0]
+        measured = measure_path(backup["backup_path"])
+        before = ledger.get()
+        self.engine.delete_backup(backup)
+        after = ledger.get()
+        self.assertEqual({key: before[key] - after[key] for key in measured}, measured)
+        self.assertEqual(before["content_bytes"] - after["content_bytes"], backup["total_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import json
+import pstats
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from asbt import profiling
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.profiling import PROFILE_CPU, PROFILE_DIR, PROFILE_MEMORY, OperationTimer, ProfileCapture, \
+    append_metrics, format_timing
+from tests.test_archive import write_file
+
+
+class OperationTimerTest(unittest.TestCase):
+    """分阶段计时"""
+
+    def test_summary(self):
+        clock = iter([0.0, 0.0, 2.0, 2.0, 2.5, 3.0])
+        with mock.patch.object(profiling.time, "perf_counter", lambda: next(clock)):
+            timer = OperationTimer("backup")
+            with timer.span("copy") as phase:
+                phase["files"] = 100
+                phase["bytes"] = 4 * 1024 * 1024
+            with timer.span("metadata"):
+                pass
+            summary = timer.summary()
+        self.assertEqual(summary["operation"], "backup")
+        self.assertEqual(summary["seconds"], 3.0)
+        copy, metadata = summary["phases"]
+        self.assertEqual(copy, {"name": "copy", "seconds": 2.0, "files": 100, "bytes": 4 * 1024 * 1024,
+                                "files_per_sec": 50.0, "mb_per_sec": 2.0})
+        self.assertEqual(metadata, {"name": "metadata", "seconds": 0.5})
+        self.assertEqual(format_timing(summary), "共 3.000 秒：复制 2.000 秒（50.0 文件/秒，2.0 MB/秒），写入记录 0.500 秒")
+
+    def test_span_recorded_on_error(self):
+        timer = OperationTimer("restore")
+        with self.assertRaises(RuntimeError):
+            with timer.span("restore"):
+                raise RuntimeError("failed")
+        self.assertEqual([phase["name"] for phase in timer.summary()["phases"]], ["restore"])
+
+
+class ProfileOutputTest(unittest.TestCase):
+    """指标文件和性能分析数据"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_append_metrics(self):
+        path = os.path.join(self.dir, "logs", "metrics.jsonl")
+        append_metrics(path, {"operation": "backup", "name": "存档"})
+        append_metrics(path, {"operation": "restore"})
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records, [{"operation": "backup", "name": "存档"}, {"operation": "restore"}])
+
+    def test_profile_capture(self):
+        with ProfileCapture(PROFILE_CPU, self.dir, "cpu") as capture:
+            sum(range(10000))
+        self.assertEqual(capture.path, os.path.join(self.dir, PROFILE_DIR, "cpu.prof"))
+        self.assertGreater(pstats.Stats(capture.path).total_calls, 0)
+
+        with ProfileCapture(PROFILE_MEMORY, self.dir, "memory") as capture:
+            data = [bytes(1000) for _ in range(100)]
+        with open(capture.path, "r", encoding="utf-8") as f:
+            self.assertIn("峰值", f.readline())
+        del data
+
+        with self.assertRaises(ValueError):
+            ProfileCapture("io", self.dir, "x")
+
+
+class EngineProfilingTest(unittest.TestCase):
+    """引擎按设置写入指标文件，profile_next 只对下一次操作生效"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save.dat")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        self.metrics_file = os.path.join(self.dir, "metrics.jsonl")
+        os.makedirs(self.backup_dir)
+        write_file(self.source, b"data")
+        settings = default_settings()
+        settings.update(source_path=self.source, backup_dir=self.backup_dir, metrics_file=self.metrics_file)
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_metrics_and_profile(self):
+        self.engine.profile_next = PROFILE_CPU
+        first = self.engine.perform_backup()
+        write_file(self.source, b"changed")
+        self.engine.perform_backup()
+        self.assertTrue(os.path.isfile(first["timing"]["profile"]))
+        self.assertEqual(len(os.listdir(os.path.join(self.backup_dir, PROFILE_DIR))), 1)
+
+        with open(self.metrics_file, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        backups = [record for record in records if record["operation"] == "backup"]
+        self.assertEqual(len(backups), 2)
+        self.assertEqual(backups[0]["profile"], first["timing"]["profile"])
+        self.assertNotIn("profile", backups[1])
+        self.assertEqual(backups[0]["source_path"], self.source)
+        self.assertIn("copy", [phase["name"] for phase in backups[0]["phases"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import io
+import os
+import shutil
+import stat
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.restore import COMPARE_HASH, COMPARE_MTIME, restore_differential
+from asbt import snapshot
+from asbt.copier import STRATEGY_RENAME
+from asbt.snapshot import FORMAT_ARCHIVE, FORMAT_COPY, FORMAT_MANIFEST
+from tests.test_archive import read_tree, write_file
+
+
+class DifferentialRestoreTest(unittest.TestCase):
+    """差异还原：只写入变化的文件、删除多余的文件，结果与快照相同"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        for i in range(10):
+            write_file(os.path.join(self.source, "d", f"f{i}"), b"x" * (i + 1))
+        write_file(os.path.join(self.source, "top"), b"top")
+        os.makedirs(os.path.join(self.source, "d", "empty"))
+        # 被修改的文件有特殊的权限，还原后应与快照一致
+        os.chmod(os.path.join(self.source, "d", "f3"), 0o750)
+        self.backup_dirs = []
+
+    def tearDown(self):
+        for backup_dir in self.backup_dirs:
+            get_catalog(backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def backup(self, store_mode, archive_type="tar.gz", integrity=True):
+        settings = default_settings()
+        backup_dir = os.path.join(self.dir, f"backups_{len(self.backup_dirs)}")
+        os.makedirs(backup_dir)
+        self.backup_dirs.append(backup_dir)
+        settings.update(source_path=self.source, is_directory=True, backup_dir=backup_dir, store_mode=store_mode,
+                        archive_type=archive_type, integrity=integrity)
+        return BackupEngine(settings).perform_backup()
+
+    def make_target(self):
+        """源文件夹的副本，修改一个文件、增加文件和文件夹、删除一个文件夹"""
+        target = os.path.join(self.dir, "target")
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(self.source, target)
+        write_file(os.path.join(target, "d", "f3"), b"changed!")
+        os.chmod(os.path.join(target, "d", "f3"), 0o644)
+        write_file(os.path.join(target, "extra"), b"e")
+        os.makedirs(os.path.join(target, "xdir", "y"))
+        shutil.rmtree(os.path.join(target, "d", "empty"))
+        return target
+
+    def check(self, backup_info):
+        expected = read_tree(self.source)
+        for atomic in (False, True):
+            for compare in (COMPARE_MTIME, COMPARE_HASH):
+                with self.subTest(atomic=atomic, compare=compare):
+                    target = self.make_target()
+                    inode = os.stat(os.path.join(target, "d", "f5")).st_ino
+                    result = restore_differential(backup_info, target, {"atomic": atomic, "compare": compare})
+                    self.assertEqual(read_tree(target), expected)
+                    self.assertEqual(stat.S_IMODE(os.stat(os.path.join(target, "d", "f3")).st_mode), 0o750)
+                    self.assertEqual(result["mode"], "differential")
+                    self.assertEqual(result["files"], 1)
+                    # 只统计删除的文件，多余的空文件夹也会删除
+                    self.assertEqual(result["removed"], 1)
+                    if not atomic:
+                        # 没有变化的文件原地保留
+                        self.assertEqual(os.stat(os.path.join(target, "d", "f5")).st_ino, inode)
+
+    def test_copy(self):
+        self.check(self.backup(FORMAT_COPY))
+
+    def test_manifest(self):
+        self.check(self.backup(FORMAT_MANIFEST))
+
+    def test_archive_tar(self):
+        self.check(self.backup(FORMAT_ARCHIVE, "tar.gz"))
+
+    def test_archive_zip(self):
+        self.check(self.backup(FORMAT_ARCHIVE, "zip"))
+
+    def test_archive_hash_without_integrity(self):
+        backup_info = self.backup(FORMAT_ARCHIVE, integrity=False)
+        target = os.path.join(self.dir, "target")
+        shutil.copytree(self.source, target)
+        # 内容相同、修改时间不同的文件不写入；大小相同、内容不同的文件写入
+        os.utime(os.path.join(target, "d", "f1"), (1, 1))
+        write_file(os.path.join(target, "d", "f2"), b"xy!")
+        result = restore_differential(backup_info, target, {"compare": COMPARE_HASH})
+        self.assertEqual(result["files"], 1)
+        self.assertEqual(read_tree(target), read_tree(self.source))
+
+    def test_missing_target_restores_fully(self):
+        backup_info = self.backup(FORMAT_MANIFEST)
+        target = os.path.join(self.dir, "new_target")
+        result = restore_differential(backup_info, target)
+        self.assertEqual(result["mode"], "full")
+        self.assertEqual(read_tree(target), read_tree(self.source))
+
+    def test_archive_traversal_refused(self):
+        backup_path = os.path.join(self.dir, "evil.tar.gz")
+        with tarfile.open(backup_path, "w:gz") as tar:
+            member = tarfile.TarInfo("../escaped")
+            member.size = 3
+            tar.addfile(member, io.BytesIO(b"pwn"))
+        target = os.path.join(self.dir, "target")
+        os.makedirs(target)
+        backup_info = {"backup_path": backup_path, "format": FORMAT_ARCHIVE, "archive_type": "tar.gz",
+                       "is_directory": True, "original": target}
+        for atomic in (False, True):
+            with self.subTest(atomic=atomic):
+                with self.assertRaisesRegex(ValueError, "不安全"):
+                    restore_differential(backup_info, target, {"atomic": atomic})
+                self.assertFalse(os.path.exists(os.path.join(self.dir, "escaped")))
+                self.assertEqual(sorted(os.listdir(self.dir)), ["evil.tar.gz", "src", "target"])
+
+
+class PreRestoreBackupTest(unittest.TestCase):
+    """完整还原前直接把源重命名为快照，不复制数据"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        for i in range(4):
+            write_file(os.path.join(self.source, "slot", f"f{i}"), b"v1" * (i + 1))
+        settings = default_settings()
+        settings.update(source_path=self.source, is_directory=True, backup_dir=self.backup_dir)
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+        self.first = self.engine.perform_backup()
+        write_file(os.path.join(self.source, "slot", "f0"), b"v2 changed")
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_move_source(self):
+        expected = read_tree(self.source)
+        inode = os.stat(os.path.join(self.source, "slot", "f1")).st_ino
+        backup_info = self.engine.pre_restore_backup(move_source=True)
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(backup_info["copy_strategy"], STRATEGY_RENAME)
+        self.assertEqual(backup_info["changes"]["mode"], "moved")
+        self.assertEqual(backup_info["changes"]["modified"], 1)
+        self.assertEqual(read_tree(backup_info["backup_path"]), expected)
+        self.assertEqual(os.stat(os.path.join(backup_info["backup_path"], "slot", "f1")).st_ino, inode)
+        self.assertIn(backup_info, self.engine.backup_config["backups"])
+        self.assertTrue(self.engine.verify_backup(backup_info)["ok"])
+
+    def test_full_restore_moves_source(self):
+        expected = read_tree(self.source)
+        self.engine.restore_backup(self.first, full=True)
+        latest = self.engine.backup_config["backups"][-1]
+        self.assertEqual(latest["copy_strategy"], STRATEGY_RENAME)
+        self.assertEqual(read_tree(latest["backup_path"]), expected)
+        self.assertEqual(read_tree(self.source), read_tree(self.first["backup_path"]))
+
+    def test_rename_failure_falls_back(self):
+        expected = read_tree(self.source)
+        with mock.patch.object(snapshot.os, "rename", side_effect=OSError("cross-device")):
+            backup_info = self.engine.pre_restore_backup(move_source=True)
+        self.assertEqual(read_tree(self.source), expected)
+        self.assertNotEqual(backup_info["copy_strategy"], STRATEGY_RENAME)
+        self.assertEqual(read_tree(backup_info["backup_path"]), expected)
+
+    def test_unchanged_source_not_moved(self):
+        write_file(os.path.join(self.source, "slot", "f0"), b"v1")
+        os.utime(os.path.join(self.source, "slot", "f0"),
+                 ns=(0, os.stat(os.path.join(self.first["backup_path"], "slot", "f0")).st_mtime_ns))
+        backup_info = self.engine.pre_restore_backup(move_source=True)
+        self.assertEqual(backup_info["timestamp"], self.first["timestamp"])
+        self.assertTrue(os.path.exists(self.source))
+
+
+if __name__ == "__main__":
+    unittest.main()
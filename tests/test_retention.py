@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from asbt.catalog import get_catalog
+from asbt.delta import restore_delta
+from asbt.engine import BackupEngine, default_settings
+from asbt.journal import BackupJournal
+from asbt.retention import DATE_FORMAT, select_backups_to_prune
+from asbt.snapshot import FORMAT_DELTA
+
+NOW = datetime(2025, 6, 15, 12, 0, 0)
+
+
+def make_backups(ages, original="/saves/a"):
+    """按距 NOW 的时间（从旧到新）生成备份记录"""
+    return [{"timestamp": str(i), "original": original, "date": (NOW - age).strftime(DATE_FORMAT)}
+            for i, age in enumerate(ages)]
+
+
+def kept(backups, pruned):
+    return [b["timestamp"] for b in backups if b not in pruned]
+
+
+class SelectTest(unittest.TestCase):
+    """保留策略的各条规则"""
+
+    POLICY = {"enabled": True, "keep_last": 0, "hourly": 0, "daily": 0, "weekly": 0}
+
+    def test_keep_last(self):
+        backups = make_backups([timedelta(days=10 - i) for i in range(5)])
+        pruned = select_backups_to_prune(backups, dict(self.POLICY, keep_last=2), NOW)
+        self.assertEqual(kept(backups, pruned), ["3", "4"])
+
+    def test_newest_always_kept(self):
+        backups = make_backups([timedelta(days=3), timedelta(days=2)])
+        pruned = select_backups_to_prune(backups, self.POLICY, NOW)
+        self.assertEqual(kept(backups, pruned), ["1"])
+
+    def test_hourly_keeps_newest_per_hour(self):
+        ages = [timedelta(hours=2, minutes=50), timedelta(hours=2, minutes=10),
+                timedelta(hours=1, minutes=40), timedelta(hours=1, minutes=5), timedelta(minutes=1)]
+        backups = make_backups(ages)
+        pruned = select_backups_to_prune(backups, dict(self.POLICY, hourly=3), NOW)
+        # 9 点、10 点、11 点各保留最新的一个，9 点那个已超出 3 小时
+        self.assertEqual(kept(backups, pruned), ["1", "3", "4"])
+
+    def test_daily_and_weekly(self):
+        ages = [timedelta(days=40), timedelta(days=20), timedelta(days=19, hours=1), timedelta(days=2),
+                timedelta(days=2, hours=-1), timedelta(hours=1)]
+        backups = make_backups(ages)
+        pruned = select_backups_to_prune(backups, dict(self.POLICY, daily=7, weekly=4), NOW)
+        self.assertEqual(kept(backups, pruned), ["2", "4", "5"])
+
+    def test_sources_independent_and_bad_dates_kept(self):
+        backups = make_backups([timedelta(days=5), timedelta(days=4)], "/saves/a")
+        backups += make_backups([timedelta(days=3)], "/saves/b")
+        backups.append({"timestamp": "x", "original": "/saves/a", "date": "bad"})
+        pruned = select_backups_to_prune(backups, dict(self.POLICY, keep_last=1), NOW)
+        self.assertEqual([b["original"] + b["timestamp"] for b in pruned], ["/saves/a0", "/saves/a1"])
+
+
+class ApplyRetentionTest(unittest.TestCase):
+    """备份后按策略批量清理：删除快照文件、一次记录到 journal、一条汇总日志"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save.dat")
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        settings = default_settings()
+        settings.update(source_path=self.source, backup_dir=self.backup_dir, store_mode=FORMAT_DELTA,
+                        delta_block_size_kb=4,
+                        retention={"enabled": True, "keep_last": 2, "hourly": 0, "daily": 0, "weekly": 0})
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_prune_delta_chain(self):
+        contents = []
+        data = bytearray(os.urandom(4096 * 6))
+        for i in range(5):
+            data[i * 4096] = (data[i * 4096] + 1) % 256
+            with open(self.source, "wb") as f:
+                f.write(data)
+            contents.append(bytes(data))
+            self.engine.perform_backup()
+
+        backups = self.engine.backup_config["backups"]
+        self.assertEqual(len(backups), 2)
+        self.assertEqual(len([name for name in os.listdir(self.backup_dir) if name.startswith("save.dat_")]), 2)
+        # 剩下的增量快照合并了被删除的基准快照，仍然可以还原
+        for backup, expected in zip(backups, contents[-2:]):
+            target = os.path.join(self.dir, "restored")
+            restore_delta(backup["backup_path"], target)
+            with open(target, "rb") as f:
+                self.assertEqual(f.read(), expected)
+
+        prune_logs = [log for log in self.engine.backup_config["logs"] if log["action"] == "prune"]
+        self.assertEqual(sum(len(log["backup_info"]["pruned"]) for log in prune_logs), 3)
+        self.assertEqual(BackupJournal(self.backup_dir).load()["backups"], backups)
+
+
+if __name__ == "__main__":
+    unittest.main()
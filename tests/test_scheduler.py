@@ -0,0 +1,38 @@
+import threading
+import time
+import unittest
+
+from asbt.scheduler import BackupScheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_quick_restart_keeps_one_loop(self):
+        scheduler = BackupScheduler(max_concurrent=4, stagger=0)
+        scheduler.add("a", 100, lambda: None)
+        for _ in range(20):
+            scheduler.start()
+            scheduler.stop()
+        scheduler.start()
+        try:
+            time.sleep(0.2)
+            loops = [thread for thread in threading.enumerate()
+                     if getattr(thread, "_target", None) == scheduler._loop]
+            self.assertEqual(len(loops), 1)
+        finally:
+            scheduler.stop()
+
+    def test_job_runs_once_per_interval(self):
+        runs = []
+        scheduler = BackupScheduler(stagger=0)
+        scheduler.add("a", 100, lambda: runs.append(1))
+        scheduler.start()
+        try:
+            time.sleep(0.3)
+            self.assertEqual(len(runs), 1)
+        finally:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from asbt import statcache
+from asbt.snapshot import create_snapshot, delete_snapshot, snapshot_exists
+from asbt.statcache import StatCache, stat_cache
+from tests.test_archive import write_file
+
+
+class StatCacheTest(unittest.TestCase):
+    """路径存在性缓存"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "file")
+        self.now = 1000.0
+        patcher = mock.patch.object(statcache.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_ttl(self):
+        cache = StatCache(ttl=30)
+        self.assertFalse(cache.exists(self.path))
+        write_file(self.path, b"x")
+        # 缓存未过期时不重新检查
+        self.now += 29
+        self.assertFalse(cache.exists(self.path))
+        self.now += 1
+        self.assertTrue(cache.exists(self.path))
+
+    def test_zero_ttl_disables_cache(self):
+        cache = StatCache(ttl=0)
+        self.assertFalse(cache.exists(self.path))
+        write_file(self.path, b"x")
+        self.assertTrue(cache.exists(self.path))
+
+    def test_set_and_invalidate(self):
+        cache = StatCache()
+        cache.set(self.path, True)
+        self.assertTrue(cache.exists(self.path))
+        cache.invalidate(self.path)
+        self.assertFalse(cache.exists(self.path))
+
+        inner = os.path.join(self.dir, "sub", "a")
+        cache.set(inner, True)
+        cache.set(self.dir + "-other", True)
+        cache.invalidate_tree(self.dir)
+        self.assertFalse(cache.exists(inner))
+        self.assertTrue(cache.exists(self.dir + "-other"))
+        cache.invalidate()
+        self.assertFalse(cache.exists(self.dir + "-other"))
+
+    def test_validate(self):
+        cache = StatCache()
+        cache.VALIDATE_PAUSE = 0
+        self.assertFalse(cache.exists(self.path))
+        self.assertTrue(cache.exists(self.dir))
+        write_file(self.path, b"x")
+        self.assertEqual(cache.validate(), [self.path])
+        self.assertTrue(cache.exists(self.path))
+        self.assertEqual(cache.validate(), [])
+        stop = threading.Event()
+        stop.set()
+        os.remove(self.path)
+        self.assertEqual(cache.validate(stop), [])
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    """快照的创建和删除直接更新缓存"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "source.txt")
+        write_file(self.source, b"data")
+        self.info = {"backup_path": os.path.join(self.dir, "backups", "snapshot.txt"), "is_directory": False}
+        os.makedirs(os.path.dirname(self.info["backup_path"]))
+
+    def tearDown(self):
+        stat_cache.invalidate_tree(self.dir)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_create_and_delete(self):
+        self.assertFalse(snapshot_exists(self.info, cached=True))
+        create_snapshot(self.source, self.info["backup_path"], False)
+        self.assertTrue(snapshot_exists(self.info, cached=True))
+        with mock.patch.object(statcache.os.path, "exists", side_effect=AssertionError):
+            self.assertTrue(snapshot_exists(self.info, cached=True))
+        delete_snapshot(self.info)
+        self.assertFalse(os.path.exists(self.info["backup_path"]))
+        self.assertFalse(snapshot_exists(self.info, cached=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.catalog import get_catalog
+from asbt.engine import BackupEngine, default_settings
+from asbt.snapshot import FORMAT_MANIFEST, load_manifest, restore_snapshot
+from asbt.store import ObjectStore, get_store
+from tests.test_archive import read_tree, write_file
+
+
+class ObjectStoreTest(unittest.TestCase):
+    """对象仓库的去重和引用计数"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = ObjectStore(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_put_file_dedup(self):
+        a = os.path.join(self.dir, "a")
+        b = os.path.join(self.dir, "b")
+        write_file(a, b"same")
+        write_file(b, b"same")
+        digest, size, stored = self.store.put_file(a)
+        self.assertEqual((size, stored), (4, 4))
+        self.assertEqual(self.store.put_file(b), (digest, 4, 0))
+        with self.store.open_object(digest) as f:
+            self.assertEqual(f.read(), b"same")
+
+    def test_refcount(self):
+        digest, _ = self.store.put_bytes(b"data")
+        self.store.add_refs([digest])
+        self.store.add_refs([digest, digest])
+        self.assertEqual(self.store.release_refs([digest, digest]), 0)
+        self.assertTrue(self.store.has_object(digest))
+        # 引用计数保存在 refs.json 中，新的实例读取到相同的计数
+        with open(self.store.refs_file, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {digest: 1})
+        store = ObjectStore(self.dir)
+        self.assertEqual(store.release_refs([digest]), 4)
+        self.assertFalse(store.has_object(digest))
+        self.assertEqual(store.release_refs([digest]), 0)
+
+
+class ManifestSnapshotTest(unittest.TestCase):
+    """去重存储的快照：往返、共享对象和删除快照后回收不再被引用的对象"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "src")
+        write_file(os.path.join(self.source, "a.sav"), b"a" * 1000)
+        write_file(os.path.join(self.source, "copy_of_a.sav"), b"a" * 1000)
+        write_file(os.path.join(self.source, "sub", "b.sav"), b"b" * 2000)
+        self.backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(self.backup_dir)
+        settings = default_settings()
+        settings.update(source_path=self.source, is_directory=True, backup_dir=self.backup_dir,
+                        store_mode=FORMAT_MANIFEST)
+        self.engine = BackupEngine(settings)
+        self.engine.switch_backup_dir(self.backup_dir)
+        self.store = get_store(self.backup_dir)
+
+    def tearDown(self):
+        get_catalog(self.backup_dir).close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def refs(self):
+        return dict(self.store._load_refs())
+
+    def objects(self):
+        return {digest for digest in self.refs() if self.store.has_object(digest)}
+
+    def restore(self, backup_info):
+        target = os.path.join(self.dir, "restored")
+        shutil.rmtree(target, ignore_errors=True)
+        restore_snapshot(backup_info, target)
+        return read_tree(target)
+
+    def test_round_trip_and_sharing(self):
+        first = self.engine.perform_backup()
+        expected_first = read_tree(self.source)
+        # 相同内容的两个文件共用一个对象，引用两次
+        a_digest = next(e["object"] for e in load_manifest(first["backup_path"])["files"] if e["path"] == "a.sav")
+        self.assertEqual(self.refs()[a_digest], 2)
+        self.assertEqual(len(self.objects()), 2)
+
+        write_file(os.path.join(self.source, "sub", "b.sav"), b"c" * 2000)
+        second = self.engine.perform_backup()
+        self.assertEqual(self.refs()[a_digest], 4)
+        self.assertEqual(len(self.objects()), 3)
+        self.assertEqual(self.restore(first), expected_first)
+        self.assertEqual(self.restore(second), read_tree(self.source))
+
+    def test_delete_releases_only_unreferenced(self):
+        first = self.engine.perform_backup()
+        old_b = next(e["object"] for e in load_manifest(first["backup_path"])["files"] if e["path"] == "sub/b.sav")
+        write_file(os.path.join(self.source, "sub", "b.sav"), b"c" * 2000)
+        second = self.engine.perform_backup()
+
+        self.engine.delete_backup(first)
+        self.assertFalse(self.store.has_object(old_b))
+        self.assertNotIn(old_b, self.refs())
+        self.assertEqual(self.restore(second), read_tree(self.source))
+
+        self.engine.delete_backup(second)
+        self.assertEqual(self.refs(), {})
+        leftover = [name for name in os.listdir(self.store.root) if name != "refs.json"
+                    and os.listdir(os.path.join(self.store.root, name))]
+        self.assertEqual(leftover, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
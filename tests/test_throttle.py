@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from asbt.catalog import get_catalog
+from asbt.copier import FileCopier, STRATEGIES
+from asbt.engine import BackupEngine, default_settings
+from asbt.throttle import Throttle, normalize_throttle
+
+
+class ThrottleTest(unittest.TestCase):
+    """限速器按进度回调估算已处理的数据量和文件数，超过限速时等待"""
+
+    def test_disabled_returns_none(self):
+        self.assertIsNone(Throttle.from_settings(None))
+        self.assertIsNotNone(Throttle.from_settings(dict(normalize_throttle(None), enabled=True)))
+
+    def test_files_per_sec(self):
+        callback = Throttle(files_per_sec=20).wrap(None, 10, 0)
+        start = time.monotonic()
+        for i in range(10):
+            callback(i + 1, 10)
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_released_does_not_wait(self):
+        callback = Throttle(files_per_sec=1, should_release=lambda: True).wrap(None, 10, 0)
+        start = time.monotonic()
+        for i in range(10):
+            callback(i + 1, 10)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_progress_passed_through(self):
+        calls = []
+        Throttle().wrap(lambda done, total: calls.append((done, total)), 2, 0)(1, 2)
+        self.assertEqual(calls, [(1, 2)])
+
+
+class SingleFileThrottleTest(unittest.TestCase):
+    """单个文件的完整复制按块报告进度，限速同样有效"""
+
+    SIZE = 2 * 1024 * 1024
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "save.dat")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(self.SIZE))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_copier_reports_chunks(self):
+        for strategy in STRATEGIES:
+            with self.subTest(strategy=strategy):
+                calls = []
+                target = os.path.join(self.dir, f"copy_{strategy}")
+                FileCopier(strategy).copy(self.source, target, lambda done, total: calls.append((done, total)))
+                self.assertEqual(calls[-1], (self.SIZE, self.SIZE))
+                with open(self.source, "rb") as a, open(target, "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_single_file_backup_throttled(self):
+        settings = default_settings()
+        backup_dir = os.path.join(self.dir, "backups")
+        os.makedirs(backup_dir)
+        settings.update(source_path=self.source, backup_dir=backup_dir, integrity=False)
+        engine = BackupEngine(settings)
+        try:
+            start = time.monotonic()
+            backup_info = engine.perform_backup(throttle=Throttle(mb_per_sec=4))
+            # 2 MB 按每秒 4 MB 限速至少需要 0.5 秒
+            self.assertGreaterEqual(time.monotonic() - start, 0.45)
+            self.assertEqual(os.path.getsize(backup_info["backup_path"]), self.SIZE)
+        finally:
+            get_catalog(backup_dir).close()
+
+
+if __name__ == "__main__":
+    unittest.main()
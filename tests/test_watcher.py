@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from asbt.watcher import InotifyWatcher, _load_libc
+
+LIBC = _load_libc()
+
+
+@unittest.skipIf(LIBC is None, "需要 Linux inotify")
+class InotifyWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.dir, "save")
+        os.makedirs(self.root)
+        self.messages = []
+        self.watcher = InotifyWatcher(self.root, True, LIBC, poll_interval=0.1, notify=self.messages.append)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def touch(self, name):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(name)
+
+    def test_new_subfolder_watched(self):
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.assertTrue(self.watcher.wait(1))
+        with open(os.path.join(self.root, "sub", "a"), "w") as f:
+            f.write("a")
+        self.assertTrue(self.watcher.wait(1))
+
+    def test_root_deleted_and_recreated(self):
+        shutil.rmtree(self.root)
+        self.assertTrue(self.watcher.wait(1))
+        self.assertIsNone(self.watcher.root_wd)
+        self.assertFalse(self.watcher.wait(0.3))
+
+        os.makedirs(self.root)
+        self.assertTrue(self.watcher.wait(1))
+        self.touch("a")
+        self.assertTrue(self.watcher.wait(1))
+        self.assertEqual(len(self.messages), 2)
+
+    def test_root_moved_away_and_back(self):
+        os.rename(self.root, self.root + "_old")
+        self.assertTrue(self.watcher.wait(1))
+        self.assertIsNone(self.watcher.root_wd)
+        os.rename(self.root + "_old", self.root)
+        self.assertTrue(self.watcher.wait(1))
+        self.touch("a")
+        self.assertTrue(self.watcher.wait(1))
+
+
+if __name__ == "__main__":
+    unittest.main()